@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the chatbot: ingestion throughput, retrieval latency
+at several corpus sizes and end-to-end process_query latency.
+
+Everything runs on synthetic data generated from a seed, with a hashing
+embedder standing in for the sentence-transformer model and a fake LLM
+standing in for ChatGroq, so runs are reproducible and need no network.
+Results are written as JSON so runs can be compared.
+
+    python benchmark.py --output results.json
+    python benchmark.py --suites retrieval --sizes 1000,10000 --retrievers vector,hybrid
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+# Benchmarks measure uncached work and must not touch the real answer cache
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+sys.path.append(str(Path(__file__).parent))
+
+SUITES = ("ingestion", "retrieval", "e2e")
+EMBEDDING_SIZE = 384
+
+# --- Synthetic corpus ---
+VOCABULARY = (
+    "microgravity spaceflight radiation arabidopsis mice rodent bone muscle atrophy gene expression "
+    "transcriptome protein cell culture immune response oxidative stress plant root growth gravitropism "
+    "microbiome bacteria biofilm astronaut cardiovascular vision fluid shift osteoclast mitochondria "
+    "circadian sleep hindlimb unloading tissue stem cells dna damage repair telomere signaling pathway "
+    "international space station orbit mission payload experiment habitat lunar mars exposure dose "
+    "heavy ion particle shielding metabolism lipid insulin liver kidney brain behavior neuron retina"
+).split()
+FILLER = "the of and in on with during after under was were for by from to a an".split()
+
+
+class SyntheticCorpus:
+    """Deterministic space-biology-flavoured text with gene names and mission IDs mixed in"""
+
+    def __init__(self, seed=42):
+        self.random = random.Random(seed)
+        self.genes = [f"GENE{n}" for n in range(1, 400)]
+        self.missions = [f"RR-{n}" for n in range(1, 25)] + [f"STS-{n}" for n in range(40, 136)]
+        # Zipf-like weights so some terms are common and most are rare
+        self.weights = [1.0 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+    def sentence(self, words=14):
+        parts = []
+        for _ in range(words):
+            roll = self.random.random()
+            if roll < 0.35:
+                parts.append(self.random.choice(FILLER))
+            elif roll < 0.95:
+                parts.append(self.random.choices(VOCABULARY, self.weights)[0])
+            elif roll < 0.98:
+                parts.append(self.random.choice(self.genes))
+            else:
+                parts.append(self.random.choice(self.missions))
+        return " ".join(parts).capitalize() + "."
+
+    def paragraph(self, sentences=8):
+        return " ".join(self.sentence(self.random.randint(10, 20)) for _ in range(sentences))
+
+    def document(self, paragraphs=6):
+        return "\n\n".join(self.paragraph(self.random.randint(4, 10)) for _ in range(paragraphs))
+
+    def title(self):
+        return self.sentence(self.random.randint(5, 9)).rstrip(".")
+
+    def query(self, text):
+        """A question built from words of the given text, so it has relevant matches"""
+        words = [w.strip(".,") for w in text.split() if w.strip(".,").lower() not in FILLER]
+        start = self.random.randrange(max(1, len(words) - 6))
+        return "What is known about " + " ".join(words[start:start + self.random.randint(3, 6)]) + "?"
+
+
+def write_pdf(path, text, lines_per_page=55, line_length=95):
+    """Minimal multi-page PDF with Helvetica text, enough for pypdf to extract"""
+    lines = []
+    for paragraph in text.split("\n"):
+        while paragraph:
+            lines.append(paragraph[:line_length])
+            paragraph = paragraph[line_length:]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({escape(line)}) '" for line in page) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    Path(path).write_bytes(bytes(out))
+
+
+def generate_sources(root, corpus, html_files, pdf_files, csv_rows):
+    """Write synthetic HTML pages, PDFs and a publications CSV under root; returns (kind, path) sources"""
+    import pandas as pd
+
+    root = Path(root)
+    (root / "Cache").mkdir(parents=True, exist_ok=True)
+    (root / "pdfs").mkdir(parents=True, exist_ok=True)
+    sources = []
+    for n in range(html_files):
+        path = root / "Cache" / f"PMC{100000 + n}.html"
+        body = "".join(f"<p>{p}</p>\n" for p in corpus.document().split("\n\n"))
+        path.write_text(f"<html><head><title>{corpus.title()}</title></head><body>\n{body}</body></html>", encoding="utf-8")
+        sources.append(("HTML", path))
+    for n in range(pdf_files):
+        path = root / "pdfs" / f"paper_{n}.pdf"
+        write_pdf(path, corpus.document(paragraphs=10))
+        sources.append(("PDF", path))
+    if csv_rows:
+        path = root / "SB_publication_PMC.csv"
+        pd.DataFrame({
+            "Title": [corpus.title() for _ in range(csv_rows)],
+            "Link": [f"https://www.ncbi.nlm.nih.gov/pmc/articles/PMC{200000 + n}/" for n in range(csv_rows)],
+            "Pub_Date": [f"{2000 + n % 25}-{1 + n % 12:02d}-{1 + n % 28:02d}" for n in range(csv_rows)],
+            "Abstract": [corpus.paragraph() for _ in range(csv_rows)],
+        }).to_csv(path, index=False)
+        sources.append(("main CSV", path))
+    return sources
+
+
+# --- Offline stand-ins ---
+def hashing_embeddings():
+    """Deterministic bag-of-words embedder: hashed term counts, L2-normalized"""
+    import zlib
+
+    import numpy as np
+    from langchain_core.embeddings import Embeddings
+
+    from bm25 import tokenize
+
+    class HashingEmbeddings(Embeddings):
+        def _embed(self, text):
+            vector = np.zeros(EMBEDDING_SIZE, dtype=np.float32)
+            for term in tokenize(text):
+                vector[zlib.crc32(term.encode("utf-8")) % EMBEDDING_SIZE] += 1.0
+            norm = np.linalg.norm(vector)
+            return (vector / norm if norm else vector).tolist()
+
+        def embed_documents(self, texts):
+            return [self._embed(text) for text in texts]
+
+        def embed_query(self, text):
+            return self._embed(text)
+
+    return HashingEmbeddings()
+
+
+FAKE_ANSWER = """Spaceflight studies in the context report changes in gene expression and bone density.
+
+| Study | Change (%) |
+|-------|------------|
+| Example A | 12 |
+| Example B | 7 |
+"""
+
+
+def fake_llm(latency=0.0):
+    """Chat model that always returns FAKE_ANSWER, after an optional simulated delay"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    class FakeLLM(FakeListChatModel):
+        def _call(self, *args, **kwargs):
+            if latency:
+                time.sleep(latency)
+            return super()._call(*args, **kwargs)
+
+    return FakeLLM(responses=[FAKE_ANSWER])
+
+
+# --- Measurement helpers ---
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_summary(samples_ms):
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else [ordered[0]] * 99
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+# --- Ingestion ---
+def _ingest_task(kind, paths, workers):
+    """Runs in a fresh process so peak RSS belongs to this loader alone"""
+    from loaders import iter_loaded_sources
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    docs = chunks = failed = 0
+    for _, _, loaded in iter_loaded_sources([(kind, path) for path in paths], workers):
+        if loaded is None:
+            failed += 1
+            continue
+        count = sum(1 for _ in loaded)
+        chunks += count
+        # A CSV row is a document; HTML and PDF files are one document each
+        docs += count if kind == "main CSV" else 1
+    elapsed = time.perf_counter() - started
+    return {
+        "kind": kind,
+        "files": len(paths),
+        "failed": failed,
+        "docs": docs,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(docs / elapsed, 1) if elapsed else None,
+        "chunks_per_sec": round(chunks / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+        "worker_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if workers > 1 else None,
+    }
+
+
+def bench_ingestion(args, workdir):
+    corpus = SyntheticCorpus(args.seed)
+    sources = generate_sources(workdir / "sources", corpus, args.html_files, args.pdf_files, args.csv_rows)
+    by_kind = {}
+    for kind, path in sources:
+        by_kind.setdefault(kind, []).append(path)
+
+    # A fresh extracted-text cache: the first PDF pass parses, the second reads the cache
+    os.environ["TEXT_CACHE_DIR"] = str(workdir / "text_cache")
+    results = []
+    for kind, paths in by_kind.items():
+        for text_cache in ("cold", "warm") if kind == "PDF" else ("n/a",):
+            # spawn, not fork, so the child's peak RSS doesn't start from ours
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                result = executor.submit(_ingest_task, kind, paths, args.ingest_workers).result()
+            result["text_cache"] = text_cache
+            print(
+                f"[INFO] Ingestion {kind} ({text_cache} text cache): {result['chunks_per_sec']} chunks/sec",
+                file=sys.stderr,
+            )
+            results.append(result)
+    return results
+
+
+# --- Retrieval ---
+def build_synthetic_store(workdir, embeddings):
+    from langchain_chroma import Chroma
+
+    db = Chroma(persist_directory=str(workdir / "store"), embedding_function=embeddings, collection_name="benchmark")
+    db.reset_collection()
+    return db
+
+
+def add_to_store(db, embeddings, docs, start, batch_size=1000):
+    for offset in range(start, len(docs), batch_size):
+        batch = docs[offset:offset + batch_size]
+        db._collection.upsert(
+            ids=[doc["id"] for doc in batch],
+            documents=[doc["text"] for doc in batch],
+            metadatas=[doc["metadata"] for doc in batch],
+            embeddings=embeddings.embed_documents([doc["text"] for doc in batch]),
+        )
+
+
+def synthetic_chunks(corpus, count):
+    return [
+        {
+            "id": f"synthetic::{n}",
+            "text": corpus.paragraph(corpus.random.randint(4, 8)),
+            "metadata": {"title": corpus.title(), "link": f"synthetic_{n}.html", "pub_date": "2020-01-01",
+                         "date": 20200101, "source_type": "html"},
+        }
+        for n in range(count)
+    ]
+
+
+def make_retriever(db, mode, index_dir, k, threshold):
+    if mode == "hybrid":
+        from bm25 import build_bm25_index
+        from hybrid import build_hybrid_retriever
+        build_bm25_index(db, index_dir)
+        return build_hybrid_retriever(db, index_dir, k=k, similarity_score_threshold=threshold)
+    return db.as_retriever(search_type="similarity_score_threshold", search_kwargs={"score_threshold": threshold, "k": k})
+
+
+def bench_retrieval(args, workdir, embeddings):
+    corpus = SyntheticCorpus(args.seed)
+    sizes = sorted(args.sizes)
+    docs = synthetic_chunks(corpus, sizes[-1])
+    queries = [corpus.query(docs[corpus.random.randrange(len(docs))]["text"]) for _ in range(args.queries)]
+
+    db = build_synthetic_store(workdir, embeddings)
+    results = []
+    indexed = 0
+    for size in sizes:
+        _, build_ms = timed(add_to_store, db, embeddings, docs[:size], indexed)
+        indexed = size
+        stores = [("chroma", db)]
+        for index_type in args.faiss_types:
+            from faiss_store import FaissStore, build_faiss_index
+            build_faiss_index(db, workdir / "store", index_type=index_type)
+            stores.append((f"faiss:{index_type}", FaissStore(workdir / "store", embeddings)))
+        for backend, store in stores:
+            for mode in args.retrievers:
+                retriever = make_retriever(store, mode, workdir / "store", args.k, args.threshold)
+                # Warm up the collection before measuring
+                for query in queries[:5]:
+                    retriever.invoke(query)
+                samples, returned = [], 0
+                for query in queries:
+                    found, ms = timed(retriever.invoke, query)
+                    samples.append(ms)
+                    returned += len(found)
+                summary = latency_summary(samples)
+                print(
+                    f"[INFO] Retrieval {backend}/{mode} @ {size}: p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms",
+                    file=sys.stderr,
+                )
+                results.append({
+                    "corpus_size": size,
+                    "backend": backend,
+                    "retriever": mode,
+                    "index_build_ms": round(build_ms, 1),
+                    "avg_documents_returned": round(returned / len(queries), 2),
+                    **summary,
+                })
+    return results, db, docs
+
+
+# --- End to end ---
+def bench_e2e(args, workdir, embeddings, db=None, docs=None):
+    import chatbot_api
+    from chat2 import setup_retrieval_qa
+
+    corpus = SyntheticCorpus(args.seed + 1)
+    if db is None:
+        docs = synthetic_chunks(corpus, sorted(args.sizes)[-1])
+        db = build_synthetic_store(workdir, embeddings)
+        add_to_store(db, embeddings, docs, 0)
+    queries = [corpus.query(docs[corpus.random.randrange(len(docs))]["text"]) for _ in range(args.queries)]
+
+    results = []
+    for mode in args.retrievers:
+        if mode == "hybrid":
+            from bm25 import build_bm25_index
+            build_bm25_index(db, workdir / "store")
+        params = {**chatbot_api.RETRIEVAL_PARAMS, "k": args.k, "similarity_score_threshold": args.threshold, "retriever": mode}
+        chain = setup_retrieval_qa(db, llm=fake_llm(args.llm_latency), index_dir=workdir / "store", **params)
+        samples, failures = [], 0
+        for query in queries:
+            result, ms = timed(chatbot_api.process_query, query, db, chain)
+            samples.append(ms)
+            failures += 0 if result.get("success") else 1
+        summary = latency_summary(samples)
+        print(f"[INFO] process_query {mode}: p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms", file=sys.stderr)
+        results.append({
+            "corpus_size": len(docs),
+            "retriever": mode,
+            "llm_latency_ms": args.llm_latency * 1000,
+            "failures": failures,
+            **summary,
+        })
+    return results
+
+
+def csv_ints(value):
+    return [int(part) for part in value.split(",") if part]
+
+
+def csv_choices(choices):
+    def parse(value):
+        parts = [part for part in value.split(",") if part]
+        unknown = [part for part in parts if part not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown value(s) {', '.join(unknown)}; choose from {', '.join(choices)}")
+        return parts
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", type=csv_choices(SUITES), default=list(SUITES), help="comma-separated suites to run")
+    parser.add_argument("--output", help="JSON file for the results (default: stdout)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--html-files", type=int, default=200)
+    parser.add_argument("--pdf-files", type=int, default=50)
+    parser.add_argument("--csv-rows", type=int, default=5000)
+    parser.add_argument("--ingest-workers", type=int, default=1, help="extraction processes for the ingestion suite")
+    parser.add_argument("--sizes", type=csv_ints, default=[1000, 5000, 20000], help="corpus sizes (chunks) for retrieval")
+    parser.add_argument("--queries", type=int, default=200, help="queries per measurement")
+    parser.add_argument("--retrievers", type=csv_choices(("vector", "hybrid")), default=["vector", "hybrid"])
+    parser.add_argument("--faiss-types", type=csv_choices(("flat", "sq8", "ivf", "ivfpq")), default=[],
+                        help="also measure retrieval on FAISS exports of these index types")
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake LLM sleeps per call")
+    parser.add_argument("--keep", help="keep generated data in this directory instead of a temporary one")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "keep")},
+        },
+    }
+
+    with tempfile.TemporaryDirectory(prefix="biotrek-bench-") as tmp:
+        workdir = Path(args.keep or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        embeddings = hashing_embeddings()
+        db = docs = None
+        if "ingestion" in args.suites:
+            results["ingestion"] = bench_ingestion(args, workdir)
+        if "retrieval" in args.suites:
+            results["retrieval"], db, docs = bench_retrieval(args, workdir, embeddings)
+        if "e2e" in args.suites:
+            results["e2e"] = bench_e2e(args, workdir, embeddings, db, docs)
+    results["meta"]["peak_rss_mb"] = peak_rss_mb()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"[INFO] Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bm25.py
+"""
+Compact BM25 inverted index over the chunks in the vector store.
+
+Dense retrieval misses exact matches on gene names, mission IDs and
+organism names; this index catches them cheaply. Only chunk IDs, lengths,
+postings and the filterable metadata (date, source type) are persisted
+(gzipped JSON); chunk text stays in Chroma.
+"""
+import gzip
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+from filters import matches
+
+BM25_INDEX_NAME = "bm25_index.json.gz"
+
+# Keeps identifiers like "RR-1", "STS-135" or "TP53" together
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what which who will with how does do did can about into than then there these those".split()
+)
+
+
+def tokenize(text):
+    """Lower-cased terms; compound identifiers are also split into their parts"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in re.split(r"[-_.]", token) if part and part not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    def __init__(self, doc_ids, doc_lengths, postings, doc_fields=None, k1=1.5, b=0.75):
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        # [date, source type] per document, for query filters
+        self.doc_fields = doc_fields
+        # term -> flat [doc index, term frequency, doc index, term frequency, ...]
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, documents):
+        """documents: iterable of (chunk id, text, metadata)"""
+        doc_ids, doc_lengths, doc_fields, postings = [], [], [], {}
+        for index, (doc_id, text, metadata) in enumerate(documents):
+            terms = tokenize(text or "")
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(terms))
+            metadata = metadata or {}
+            doc_fields.append([metadata.get("date") or 0, metadata.get("source_type") or ""])
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, []).extend((index, count))
+        return cls(doc_ids, doc_lengths, postings, doc_fields)
+
+    def search(self, query, k=12, allowed_ids=None, filters=None):
+        """
+        Top k (chunk id, score) pairs; allowed_ids and metadata filters
+        optionally restrict the candidates.
+        """
+        n_docs = len(self.doc_ids)
+        if not n_docs:
+            return []
+        if filters and self.doc_fields is None:
+            raise ValueError("This BM25 index has no metadata to filter on; rebuild the vector store")
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting) // 2
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for i in range(0, len(posting), 2):
+                index, tf = posting[i], posting[i + 1]
+                if filters and not self._matches(index, filters):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / (self.avg_length or 1))
+                scores[index] = scores.get(index, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for index, score in ranked:
+            doc_id = self.doc_ids[index]
+            if allowed_ids is not None and doc_id not in allowed_ids:
+                continue
+            results.append((doc_id, score))
+            if len(results) == k:
+                break
+        return results
+
+    def _matches(self, index, filters):
+        date, source_type = self.doc_fields[index]
+        return matches({"date": date, "source_type": source_type}, filters)
+
+    def save(self, index_dir):
+        path = Path(index_dir) / BM25_INDEX_NAME
+        tmp_path = path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "doc_ids": self.doc_ids,
+                    "doc_lengths": self.doc_lengths,
+                    "doc_fields": self.doc_fields,
+                    "postings": self.postings,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, index_dir):
+        """The persisted index, or None if it has not been built yet"""
+        path = Path(index_dir) / BM25_INDEX_NAME
+        if not path.exists():
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["doc_ids"], data["doc_lengths"], data["postings"], data.get("doc_fields"))
+
+
+def build_bm25_index(db, index_dir, page_size=5000):
+    """Rebuild the index from every chunk stored in the vector store"""
+    def stored_documents():
+        offset = 0
+        while True:
+            page = db.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+
+    index = BM25Index.build(stored_documents())
+    index.save(index_dir)
+    print(f"[INFO] BM25 index built over {len(index.doc_ids)} chunks, {len(index.postings)} terms", file=sys.stderr)
+    return index
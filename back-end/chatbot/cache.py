@@ -0,0 +1,187 @@
+# cache.py
+"""
+Two-level cache for chatbot queries.
+
+Level one keeps query embeddings in memory so repeated questions skip the
+embedding pass. Level two is a persistent answer cache keyed by the
+normalized question, the retrieval parameters and the vector store's index
+version, so a rebuild invalidates every stored answer automatically.
+Both levels evict by size (least recently used) and by TTL.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+ANSWER_CACHE_NAME = "answer_cache.sqlite3"
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() != "false"
+
+
+def normalize_query(query):
+    """Lower-case, collapse whitespace and drop trailing punctuation"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+class TTLCache:
+    """In-memory LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _define_cached_embeddings():
+    from langchain_core.embeddings import Embeddings
+
+    class CachedEmbeddings(Embeddings):
+        """
+        Embeddings wrapper that memoizes embed_query; document embedding passes
+        straight through. Pass either the embeddings to wrap or a factory, which
+        defers building them (and loading the model) until first use.
+        """
+
+        def __init__(self, base=None, factory=None, max_size=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL):
+            self._base = base
+            self._factory = factory
+            self._load_lock = threading.Lock()
+            self.cache = TTLCache(max_size, ttl)
+            self.hits = 0
+            self.misses = 0
+
+        def load(self):
+            if self._base is None:
+                with self._load_lock:
+                    if self._base is None:
+                        self._base = self._factory()
+            return self._base
+
+        @property
+        def base(self):
+            return self.load()
+
+        def embed_documents(self, texts):
+            return self.base.embed_documents(texts)
+
+        def embed_query(self, text):
+            key = normalize_query(text)
+            embedding = self.cache.get(key)
+            if embedding is not None:
+                self.hits += 1
+                return embedding
+            self.misses += 1
+            embedding = self.base.embed_query(text)
+            self.cache.put(key, embedding)
+            return embedding
+
+    return CachedEmbeddings
+
+
+def __getattr__(name):
+    # CachedEmbeddings subclasses langchain's Embeddings, so it is only defined
+    # when first asked for; importing the answer cache stays free of langchain
+    if name == "CachedEmbeddings":
+        globals()[name] = _define_cached_embeddings()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class AnswerCache:
+    """Persistent answers in SQLite, evicted by TTL and least recent use"""
+
+    def __init__(self, index_dir, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL):
+        self.path = Path(index_dir) / ANSWER_CACHE_NAME
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(query, index_version, **params):
+        payload = json.dumps(
+            {"query": normalize_query(query), "index_version": index_version, "params": params},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] + self.ttl < now:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response), now, now),
+            )
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                " SELECT key FROM answers ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -1,131 +1,413 @@
 # chat1.py
+# Dependencies (torch via the embedding model, chromadb, the PDF/CSV loaders,
+# and the project modules that pull in langchain or pydantic) are imported on
+# first use so commands that never touch them start fast.
+import os
 import sys
-import pandas as pd
-import pypdf
 from pathlib import Path
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
 
 # --- Paths ---
-CACHE_DIR = Path("Cache")
-PDF_DIR = Path("Data/pdfs")
-DATA_DIR = Path("Data")
+# Store root; each rebuild writes a new version under it (see index_versions.py)
 CHROMA_DIR = Path("BioTrek_db")
 CHROMA_DIR.mkdir(exist_ok=True)
 
+def current_index_dir():
+    """Directory of the index version queries currently use"""
+    from index_versions import active_index_dir
+    return active_index_dir(CHROMA_DIR)
+
+def current_index_name():
+    """Name of the active index version, or None for an unversioned store"""
+    from index_versions import current_version
+    return current_version(CHROMA_DIR)
+
 # --- Embeddings ---
-embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-# --- Utility ---
-def split_text(text, chunk_size=1000, chunk_overlap=200):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, 
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    return splitter.split_text(text)
+# Model, backend (torch, onnx, onnx-int8), batch size and threads: see embedding_backends.py
+_embedding_function = None
+
+def _load_embedding_model():
+    from embedding_backends import load_embeddings
+    return load_embeddings()
+
+def get_embedding_function():
+    """
+    Shared embeddings; query embeddings are memoized and document embeddings
+    pass straight through. The model itself loads on the first embedding call
+    or on load_embedding_model().
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        from cache import CachedEmbeddings
+        _embedding_function = CachedEmbeddings(factory=_load_embedding_model)
+    return _embedding_function
+
+def load_embedding_model():
+    """Load the embedding model now instead of on the first query"""
+    return get_embedding_function().load()
+
+# Names that used to be created at import time, resolved lazily for older callers
+_LOADER_EXPORTS = {"CACHE_DIR", "PDF_DIR", "DATA_DIR", "MAIN_CSV_PATH", "split_text"}
+
+def __getattr__(name):
+    if name == "embedding_function":
+        return get_embedding_function()
+    if name in _LOADER_EXPORTS:
+        import loaders
+        return getattr(loaders, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Loaders ---
-def load_documents_from_html():
+def load_documents_from_html(workers=None):
+    from loaders import iter_loaded_sources, list_sources
+    sources = [(kind, path) for kind, path in list_sources() if kind == "HTML"]
     docs = []
-    for html_file in CACHE_DIR.glob("*.html"):
-        try:
-            content = html_file.read_text(encoding="utf-8")
-            chunks = split_text(content)
-            for chunk in chunks:
-                docs.append(Document(
-                    page_content=chunk,
-                    metadata={"title": html_file.stem, "link": html_file.name, "pub_date": html_file.stat().st_mtime}
-                ))
-        except Exception as e:
-            print(f"Skipping HTML file {html_file} due to error: {e}")
+    for _, _, loaded in iter_loaded_sources(sources, workers):
+        docs.extend(loaded or [])
     return docs
 
-def load_documents_from_pdfs():
+def load_documents_from_pdfs(workers=None):
+    from loaders import iter_loaded_sources, list_sources
+    sources = [(kind, path) for kind, path in list_sources() if kind == "PDF"]
     docs = []
-    for pdf_file in PDF_DIR.glob("*.pdf"):
-        try:
-            text = ""
-            with open(pdf_file, "rb") as f:
-                reader = pypdf.PdfReader(f)
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            chunks = split_text(text)
-            for chunk in chunks:
-                docs.append(Document(
-                    page_content=chunk,
-                    metadata={"title": pdf_file.stem, "link": pdf_file.name, "pub_date": pdf_file.stat().st_mtime}
-                ))
-        except Exception as e:
-            print(f"Skipping PDF file {pdf_file} due to error: {e}")
+    for _, _, loaded in iter_loaded_sources(sources, workers):
+        docs.extend(loaded or [])
     return docs
 
 def load_documents_from_main_csv():
+    from loaders import MAIN_CSV_PATH, load_source
+    if not MAIN_CSV_PATH.exists():
+        return []
+    return load_source("main CSV", MAIN_CSV_PATH) or []
+
+# --- Vector store ---
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))  # must stay below Chroma's maximum batch size
+MAX_BATCHES_IN_FLIGHT = int(os.getenv("MAX_BATCHES_IN_FLIGHT", "4"))
+# Store queries run against: "chroma", or "faiss" for a memory-mapped export of it
+VECTOR_BACKENDS = ("chroma", "faiss")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+def open_vector_store(index_dir=None):
+    from langchain_chroma import Chroma
+    return Chroma(
+        persist_directory=str(index_dir or current_index_dir()),
+        embedding_function=get_embedding_function()
+    )
+
+def source_key(path):
+    return Path(path).as_posix()
+
+def update_vector_store(full=False, workers=None, batch_size=None, chunk_size=None, chunk_overlap=None,
+                        index_dir=None):
     """
-    Load the main CSV that contains HTML links and convert each row into a Document.
+    Bring the vector store in index_dir (default: the active version) in line
+    with the source files on disk. Queries should never see an index while it
+    is updated; rebuild_index runs this on a shadow copy.
+    Only new or changed files are embedded; chunks of removed files are deleted.
+    New chunking parameters re-split every file (PDFs from the extracted-text cache).
+    Chunks stream through load -> split -> dedup -> embed -> upsert in batches,
+    and each committed batch is checkpointed so an interrupted build resumes after it.
+    Returns the store and a report of what was added, updated and removed.
     """
-    docs = []
-    main_csv_path = DATA_DIR / "datasets" / "SB_publication_PMC.csv"  # Updated path
-    if main_csv_path.exists():
+    from bm25 import BM25_INDEX_NAME, build_bm25_index
+    from dedup import DEDUP_ENABLED, DedupIndex
+    from loaders import PDF_EXTRACTOR, chunking_params, ingest_version, iter_loaded_sources, list_sources
+    from manifest import bump_index_version, diff_sources, load_manifest, save_manifest
+    from pipeline import Checkpoint, Progress, iter_batches, plan_signature, prefetch
+    from text_cache import prune_text_cache
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    chunking = chunking_params(chunk_size, chunk_overlap)
+    version = ingest_version(chunking)
+    index_dir = Path(index_dir or current_index_dir())
+    embedding_function = get_embedding_function()
+    db = open_vector_store(index_dir)
+    previous = {} if full else load_manifest(index_dir, version)
+    dedup = DedupIndex(index_dir)
+    if not DEDUP_ENABLED:
+        # Chunks indexed while disabled aren't tracked, so start over if it is turned back on
+        dedup.clear()
+
+    sources = list_sources()
+    kinds = {source_key(path): kind for kind, path in sources}
+    current_paths = [(source_key(path), path) for _, path in sources]
+    added, changed, removed, unchanged = diff_sources(previous, current_paths)
+    while DEDUP_ENABLED:
+        # Sources whose duplicates were dropped in favour of chunks that are about
+        # to go away must be re-indexed too; mark them stale in the manifest so an
+        # interrupted build plans the same work next time
+        going = [key for key, _, _ in changed] + removed
+        stale = dedup.dependents(
+            chunk_id for key in going for chunk_id in previous[key].get("chunk_ids", [])
+        ) & set(unchanged)
+        if not stale:
+            break
+        for key in stale:
+            previous[key] = {"chunk_ids": previous[key].get("chunk_ids", [])}
+        save_manifest(index_dir, version, previous)
+        added, changed, removed, unchanged = diff_sources(previous, current_paths)
+    print(
+        f"[INFO] Sources: {len(added)} new, {len(changed)} changed, "
+        f"{len(removed)} removed, {len(unchanged)} unchanged",
+        file=sys.stderr,
+    )
+
+    pending = {key: (fp, "added") for key, _, fp in added}
+    pending.update({key: (fp, "updated") for key, _, fp in changed})
+    to_load = [(key, path) for key, path, _ in added + changed]
+    checkpoint = Checkpoint(
+        index_dir,
+        plan_signature(version, batch_size, [(key, pending[key][0]["sha256"]) for key, _ in to_load]),
+    )
+
+    if not previous and not checkpoint.committed and db._collection.count() > 0:
+        # Chunks from a full rebuild or another ingest version can't be matched to files
+        print("[INFO] No usable manifest, re-indexing everything...", file=sys.stderr)
+        db.reset_collection()
+        dedup.clear()
+    elif not checkpoint.committed:
+        # A resumed build already did this before its first batch
+        dedup.forget(
+            chunk_id for key in removed + [key for key, _ in to_load]
+            for chunk_id in previous.get(key, {}).get("chunk_ids", [])
+        )
+
+    # Entries stay in the manifest until their file is re-indexed, so an
+    # interrupted update still knows which chunks to delete next time
+    manifest = dict(previous)
+    report = {"added": [], "updated": [], "removed": [], "failed": [], "unchanged": len(unchanged),
+              "chunks_added": 0, "chunks_removed": 0, "duplicates_exact": 0, "duplicates_near": 0,
+              "index_version": None}
+
+    for key in removed:
+        old_ids = manifest.pop(key).get("chunk_ids", [])
+        if old_ids:
+            db.delete(ids=old_ids)
+        save_manifest(index_dir, version, manifest)
+        report["removed"].append(key)
+        report["chunks_removed"] += len(old_ids)
+
+    def loaded():
+        # Extraction runs in worker processes; results come back in source order
+        results = iter_loaded_sources([(kinds[key], path) for key, path in to_load], workers, chunking)
+        for (key, _), (_, _, docs) in zip(to_load, results):
+            yield key, docs
+
+    progress = Progress()
+    # Manifest entries for finished files are only written once the whole plan
+    # is committed; until then the checkpoint is what resumes the build
+    finished = {}
+    for batch in prefetch(iter_batches(loaded(), batch_size), maxsize=MAX_BATCHES_IN_FLIGHT):
+        if batch.index < checkpoint.committed:
+            progress.update(skipped=len(batch.ids))
+        elif batch.ids:
+            ids, docs = drop_duplicates(db, dedup if DEDUP_ENABLED else None, batch, report)
+            if ids:
+                texts = [doc.page_content for doc in docs]
+                embeddings = embedding_function.embed_documents(texts)
+                db._collection.upsert(
+                    ids=ids,
+                    embeddings=embeddings,
+                    metadatas=[doc.metadata for doc in docs],
+                    documents=texts,
+                )
+            # Before the checkpoint: a batch redone after a crash recognises its own chunks
+            dedup.commit()
+            checkpoint.commit(batch.index + 1)
+            progress.update(embedded=len(ids))
+
+        for key in batch.failed:
+            # Keep any previous chunks and entry; the fingerprint mismatch retries it next time
+            report["failed"].append(key)
+
+        for key, ids in batch.finished:
+            # New chunks overwrite old ones with the same ID; drop the leftovers
+            stale = sorted(set(manifest.get(key, {}).get("chunk_ids", [])) - set(ids))
+            if stale:
+                db.delete(ids=stale)
+            fp, status = pending[key]
+            finished[key] = {**fp, "chunk_ids": ids}
+            report[status].append(key)
+            report["chunks_added"] += len(ids)
+            report["chunks_removed"] += len(stale)
+
+    progress.update(force=True)
+    dedup.close()
+    manifest.update(finished)
+    save_manifest(index_dir, version, manifest)
+    checkpoint.clear()
+    # Keep cached text only for file contents that are still indexed
+    prune_text_cache({entry.get("sha256") for entry in manifest.values()}, {PDF_EXTRACTOR})
+    if report["added"] or report["updated"] or report["removed"]:
+        # Cached answers were built from the old contents
+        report["index_version"] = bump_index_version(index_dir)
+    if report["index_version"] or not (index_dir / BM25_INDEX_NAME).exists():
+        # The lexical index mirrors the store's chunks for hybrid retrieval
+        build_bm25_index(db, index_dir)
+    if VECTOR_BACKEND == "faiss" and (report["index_version"] or faiss_export_stale(index_dir)):
+        from faiss_store import build_faiss_index
+        build_faiss_index(db, index_dir)
+    print(
+        f"[INFO] Added {len(report['added'])}, updated {len(report['updated'])}, "
+        f"removed {len(report['removed'])} source(s); "
+        f"{report['chunks_added']} chunks processed, {report['chunks_removed']} deleted, "
+        f"{report['duplicates_exact']} exact and {report['duplicates_near']} near duplicates dropped.",
+        file=sys.stderr,
+    )
+    return db, report
+
+def drop_duplicates(db, dedup, batch, report):
+    """
+    The batch's (ids, docs) without chunks that duplicate an indexed chunk.
+    Links of the dropped copies are merged into the kept chunk's metadata.
+    """
+    if dedup is None:
+        return batch.ids, batch.docs
+    from dedup import merge_metadata
+    kept = {}
+    merges = {}
+    for chunk_id, doc in zip(batch.ids, batch.docs):
+        kept_id, kind = dedup.match(chunk_id, chunk_id.rsplit("::", 1)[0], doc.page_content)
+        if kept_id is None:
+            kept[chunk_id] = doc
+        else:
+            merges.setdefault(kept_id, []).append(doc.metadata)
+            report[f"duplicates_{kind}"] += 1
+
+    stored_ids = [kept_id for kept_id in merges if kept_id not in kept]
+    for kept_id in merges:
+        if kept_id in kept:
+            kept[kept_id].metadata = merge_metadata(kept[kept_id].metadata, merges[kept_id])
+    if stored_ids:
+        stored = db._collection.get(ids=stored_ids, include=["metadatas"])
+        ids, metadatas = [], []
+        for kept_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            merged = merge_metadata(metadata or {}, merges[kept_id])
+            if merged is not metadata:
+                ids.append(kept_id)
+                metadatas.append(merged)
+        if ids:
+            db._collection.update(ids=ids, metadatas=metadatas)
+    return list(kept), list(kept.values())
+
+# Queries a new version must answer before it is switched in
+SMOKE_QUERIES = [
+    query.strip()
+    for query in os.getenv(
+        "INDEX_SMOKE_QUERIES", "effects of microgravity on bone;plant growth in spaceflight;radiation exposure"
+    ).split(";")
+    if query.strip()
+]
+
+def smoke_check(db, index_dir):
+    """
+    Check a freshly built index before it goes live: it has chunks, its
+    vectors match the embedding model, the smoke queries find results and
+    the BM25 index covers every chunk. Raises RuntimeError on failure.
+    """
+    from bm25 import BM25Index
+    count = db._collection.count()
+    if not count:
+        raise RuntimeError("Smoke check failed: the new index has no chunks")
+    stored = db.get(limit=1, include=["embeddings"])["embeddings"]
+    for query in SMOKE_QUERIES:
+        embedding = get_embedding_function().embed_query(query)
+        if len(stored) and len(stored[0]) != len(embedding):
+            raise RuntimeError(
+                f"Smoke check failed: stored vectors have {len(stored[0])} dimensions, the model {len(embedding)}"
+            )
+        if not db.similarity_search_by_vector(embedding, k=3):
+            raise RuntimeError(f"Smoke check failed: no results for {query!r}")
+    bm25 = BM25Index.load(index_dir)
+    if bm25 is None or len(bm25.doc_ids) != count:
+        raise RuntimeError("Smoke check failed: the BM25 index does not match the store")
+    return {"chunks": count, "queries": len(SMOKE_QUERIES)}
+
+def rebuild_index(full=False, workers=None, batch_size=None, chunk_size=None, chunk_overlap=None):
+    """
+    Build a new index version next to the live one and switch it in.
+    An incremental build starts from a copy of the active version, a full
+    one from scratch; either way queries keep using the active version
+    until the new one has passed smoke_check. The replaced version is kept
+    for rollback_index. Returns the new store and the update report.
+    """
+    from cache import AnswerCache
+    from index_versions import activate, create_shadow, discard_shadow, rebuild_lock
+    with rebuild_lock(CHROMA_DIR):
+        shadow = create_shadow(CHROMA_DIR, full=full)
+        print(f"[INFO] Building index version {shadow.name}...", file=sys.stderr)
         try:
-            df = pd.read_csv(main_csv_path)
-            for _, row in df.iterrows():
-                # Try both capitalized and lowercase column names
-                title = row.get("Title") or row.get("title") or "Unknown"
-                link = row.get("Link") or row.get("link") or ""
-                pub_date = row.get("Pub_Date") or row.get("pub_date") or row.get("Publication Date") or row.get("Date") or ""
-                
-                # Create a meaningful content string from available fields
-                content_parts = []
-                if title and title != "Unknown":
-                    content_parts.append(f"Title: {title}")
-                if "Abstract" in row and pd.notna(row["Abstract"]):
-                    content_parts.append(f"Abstract: {row['Abstract']}")
-                elif "abstract" in row and pd.notna(row["abstract"]):
-                    content_parts.append(f"Abstract: {row['abstract']}")
-                if link:
-                    content_parts.append(f"Link: {link}")
-                
-                page_content = "\n".join(content_parts) if content_parts else str(row.to_dict())
-                
-                docs.append(Document(
-                    page_content=page_content,
-                    metadata={"title": title, "link": link, "pub_date": pub_date}
-                ))
-        except Exception as e:
-            print(f"Skipping main CSV {main_csv_path} due to error: {e}")
-    return docs
+            db, report = update_vector_store(
+                full=full, workers=workers, batch_size=batch_size,
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, index_dir=shadow,
+            )
+            unchanged = not (report["added"] or report["updated"] or report["removed"])
+            if unchanged and not full and current_index_name():
+                # Nothing to switch to; the copy would be identical to the live version
+                discard_shadow(CHROMA_DIR, shadow.name)
+                report["version"] = current_index_name()
+                return open_vector_store(), report
+            report["smoke_check"] = smoke_check(db, shadow)
+        except RuntimeError:
+            # A version that fails its checks is of no use to resume
+            discard_shadow(CHROMA_DIR, shadow.name)
+            raise
+        activate(CHROMA_DIR, shadow.name)
+        # Cached answers were built from the old contents
+        AnswerCache(CHROMA_DIR).clear()
+        report["version"] = shadow.name
+        print(f"[INFO] Index version {shadow.name} is now live", file=sys.stderr)
+        return db, report
 
-# --- Vector store ---
-def initialize_vector_store_from_cache():
+def rollback_index():
+    """Make the previous index version live again; returns its name"""
+    from cache import AnswerCache
+    from index_versions import rebuild_lock, rollback
+    with rebuild_lock(CHROMA_DIR):
+        name = rollback(CHROMA_DIR)
+        AnswerCache(CHROMA_DIR).clear()
+    print(f"[INFO] Rolled back to index version {name}", file=sys.stderr)
+    return name
+
+def initialize_vector_store_from_cache(full=False, workers=None, batch_size=None):
     print("[INFO] Gathering documents from HTML, PDFs, main CSV ...", file=sys.stderr)
-    html_docs = load_documents_from_html()
-    pdf_docs = load_documents_from_pdfs()
-    main_csv_docs = load_documents_from_main_csv()
-    all_docs = html_docs + pdf_docs + main_csv_docs
-    print(f"[INFO] Total chunks to index: {len(all_docs)}", file=sys.stderr)
-
-    db = Chroma.from_documents(
-        documents=all_docs,
-        embedding=embedding_function,
-        persist_directory=str(CHROMA_DIR)
-    )
+    db, _ = rebuild_index(full=full, workers=workers, batch_size=batch_size)
     print("[INFO] Vector store built and persisted successfully.", file=sys.stderr)
     return db
 
-def load_or_build_vector_store():
-    if CHROMA_DIR.exists() and any(CHROMA_DIR.iterdir()):
-        print("[INFO] Loading existing vector store...", file=sys.stderr)
-        db = Chroma(
-            persist_directory=str(CHROMA_DIR),
-            embedding_function=embedding_function
-        )
+def faiss_export_stale(index_dir=None):
+    """True if there is no FAISS export or it was built as a different index type"""
+    from faiss_store import FAISS_INDEX_TYPE, faiss_index_info
+    info = faiss_index_info(index_dir or current_index_dir())
+    return info is None or info.get("requested") != FAISS_INDEX_TYPE
+
+def describe_vector_backend():
+    """Backend name plus index type, e.g. "faiss:ivf"; results can differ between them"""
+    if VECTOR_BACKEND == "faiss":
+        from faiss_store import FAISS_INDEX_TYPE, FAISS_NPROBE
+        return f"faiss:{FAISS_INDEX_TYPE}:{FAISS_NPROBE}"
+    return VECTOR_BACKEND
+
+def load_or_build_vector_store(backend=None):
+    """
+    The store queries run against. Chroma is always loaded (or built) first;
+    with the faiss backend its memory-mapped export is returned instead,
+    exported on the spot if it is missing.
+    """
+    backend = backend or VECTOR_BACKEND
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend {backend!r}, expected one of {', '.join(VECTOR_BACKENDS)}")
+    index_dir = current_index_dir()
+    if (index_dir / "chroma.sqlite3").exists():
+        print(f"[INFO] Loading existing vector store ({current_index_name() or 'unversioned'})...", file=sys.stderr)
+        db = open_vector_store(index_dir)
     else:
         db = initialize_vector_store_from_cache()
+        index_dir = current_index_dir()
+    if backend == "faiss":
+        from faiss_store import FaissStore, build_faiss_index
+        if faiss_export_stale(index_dir):
+            build_faiss_index(db, index_dir)
+        print("[INFO] Opening memory-mapped FAISS index...", file=sys.stderr)
+        return FaissStore(index_dir, get_embedding_function())
     return db
 
 # --- Main ---
@@ -1,23 +1,74 @@
 # chat2.py
+# The Groq client and LangChain chain classes are created on first use, so
+# importing this module stays cheap.
 import os
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-llm = ChatGroq(model="gemma2-9b-it", max_tokens=1024, temperature=0.3, api_key=GROQ_API_KEY)
+_llm = None
 
-def setup_retrieval_qa(db, max_words=3000, similarity_score_threshold=0.25):
-    retriever = db.as_retriever(
-        search_type="similarity_score_threshold",
-        search_kwargs={
-            "score_threshold": similarity_score_threshold,
-            "k": 12
-        }
+def get_llm():
+    global _llm
+    if _llm is None:
+        from langchain_groq import ChatGroq
+        _llm = ChatGroq(model="gemma2-9b-it", max_tokens=1024, temperature=0.3, api_key=GROQ_API_KEY)
+    return _llm
+
+def __getattr__(name):
+    # `llm` used to be created at import time
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+RETRIEVERS = ("vector", "hybrid")
+
+def setup_retrieval_qa(db, max_words=3000, similarity_score_threshold=0.25, k=12, llm=None, retriever="vector",
+                       index_dir=None):
+    from langchain.chains import RetrievalQA
+
+    if retriever not in RETRIEVERS:
+        raise ValueError(f"Unknown retriever {retriever!r}, expected one of {', '.join(RETRIEVERS)}")
+
+    if retriever == "hybrid":
+        # Vector search fused with the BM25 index built alongside the store
+        from chat1 import current_index_dir
+        from hybrid import build_hybrid_retriever
+        retriever = build_hybrid_retriever(
+            db, index_dir or current_index_dir(), k=k, similarity_score_threshold=similarity_score_threshold
+        )
+    else:
+        retriever = db.as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={
+                "score_threshold": similarity_score_threshold,
+                "k": k
+            }
+        )
+
+    chain = RetrievalQA(
+        combine_documents_chain=get_answer_chain(max_words, llm),
+        retriever=retriever,
+        input_key='query',
+        return_source_documents=True,
+        verbose=False
     )
+    return chain
+
+_answer_chains = {}
+
+def get_answer_chain(max_words=3000, llm=None):
+    """
+    The half of the QA chain that stuffs retrieved documents into the prompt
+    and asks the LLM. It holds no store handles, so it is built once per
+    max_words and shared by every QA chain (and by forked workers) unless
+    another llm is given.
+    """
+    if llm is None and max_words in _answer_chains:
+        return _answer_chains[max_words]
+    from langchain.chains.question_answering import load_qa_chain
+    from langchain.prompts import PromptTemplate
 
     prompt_template = f"""
 Your name is BioTrekBot. You are a specialized assistant for NASA BioTrek space biology research with DATA VISUALIZATION capabilities.
@@ -75,13 +126,58 @@ QUESTION: {{question}}"""
         input_variables=["context", "question"]
     )
 
-    chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type='stuff',
-        retriever=retriever,
-        input_key='query',
-        return_source_documents=True,
-        chain_type_kwargs={"prompt": PROMPT},
-        verbose=False
-    )
+    chain = load_qa_chain(llm or get_llm(), chain_type='stuff', prompt=PROMPT, verbose=False)
+    if llm is None:
+        _answer_chains[max_words] = chain
     return chain
+
+def retrieve_documents(chain, query):
+    """Run only the retrieval half of a RetrievalQA chain"""
+    return chain.retriever.invoke(query)
+
+def retrieval_timings(chain):
+    """Per-stage milliseconds of the last retrieval, for retrievers that record them"""
+    timings = getattr(chain.retriever, "last_timings", None)
+    return dict(timings) if timings else None
+
+def build_prompt(chain, query, source_docs):
+    """The stuffed prompt chain.invoke would send for these source documents"""
+    from langchain_core.prompts import format_document
+    stuff = chain.combine_documents_chain
+    context = stuff.document_separator.join(
+        format_document(doc, stuff.document_prompt) for doc in source_docs
+    )
+    return stuff.llm_chain.prompt.format(context=context, question=query)
+
+def chain_llm(chain):
+    return chain.combine_documents_chain.llm_chain.llm
+
+def stream_answer(chain, query, source_docs, prompt=None):
+    """Yield answer text as the LLM produces it"""
+    for chunk in chain_llm(chain).stream(prompt or build_prompt(chain, query, source_docs)):
+        if chunk.content:
+            yield chunk.content
+
+def search_by_vector(db, embedding, k=12, similarity_score_threshold=0.25, filters=None):
+    """
+    Same documents the similarity_score_threshold retriever returns, but for
+    an embedding that was already computed (e.g. in a batch). Metadata
+    filters are passed to the store, so only matching chunks are scored.
+    """
+    from filters import chroma_where
+    where = chroma_where(filters)
+    if where:
+        results = db.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=where)
+    else:
+        results = db.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+    # Chroma returns distances here; convert them like the retriever does
+    relevance = db._select_relevance_score_fn()
+    return [doc for doc, distance in results if relevance(distance) >= similarity_score_threshold]
+
+def retrieve_by_vector(chain, db, query, embedding, k=12, similarity_score_threshold=0.25, filters=None):
+    """The chain's retriever results for a query whose embedding is already computed"""
+    if hasattr(chain.retriever, "retrieve"):
+        return chain.retriever.retrieve(query, embedding, filters=filters)
+    return search_by_vector(
+        db, embedding, k=k, similarity_score_threshold=similarity_score_threshold, filters=filters
+    )
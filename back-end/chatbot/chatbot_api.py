@@ -5,66 +5,132 @@ Standalone API wrapper for the chatbot that can be called from Node.js
 import sys
 import json
 import os
+import argparse
+import asyncio
+import random
+import socketserver
+import threading
+import time
 from pathlib import Path
 
 # Add the current directory to the Python path
 sys.path.append(str(Path(__file__).parent))
 
+from timing import StageTimer
+
+# Filled in as start-up proceeds; printed with --profile-startup
+startup_profile = StageTimer()
+
 try:
-    from chat1 import load_or_build_vector_store
-    from chat2 import setup_retrieval_qa
-    from datetime import datetime
+    with startup_profile.stage("import"):
+        from chat1 import (
+            CHROMA_DIR, current_index_dir, current_index_name, describe_vector_backend, get_embedding_function,
+            load_embedding_model, load_or_build_vector_store,
+        )
+        from chat2 import (
+            RETRIEVERS, build_prompt, chain_llm, get_answer_chain, retrieval_timings, retrieve_by_vector,
+            setup_retrieval_qa, stream_answer,
+        )
+        from cache import ANSWER_CACHE_ENABLED, AnswerCache
+        from embedding_backends import EMBEDDING_BACKEND, EMBEDDING_THREADS
+        from filters import parse_filters
+        from manifest import read_index_version
 except ImportError as e:
     print(json.dumps({"error": f"Import error: {str(e)}"}))
     sys.exit(1)
 
-def initialize_chatbot():
-    """Initialize the chatbot components"""
+# Everything that changes which answer a query gets; part of the answer cache key
+RETRIEVAL_PARAMS = {
+    "max_words": 800,
+    # Lower similarity threshold for better retrieval
+    "similarity_score_threshold": 0.25,
+    "k": 12,
+    # "vector" or "hybrid" (vector + BM25); set with --retriever or CHATBOT_RETRIEVER
+    "retriever": os.getenv("CHATBOT_RETRIEVER", "vector"),
+}
+
+# How retrieved chunks are packed into the prompt; also part of the answer cache key
+CONTEXT_PARAMS = {
+    # Estimated prompt tokens for retrieved context; 0 sends every retrieved chunk as is
+    "token_budget": int(os.getenv("CONTEXT_TOKEN_BUDGET", "1800")),
+    "mmr_lambda": float(os.getenv("MMR_LAMBDA", "0.7")),
+}
+
+def answer_cache_key(query, index_version=None, filters=None):
+    if index_version is None:
+        index_version = read_index_version(current_index_dir())
+    return AnswerCache.make_key(
+        query, index_version, **RETRIEVAL_PARAMS, context=CONTEXT_PARAMS, store=describe_vector_backend(),
+        # Query embeddings differ slightly between backends
+        embedding=EMBEDDING_BACKEND,
+        filters=filters,
+    )
+
+def parse_filter_args(argv):
+    """Metadata filters from --after, --before and --source-type; raises ValueError if malformed"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--after", help="only sources dated on or after YYYY[-MM[-DD]]")
+    parser.add_argument("--before", help="only sources dated on or before YYYY[-MM[-DD]]")
+    parser.add_argument("--source-type", dest="source_types", help="comma-separated: html, pdf, csv")
+    args, _ = parser.parse_known_args(argv)
+    return parse_filters({key: value for key, value in vars(args).items() if value})
+
+if "--retriever" in sys.argv[:-1]:
+    RETRIEVAL_PARAMS["retriever"] = sys.argv[sys.argv.index("--retriever") + 1]
+if RETRIEVAL_PARAMS["retriever"] not in RETRIEVERS:
+    print(json.dumps({"error": f"Unknown retriever: {RETRIEVAL_PARAMS['retriever']}"}))
+    sys.exit(1)
+
+_answer_cache = None
+
+def get_answer_cache():
+    global _answer_cache
+    if _answer_cache is None and ANSWER_CACHE_ENABLED:
+        _answer_cache = AnswerCache(CHROMA_DIR)
+    return _answer_cache
+
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+
+# Forked workers per serve process (--workers); 1 answers in the serving process itself
+SERVE_WORKERS = int(os.getenv("CHATBOT_PREFORK_WORKERS", "1"))
+
+def initialize_chatbot(load_model=True):
+    """
+    Initialize the chatbot components. With load_model=False the embedding
+    model is left to load on the first embedding (never, for cached answers),
+    unless --profile-startup asks for the full breakdown.
+    """
     try:
-        db = load_or_build_vector_store()
-        # Lower similarity threshold for better retrieval
-        chain = setup_retrieval_qa(db, max_words=800, similarity_score_threshold=0.25)
+        if load_model or PROFILE_STARTUP:
+            with startup_profile.stage("model_load"):
+                load_embedding_model()
+        with startup_profile.stage("chroma_open"):
+            db = load_or_build_vector_store()
+        with startup_profile.stage("chain_construction"):
+            chain = setup_retrieval_qa(db, **RETRIEVAL_PARAMS)
+        if PROFILE_STARTUP:
+            print(json.dumps({"startup_profile": startup_profile_report()}), file=sys.stderr)
         return db, chain
     except Exception as e:
         print(json.dumps({"error": f"Initialization error: {str(e)}"}))
         sys.exit(1)
 
+def startup_profile_report():
+    return {**startup_profile.as_dict(), "total_ms": round(startup_profile.total(), 1)}
+
 def format_sources(source_docs):
     """Format source documents for JSON response"""
     sources = []
     references = []
-    timeline = []
+    dated = []
     
     for i, s in enumerate(source_docs, start=1):
         md = s.metadata if hasattr(s, "metadata") else s.get("metadata", {})
         
-        # Try various metadata field names for title
-        title = (md.get("title") or md.get("Title") or 
-                md.get("filename") or md.get("Filename") or 
-                md.get("name") or md.get("Name") or "Unknown")
-        
-        # Try various metadata field names for link
-        link = (md.get("link") or md.get("Link") or 
-               md.get("url") or md.get("URL") or 
-               md.get("href") or "")
-        
-        # Try various metadata field names for publication date
-        pd = (md.get("pub_date") or md.get("Pub_Date") or 
-             md.get("Publication Date") or md.get("publication_date") or
-             md.get("Date") or md.get("date"))
-        
-        # Convert timestamp to YYYY-MM-DD
-        if isinstance(pd, (int, float)):
-            try:
-                pd = datetime.fromtimestamp(pd).strftime("%Y-%m-%d")
-            except (ValueError, OSError):
-                pd = ""
-        elif pd and isinstance(pd, str) and pd not in ["", "1970-01-01", "unknown date"]:
-            # Already a string date, keep it
-            pd = pd
-        else:
-            # Empty or invalid date
-            pd = ""
+        # Title and link are canonical and dates normalized at ingest time
+        title = md.get("title") or "Unknown"
+        link = md.get("link") or ""
+        pd = md.get("pub_date") or ""
         
         content = s.page_content if hasattr(s, "page_content") else s.get("page_content", "")
         
@@ -81,56 +147,582 @@ def format_sources(source_docs):
         
         references.append(f"[{i}] {title} — {link}")
         
-        # Format timeline entry with or without date
-        if pd:
-            timeline.append(f"{pd} | {title}")
-        else:
-            timeline.append(f"No date | {title}")
+        dated.append((md.get("date") or 0, title, pd))
     
-    # Sort timeline by date (items with 'No date' will appear first)
-    timeline.sort()
+    # Timeline ordered by the integer date (items with no date first)
+    dated.sort()
+    timeline = [f"{pd} | {title}" if pd else f"No date | {title}" for _, title, pd in dated]
     
     return sources, references, timeline
 
-def process_query(query, db, chain):
-    """Process a single query and return formatted response"""
-    try:
-        response = chain.invoke(query)
-        
-        # Only include sources if they exist and are relevant
-        if isinstance(response, dict) and "source_documents" in response:
-            source_docs = response["source_documents"]
-            # Filter out empty or irrelevant sources
-            if not source_docs or len(source_docs) == 0:
-                source_docs = []
-        else:
-            source_docs = []
-        
-        if isinstance(response, dict) and "result" in response:
-            answer = response["result"]
-        else:
-            answer = str(response)
-        
-        # Only format sources if we have relevant ones
-        if source_docs:
-            sources, references, timeline = format_sources(source_docs)
-        else:
-            sources, references, timeline = [], [], []
-        
-        return {
-            "answer": answer,
-            "sources": sources,
-            "references": references,
-            "timeline": timeline,
-            "has_sources": len(sources) > 0,
-            "success": True
+# Per-request fields that are not part of a cached answer
+UNCACHED_FIELDS = ("cache", "metrics")
+
+def process_query(query, db, chain, filters=None):
+    """Process a single query and return formatted response; filters restrict the sources searched"""
+    timer = StageTimer()
+    answer_cache = get_answer_cache()
+    cache_key = None
+    if answer_cache:
+        with timer.stage("cache_lookup"):
+            # The index version changes on every rebuild, which invalidates old answers
+            cache_key = answer_cache_key(query, filters=filters)
+            cached = answer_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "cache": {"answer": "hit"}, "metrics": cached_metrics(timer, cached)}
+
+    embedding_function = get_embedding_function()
+    embedding_hits = embedding_function.hits
+    result = run_query(query, db, chain, timer, filters=filters)
+    if result["success"]:
+        result["cache"] = {
+            "answer": "miss" if answer_cache else "disabled",
+            "query_embedding": "hit" if embedding_function.hits > embedding_hits else "miss",
         }
+        if answer_cache:
+            answer_cache.put(cache_key, {k: v for k, v in result.items() if k not in UNCACHED_FIELDS})
+    return result
+
+def query_metrics(timer, source_docs, prompt, answer, usage=None, retrieval=None, packing=None):
+    """
+    Timing breakdown and counters for one answered query. timings_ms has one
+    entry per stage plus their total; retrieval_ms breaks the retrieve stage
+    down further for retrievers that record it (hybrid).
+    """
+    from context import estimate_tokens
+    usage = usage or {}
+    metrics = {
+        "timings_ms": {**timer.as_dict(), "total": round(timer.total(), 1)},
+        "counters": {
+            "chunks_retrieved": len(source_docs),
+            "context_chars": sum(len(doc.page_content) for doc in source_docs),
+            "prompt_chars": len(prompt),
+            "tokens_in": usage.get("input_tokens") or estimate_tokens(prompt),
+            "tokens_out": usage.get("output_tokens") or estimate_tokens(answer),
+            "tokens_estimated": not usage,
+            "context_tokens_saved": (packing or {}).get("tokens_saved", 0),
+        },
+    }
+    if retrieval:
+        metrics["retrieval_ms"] = retrieval
+    return metrics
+
+def cached_metrics(timer, cached):
+    """Metrics for an answer served from the answer cache: no retrieval and no LLM call"""
+    return {
+        "timings_ms": {**timer.as_dict(), "total": round(timer.total(), 1)},
+        "counters": {"chunks_retrieved": len(cached.get("sources", [])), "tokens_in": 0, "tokens_out": 0},
+    }
+
+def retrieve(query, db, chain, timer, filters=None):
+    """
+    The chain's retriever results packed into the context budget, with the
+    embedding, the search and the packing timed separately.
+    Returns the documents and the packing stats.
+    """
+    with timer.stage("embed"):
+        embedding = db.embeddings.embed_query(query)
+    with timer.stage("retrieve"):
+        source_docs = retrieve_by_vector(
+            chain, db, query, embedding,
+            k=RETRIEVAL_PARAMS["k"],
+            similarity_score_threshold=RETRIEVAL_PARAMS["similarity_score_threshold"],
+            filters=filters,
+        ) or []
+    with timer.stage("pack_context"):
+        return assemble_context(db, embedding, source_docs)
+
+def assemble_context(db, embedding, source_docs):
+    """MMR-diversify, merge and budget the retrieved chunks; a budget of 0 turns this off"""
+    if not CONTEXT_PARAMS["token_budget"] or not source_docs:
+        return source_docs, None
+    from context import pack_context
+    return pack_context(db, embedding, source_docs, **CONTEXT_PARAMS)
+
+def build_result(answer, source_docs):
+    """The response shape shared by query, batch and the final stream event"""
+    # Only format sources if we have relevant ones
+    if source_docs:
+        sources, references, timeline = format_sources(source_docs)
+    else:
+        sources, references, timeline = [], [], []
+    
+    return {
+        "answer": answer,
+        "sources": sources,
+        "references": references,
+        "timeline": timeline,
+        "has_sources": len(sources) > 0,
+        "success": True
+    }
+
+def run_query(query, db, chain, timer=None, filters=None):
+    """
+    Run retrieval and the LLM for a query and format the response.
+    Same steps as chain.invoke, done one by one so each can be timed.
+    """
+    timer = timer or StageTimer()
+    try:
+        source_docs, packing = retrieve(query, db, chain, timer, filters=filters)
+        prompt = build_prompt(chain, query, source_docs)
+        with timer.stage("llm"):
+            message = chain_llm(chain).invoke(prompt)
+        answer = message.content if hasattr(message, "content") else str(message)
+
+        with timer.stage("format_sources"):
+            result = build_result(answer, source_docs)
+        result["metrics"] = query_metrics(
+            timer, source_docs, prompt, answer,
+            usage=getattr(message, "usage_metadata", None), retrieval=retrieval_timings(chain), packing=packing,
+        )
+        return result
     except Exception as e:
         return {
             "error": f"Query processing error: {str(e)}",
             "success": False
         }
 
+def stream_query(query, db, chain, emit, filters=None):
+    """
+    Answer a query as a sequence of events: the retrieved sources first,
+    then answer tokens as the LLM produces them, then a final summary
+    with the same fields process_query returns.
+    """
+    timer = StageTimer()
+    answer_cache = get_answer_cache()
+    cache_key = None
+    if answer_cache:
+        with timer.stage("cache_lookup"):
+            cache_key = answer_cache_key(query, filters=filters)
+            cached = answer_cache.get(cache_key)
+        if cached is not None:
+            emit({"event": "sources", **_sources_fields(cached)})
+            emit({"event": "token", "text": cached["answer"]})
+            emit({"event": "done", **cached, "cache": {"answer": "hit"}, "metrics": cached_metrics(timer, cached)})
+            return
+
+    try:
+        embedding_function = get_embedding_function()
+        embedding_hits = embedding_function.hits
+        source_docs, packing = retrieve(query, db, chain, timer, filters=filters)
+        retrieval = retrieval_timings(chain)
+        with timer.stage("format_sources"):
+            fields = _sources_fields(build_result("", source_docs))
+        emit({"event": "sources", **fields})
+
+        parts = []
+        prompt = build_prompt(chain, query, source_docs)
+        llm_started = time.perf_counter()
+        first_token_ms = None
+        for text in stream_answer(chain, query, source_docs, prompt=prompt):
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - llm_started) * 1000
+            parts.append(text)
+            emit({"event": "token", "text": text})
+        timer.add("llm", (time.perf_counter() - llm_started) * 1000)
+
+        answer = "".join(parts)
+        result = build_result(answer, source_docs)
+        if answer_cache:
+            answer_cache.put(cache_key, result)
+        metrics = query_metrics(timer, source_docs, prompt, answer, retrieval=retrieval, packing=packing)
+        if first_token_ms is not None:
+            metrics["first_token_ms"] = round(first_token_ms, 1)
+        emit({
+            "event": "done",
+            **result,
+            "cache": {
+                "answer": "miss" if answer_cache else "disabled",
+                "query_embedding": "hit" if embedding_function.hits > embedding_hits else "miss",
+            },
+            "metrics": metrics,
+        })
+    except Exception as e:
+        emit({"event": "error", "error": f"Query processing error: {str(e)}", "success": False})
+
+def _sources_fields(result):
+    return {key: result[key] for key in ("sources", "references", "timeline", "has_sources")}
+
+# --- Batch ---
+BATCH_EMBED_SIZE = 64
+MAX_LLM_RETRIES = 6
+
+def read_batch_queries(stream):
+    """One query per JSONL line: {"query": "..."}, a JSON string or plain text"""
+    queries = []
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            item = line
+        queries.append((item.get("query") or "") if isinstance(item, dict) else str(item))
+    return queries
+
+def is_rate_limit_error(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or "ratelimit" in type(error).__name__.lower() or "rate limit" in str(error).lower()
+
+async def invoke_with_backoff(llm, prompt, max_retries=MAX_LLM_RETRIES):
+    """Call the LLM, retrying rate-limited calls with jittered exponential backoff"""
+    delay = 1.0
+    for attempt in range(max_retries + 1):
+        try:
+            return await llm.ainvoke(prompt)
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, 60.0)
+
+async def run_batch(queries, db, chain, emit, concurrency=8, filters=None):
+    """
+    Answer many queries at once: cached answers are reused, the rest are
+    embedded in vectorized batches and searched one by one in a background
+    thread, and each query goes to the LLM as soon as its context is ready,
+    so retrieval for later queries overlaps the LLM calls for earlier ones.
+    LLM calls run concurrently under a semaphore. Results are emitted in
+    input order. filters apply to every query.
+    """
+    answer_cache = get_answer_cache()
+    index_version = read_index_version(current_index_dir())
+    results = [None] * len(queries)
+    cache_keys = [None] * len(queries)
+    todo = []
+    for i, query in enumerate(queries):
+        if not query:
+            results[i] = {"error": "No query provided", "success": False}
+            continue
+        if answer_cache:
+            cache_keys[i] = answer_cache_key(query, index_version, filters=filters)
+            cached = answer_cache.get(cache_keys[i])
+            if cached is not None:
+                results[i] = {**cached, "cache": {"answer": "hit"}}
+                continue
+        todo.append(i)
+
+    print(f"[INFO] Batch: {len(queries)} queries, {len(queries) - len(todo)} answered without the LLM", file=sys.stderr)
+    llm = chain_llm(chain)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(i, source_docs, packing, timer):
+        try:
+            prompt = build_prompt(chain, queries[i], source_docs)
+            async with semaphore:
+                with timer.stage("llm"):
+                    message = await invoke_with_backoff(llm, prompt)
+            text = message.content
+            with timer.stage("format_sources"):
+                result = build_result(text, source_docs)
+            if answer_cache:
+                answer_cache.put(cache_keys[i], result)
+            return {
+                **result,
+                "cache": {"answer": "miss" if answer_cache else "disabled"},
+                "metrics": query_metrics(
+                    timer, source_docs, prompt, text, usage=getattr(message, "usage_metadata", None), packing=packing
+                ),
+            }
+        except Exception as e:
+            return {"error": f"Query processing error: {str(e)}", "success": False}
+
+    def prepare(i, embedding, timer):
+        with timer.stage("retrieve"):
+            source_docs = retrieve_by_vector(
+                chain, db, queries[i], embedding,
+                k=RETRIEVAL_PARAMS["k"],
+                similarity_score_threshold=RETRIEVAL_PARAMS["similarity_score_threshold"],
+                filters=filters,
+            )
+        with timer.stage("pack_context"):
+            return assemble_context(db, embedding, source_docs)
+
+    # Resolved with each query's result; the LLM tasks resolve them as they finish
+    loop = asyncio.get_running_loop()
+    pending = {i: loop.create_future() for i in todo}
+
+    def settle(i, task):
+        if not task.cancelled():
+            pending[i].set_result(task.result())
+
+    async def produce():
+        for start in range(0, len(todo), BATCH_EMBED_SIZE):
+            group = todo[start:start + BATCH_EMBED_SIZE]
+            try:
+                embeddings = await asyncio.to_thread(
+                    get_embedding_function().embed_documents, [queries[i] for i in group]
+                )
+            except Exception as e:
+                for i in group:
+                    pending[i].set_result({"error": f"Query processing error: {str(e)}", "success": False})
+                continue
+            for i, embedding in zip(group, embeddings):
+                timer = StageTimer()
+                try:
+                    source_docs, packing = await asyncio.to_thread(prepare, i, embedding, timer)
+                except Exception as e:
+                    pending[i].set_result({"error": f"Query processing error: {str(e)}", "success": False})
+                    continue
+                task = asyncio.create_task(answer(i, source_docs, packing, timer))
+                task.add_done_callback(lambda task, i=i: settle(i, task))
+
+    producer = asyncio.create_task(produce())
+    # Emit in input order as soon as each prefix of answers is ready
+    for i in range(len(queries)):
+        if i in pending:
+            results[i] = await pending[i]
+        emit(results[i])
+    await producer
+
+def batch(argv):
+    parser = argparse.ArgumentParser(prog="chatbot_api.py batch", description="Answer queries from a JSONL file")
+    parser.add_argument("--input", help="JSONL file with one query per line (default: stdin)")
+    parser.add_argument("--output", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum concurrent LLM calls")
+    parser.add_argument("--profile-startup", action="store_true", help="print a start-up phase breakdown to stderr")
+    parser.add_argument("--retriever", choices=RETRIEVERS, help="retrieval mode (default: CHATBOT_RETRIEVER or vector)")
+    parser.add_argument("--after", help="only sources dated on or after YYYY[-MM[-DD]]")
+    parser.add_argument("--before", help="only sources dated on or before YYYY[-MM[-DD]]")
+    parser.add_argument("--source-type", help="comma-separated source types: html, pdf, csv")
+    args = parser.parse_args(argv)
+    try:
+        filters = parse_filters({"after": args.after, "before": args.before, "source_types": args.source_type})
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            queries = read_batch_queries(f)
+    else:
+        queries = read_batch_queries(sys.stdin)
+
+    # Keep stray library prints off the results stream
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        db, chain = initialize_chatbot()
+
+        def emit(result):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+
+        asyncio.run(run_batch(queries, db, chain, emit, concurrency=max(1, args.concurrency), filters=filters))
+    finally:
+        sys.stdout = sys.__stdout__
+        if args.output:
+            out.close()
+
+def handle_request(line, db, chain, emit):
+    """Answer one newline-delimited JSON request from a serve client"""
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        emit({"id": None, "error": f"Invalid request: {str(e)}", "success": False})
+        return
+
+    request_id = request.get("id")
+    query = request.get("query")
+    if not query:
+        emit({"id": request_id, "error": "No query provided", "success": False})
+        return
+    try:
+        filters = parse_filters(request.get("filters"))
+    except ValueError as e:
+        emit({"id": request_id, "error": f"Invalid filters: {str(e)}", "success": False})
+        return
+
+    if request.get("stream"):
+        stream_query(query, db, chain, lambda event: emit({"id": request_id, **event}), filters=filters)
+    else:
+        emit({"id": request_id, **process_query(query, db, chain, filters=filters)})
+
+class LiveIndex:
+    """
+    The store and chain a long-running process answers with. When a rebuild
+    switches the active index version, the next request reopens them, so
+    workers pick up new versions without a restart.
+    """
+
+    def __init__(self, db, chain):
+        self.db, self.chain = db, chain
+        self.version = current_index_name()
+        self._failed_version = None
+
+    def current(self):
+        version = current_index_name()
+        if version != self.version and version != self._failed_version:
+            try:
+                db = load_or_build_vector_store()
+                chain = setup_retrieval_qa(db, **RETRIEVAL_PARAMS)
+            except Exception as e:
+                # Keep answering from the version that is already open
+                self._failed_version = version
+                print(f"[WARN] Could not open index version {version}: {e}", file=sys.stderr)
+            else:
+                print(f"[INFO] Switched to index version {version}", file=sys.stderr)
+                self.db, self.chain, self.version = db, chain, version
+        return self.db, self.chain
+
+def serve_stream(instream, outstream, live, lock=None):
+    """Read requests line by line from instream and write JSON lines with the answers"""
+    def emit(message):
+        outstream.write(json.dumps(message) + "\n")
+        outstream.flush()
+
+    emit({"event": "ready", "pid": os.getpid(), "startup_ms": round(startup_profile.total(), 1)})
+    for line in instream:
+        if not line.strip():
+            continue
+        if lock:
+            with lock:
+                handle_request(line, *live.current(), emit)
+        else:
+            handle_request(line, *live.current(), emit)
+
+def serve(socket_path=None, workers=1, queue_size=None, request_timeout=0):
+    """
+    Load the model, vector store and chain once, then answer requests until
+    EOF. With workers > 1 the requests are answered by that many forked
+    workers sharing the loaded model (see prefork.py).
+    """
+    # Keep stray library prints off the protocol stream
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    if workers > 1 and socket_path:
+        print("[WARN] --workers is not supported with --socket; serving from one process", file=sys.stderr)
+    elif workers > 1:
+        serve_prefork(protocol_out, workers, queue_size, request_timeout)
+        return
+
+    live = LiveIndex(*initialize_chatbot())
+
+    if not socket_path:
+        serve_stream(sys.stdin, protocol_out, live)
+        return
+
+    # The chain is not safe to share between threads, so connections take turns
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            reader = (line.decode("utf-8") for line in self.rfile)
+            writer = _SocketWriter(self.wfile)
+            serve_stream(reader, writer, live, lock=lock)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+        print(f"[INFO] Chatbot serving on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+def serve_prefork(outstream, workers, queue_size=None, request_timeout=0):
+    """
+    Load the libraries, the embedding model and the store-independent part of
+    the chain in this process, then fork workers that inherit them. Each
+    worker only opens its own handles (SQLite, Chroma, ONNX Runtime) and
+    wraps its store in a retriever for the shared answer chain.
+    """
+    from embedding_backends import fork_safe, set_worker_threads
+    from prefork import PreforkPool
+
+    with startup_profile.stage("preload"):
+        _preload_for_workers()
+    if fork_safe():
+        with startup_profile.stage("model_load"):
+            load_embedding_model()
+    with startup_profile.stage("index_prepare"):
+        _prepare_index()
+
+    # Share the cores between the workers instead of each using all of them
+    threads = EMBEDDING_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+    def worker_main(reader, writer):
+        set_worker_threads(threads)
+        serve_stream(reader, writer, LiveIndex(*initialize_chatbot()))
+
+    pool = PreforkPool(
+        workers, worker_main, queue_size=4 * workers if queue_size is None else queue_size,
+        request_timeout=request_timeout,
+    )
+    pool.serve(sys.stdin, outstream)
+
+def _preload_for_workers():
+    """
+    Import what answering a query needs and build the prompt and answer
+    chain, none of which hold handles, so forked workers share them
+    instead of each importing and building its own copy
+    """
+    import importlib
+
+    from chat1 import VECTOR_BACKEND
+
+    modules = ["langchain.chains", "langchain_chroma", "langchain_core.prompts", "context"]
+    if VECTOR_BACKEND == "faiss":
+        modules += ["faiss", "faiss_store"]
+    if RETRIEVAL_PARAMS["retriever"] == "hybrid":
+        modules += ["hybrid", "bm25"]
+    for name in modules:
+        importlib.import_module(name)
+    get_embedding_function()
+    get_answer_chain(RETRIEVAL_PARAMS["max_words"])
+
+def _prepare_index():
+    """
+    Build the index or its FAISS export if missing, once, before the workers
+    start. This runs in a short-lived child so the parent never holds store
+    handles that the workers would inherit.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            load_or_build_vector_store()
+            code = 0
+        except BaseException as e:
+            print(f"[ERROR] Could not prepare the vector store: {e}", file=sys.stderr)
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        print(json.dumps({"error": "Initialization error: could not prepare the vector store"}))
+        sys.exit(1)
+
+class _SocketWriter:
+    """Text adapter over a socket's binary write file"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode("utf-8"))
+
+    def flush(self):
+        self.wfile.flush()
+
+def option_value(name, description):
+    """Value following name on the command line, or None when it is not given"""
+    if name not in sys.argv:
+        return None
+    index = sys.argv.index(name)
+    if index + 1 >= len(sys.argv):
+        print(json.dumps({"error": f"No {description} provided"}))
+        sys.exit(1)
+    return sys.argv[index + 1]
+
+def filters_or_exit(argv):
+    try:
+        return parse_filter_args(argv)
+    except ValueError as e:
+        print(json.dumps({"error": f"Invalid filters: {str(e)}"}))
+        sys.exit(1)
+
 def main():
     """Main function to handle command line arguments"""
     if len(sys.argv) < 2:
@@ -141,28 +733,80 @@ def main():
     
     if command == "init":
         # Just initialize and return success
-        db, chain = initialize_chatbot()
-        print(json.dumps({"success": True, "message": "Chatbot initialized"}))
+        db, chain = initialize_chatbot(load_model=False)
+        result = {"success": True, "message": "Chatbot initialized"}
+        if PROFILE_STARTUP:
+            result["startup_profile"] = startup_profile_report()
+        print(json.dumps(result))
     
     elif command == "query":
         if len(sys.argv) < 3:
             print(json.dumps({"error": "No query provided"}))
             sys.exit(1)
         
+        # query "..." [--after YYYY[-MM[-DD]]] [--before ...] [--source-type pdf,html]
         query = sys.argv[2]
-        db, chain = initialize_chatbot()
-        result = process_query(query, db, chain)
+        filters = filters_or_exit(sys.argv[3:])
+        db, chain = initialize_chatbot(load_model=False)
+        result = process_query(query, db, chain, filters=filters)
+        if "metrics" in result:
+            # A one-shot query pays for start-up too
+            result["metrics"]["startup_ms"] = startup_profile_report()
         print(json.dumps(result))
     
+    elif command == "stream":
+        if len(sys.argv) < 3:
+            print(json.dumps({"error": "No query provided"}))
+            sys.exit(1)
+        
+        query = sys.argv[2]
+        filters = filters_or_exit(sys.argv[3:])
+        db, chain = initialize_chatbot(load_model=False)
+        stream_query(query, db, chain, lambda event: print(json.dumps(event), flush=True), filters=filters)
+    
+    elif command == "batch":
+        # batch [--input queries.jsonl] [--output results.jsonl] [--concurrency N]
+        batch(sys.argv[2:])
+    
+    elif command == "serve":
+        # Optional: serve --socket /path/to/chatbot.sock
+        # or: serve --workers N [--queue-size N] [--request-timeout SECONDS]
+        socket_path = option_value("--socket", "socket path")
+        workers = int(option_value("--workers", "worker count") or SERVE_WORKERS)
+        queue_size = option_value("--queue-size", "queue size")
+        request_timeout = float(option_value("--request-timeout", "request timeout") or 0)
+        serve(
+            socket_path,
+            workers=workers if workers > 0 else os.cpu_count() or 1,
+            queue_size=int(queue_size) if queue_size is not None else None,
+            request_timeout=request_timeout,
+        )
+    
     elif command == "rebuild":
         try:
-            # Rebuild the vector store
-            from chat1 import initialize_vector_store_from_cache
-            db = initialize_vector_store_from_cache()
-            print(json.dumps({"success": True, "message": "Vector store rebuilt"}))
+            # Build a new index version beside the live one; serving workers switch on their next request
+            from chat1 import rebuild_index
+            db, report = rebuild_index(full="--full" in sys.argv)
+            print(json.dumps({
+                "success": True,
+                "message": (
+                    f"Vector store rebuilt: {len(report['added'])} added, "
+                    f"{len(report['updated'])} updated, {len(report['removed'])} removed; "
+                    f"index version {report['version']} is live"
+                ),
+                "report": report,
+            }))
         except Exception as e:
             print(json.dumps({"error": f"Rebuild error: {str(e)}", "success": False}))
     
+    elif command == "rollback":
+        try:
+            from chat1 import rollback_index
+            version = rollback_index()
+            print(json.dumps({"success": True, "message": f"Index version {version} is live again", "version": version}))
+        except Exception as e:
+            print(json.dumps({"error": f"Rollback error: {str(e)}", "success": False}))
+    
     else:
         print(json.dumps({"error": f"Unknown command: {command}"}))
         sys.exit(1)
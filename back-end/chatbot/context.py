@@ -0,0 +1,177 @@
+# context.py
+"""
+Context assembly between the retriever and the prompt.
+
+Retrieved chunks are reordered by maximal marginal relevance so near-identical
+chunks don't crowd out other evidence, overlapping neighbouring chunks of the
+same source are merged, and the result is packed into a token budget.
+"""
+import sys
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Chunks are split with a 200 character overlap; leave some slack
+MAX_CHUNK_OVERLAP = 400
+MIN_OVERLAP = 20
+# Don't bother trimming a chunk to fit into less than this
+MIN_TRIMMED_TOKENS = 80
+
+
+def estimate_tokens(text):
+    """Rough count for when no tokenizer is at hand (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def maximal_marginal_relevance(query_embedding, embeddings, lambda_mult=0.7):
+    """
+    Indices of embeddings ordered by MMR against the query, most useful first.
+    lambda_mult 1.0 ranks purely by relevance, 0.0 purely by diversity.
+    """
+    if not len(embeddings):
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(np.linalg.norm(query), 1e-12)
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    remaining = set(range(len(vectors))) - set(selected)
+    while remaining:
+        candidates = sorted(remaining)
+        redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        scores = lambda_mult * relevance[candidates] - (1 - lambda_mult) * redundancy
+        best = candidates[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def overlap_length(left, right, max_overlap=MAX_CHUNK_OVERLAP):
+    """Length of the longest suffix of left that is also a prefix of right"""
+    for length in range(min(len(left), len(right), max_overlap), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def _position(doc):
+    """(source key, chunk number) from a "source::n" chunk ID, or None"""
+    source, _, number = (doc.id or "").rpartition("::")
+    return (source, int(number)) if source and number.isdigit() else None
+
+
+def trim_to_tokens(text, tokens):
+    """Cut text to roughly the given token count, at a sentence or word boundary if possible"""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    for boundary in (". ", "\n", " "):
+        index = cut.rfind(boundary)
+        if index > limit // 2:
+            return cut[:index + 1].rstrip()
+    return cut
+
+
+def _document_embeddings(db, docs):
+    """Stored embeddings for the documents, embedding any that can't be looked up"""
+    ids = [doc.id for doc in docs if doc.id]
+    stored = {}
+    if ids:
+        found = db.get(ids=ids, include=["embeddings"])
+        stored = dict(zip(found["ids"], found["embeddings"]))
+    missing = [i for i, doc in enumerate(docs) if doc.id not in stored]
+    computed = db.embeddings.embed_documents([docs[i].page_content for i in missing]) if missing else []
+    by_index = dict(zip(missing, computed))
+    return [stored[doc.id] if doc.id in stored else by_index[i] for i, doc in enumerate(docs)]
+
+
+def pack_context(db, query_embedding, docs, token_budget=1800, mmr_lambda=0.7):
+    """
+    Diversify, merge and pack retrieved chunks. Returns the documents to put
+    in the prompt and stats on the tokens saved.
+    """
+    tokens_before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    if len(docs) > 1:
+        order = maximal_marginal_relevance(query_embedding, _document_embeddings(db, docs), mmr_lambda)
+        docs = [docs[i] for i in order]
+
+    # Greedy packing in MMR order; a chunk next to one already taken only
+    # costs the text the two don't share
+    taken = {}
+    positions = {}
+    used = 0
+    for rank, doc in enumerate(docs):
+        text = doc.page_content
+        position = _position(doc)
+        shared = 0
+        if position:
+            source, number = position
+            before = positions.get((source, number - 1))
+            after = positions.get((source, number + 1))
+            if before is not None:
+                shared += overlap_length(taken[before].page_content, text)
+            if after is not None:
+                shared += overlap_length(text, taken[after].page_content)
+        cost = estimate_tokens(text[shared:]) if shared < len(text) else 0
+        if used + cost > token_budget:
+            room = token_budget - used
+            if room < MIN_TRIMMED_TOKENS or shared:
+                continue
+            doc = Document(id=doc.id, page_content=trim_to_tokens(text, room), metadata=doc.metadata)
+            cost = estimate_tokens(doc.page_content)
+            # A trimmed chunk no longer lines up with its neighbours
+            position = None
+        taken[rank] = doc
+        if position:
+            positions[position] = rank
+        used += cost
+
+    packed = _merge_neighbours([taken[rank] for rank in sorted(taken)])
+    tokens_after = sum(estimate_tokens(doc.page_content) for doc in packed)
+    stats = {
+        "chunks_in": len(docs),
+        "chunks_out": len(packed),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
+    print(
+        f"[INFO] Context packing: {stats['chunks_in']} -> {stats['chunks_out']} chunks, "
+        f"{tokens_before} -> {tokens_after} tokens (saved {stats['tokens_saved']})",
+        file=sys.stderr,
+    )
+    return packed, stats
+
+
+def _merge_neighbours(docs):
+    """
+    Join consecutive chunks of the same source that overlap into one
+    document without the repeated text. Each merged document takes the
+    place of its best-ranked part.
+    """
+    ranked = []
+    run, run_rank, previous = None, None, None
+    positioned = sorted(
+        ((_position(doc), rank, doc) for rank, doc in enumerate(docs) if _position(doc)),
+        key=lambda item: item[0],
+    )
+    for position, rank, doc in positioned:
+        shared = 0
+        if run is not None and position == (previous[0], previous[1] + 1):
+            shared = overlap_length(run.page_content, doc.page_content)
+        if shared:
+            run = Document(id=run.id, page_content=run.page_content + doc.page_content[shared:], metadata=run.metadata)
+            run_rank = min(run_rank, rank)
+        else:
+            if run is not None:
+                ranked.append((run_rank, run))
+            run, run_rank = doc, rank
+        previous = position
+    if run is not None:
+        ranked.append((run_rank, run))
+    ranked.extend((rank, doc) for rank, doc in enumerate(docs) if not _position(doc))
+    return [doc for _, doc in sorted(ranked, key=lambda item: item[0])]
@@ -0,0 +1,173 @@
+# dedup.py
+"""
+Exact and near-duplicate detection for chunks before they are embedded.
+
+The same paper often arrives as a cached HTML page, a PDF and a CSV
+abstract. Exact duplicates are found by hashing normalized text;
+near-duplicates by MinHash signatures over word shingles, bucketed with
+LSH and confirmed by estimated Jaccard similarity. The index lives in
+SQLite next to the vector store so incremental builds dedup against
+chunks indexed earlier, and it records which sources had chunks dropped
+in favour of each kept chunk so those sources are re-indexed when the
+kept chunk goes away.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+DEDUP_INDEX_NAME = "dedup_index.sqlite3"
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() != "false"
+# Estimated Jaccard similarity above which two chunks count as the same
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+
+NUM_PERM = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+# SQLite's default limit on bound variables is 999 in older builds
+_SQL_BATCH = 500
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def content_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def minhash(text):
+    """MinHash signature (NUM_PERM uint64 values) of the text's word shingles"""
+    words = normalize_text(text).split(" ")
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    values = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+    )
+    # Universal hashing; uint64 overflow wraps, as in the usual MinHash implementations
+    with np.errstate(over="ignore"):
+        hashed = (np.outer(_PERM_A, values) + _PERM_B[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return hashed.min(axis=1)
+
+
+def lsh_buckets(signature):
+    rows = NUM_PERM // LSH_BANDS
+    return [f"{band}:{signature[band * rows:(band + 1) * rows].tobytes().hex()}" for band in range(LSH_BANDS)]
+
+
+def merge_metadata(metadata, duplicates):
+    """Metadata of a kept chunk extended with the links (or titles) of the copies dropped in its favour"""
+    entries = [entry for entry in metadata.get("also_in", "").split("\n") if entry]
+    for md in duplicates:
+        entry = md.get("link") or md.get("title")
+        if entry and entry != metadata.get("link") and entry not in entries:
+            entries.append(entry)
+    if not entries:
+        return metadata
+    return {**metadata, "also_in": "\n".join(entries)}
+
+
+def _batched(items):
+    items = list(items)
+    for start in range(0, len(items), _SQL_BATCH):
+        yield items[start:start + _SQL_BATCH]
+
+
+class DedupIndex:
+    """Kept chunks with their content hash and MinHash signature, plus the duplicates dropped for them"""
+
+    def __init__(self, index_dir, threshold=DEDUP_THRESHOLD):
+        self.path = Path(index_dir) / DEDUP_INDEX_NAME
+        self.threshold = threshold
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, hash TEXT NOT NULL, signature BLOB NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS chunks_hash ON chunks (hash);"
+            "CREATE TABLE IF NOT EXISTS buckets (bucket TEXT NOT NULL, id TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket);"
+            "CREATE INDEX IF NOT EXISTS buckets_id ON buckets (id);"
+            "CREATE TABLE IF NOT EXISTS duplicates (id TEXT PRIMARY KEY, kept_id TEXT NOT NULL, source TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS duplicates_kept ON duplicates (kept_id);"
+        )
+        self._conn.commit()
+
+    def match(self, chunk_id, source, text):
+        """
+        Register a chunk. Returns (kept chunk ID, "exact" or "near") if it
+        duplicates an indexed chunk and should be dropped, else (None, None).
+        """
+        digest = content_hash(text)
+        row = self._conn.execute("SELECT id FROM chunks WHERE hash = ?", (digest,)).fetchone()
+        # A chunk matching itself means its batch is being redone after an interruption
+        if row is not None and row[0] != chunk_id:
+            return self._record_duplicate(chunk_id, row[0], source, "exact")
+
+        signature = minhash(text)
+        buckets = lsh_buckets(signature)
+        placeholders = ",".join("?" * len(buckets))
+        candidates = self._conn.execute(
+            f"SELECT DISTINCT c.id, c.signature FROM buckets b JOIN chunks c ON c.id = b.id"
+            f" WHERE b.bucket IN ({placeholders})",
+            buckets,
+        ).fetchall()
+        best_id, best_similarity = None, 0.0
+        for candidate_id, blob in candidates:
+            if candidate_id == chunk_id:
+                continue
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature))
+            if similarity > best_similarity:
+                best_id, best_similarity = candidate_id, similarity
+        if best_id is not None and best_similarity >= self.threshold:
+            return self._record_duplicate(chunk_id, best_id, source, "near")
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chunks (id, hash, signature) VALUES (?, ?, ?)",
+            (chunk_id, digest, signature.tobytes()),
+        )
+        self._conn.execute("DELETE FROM buckets WHERE id = ?", (chunk_id,))
+        self._conn.executemany("INSERT INTO buckets (bucket, id) VALUES (?, ?)", [(b, chunk_id) for b in buckets])
+        return None, None
+
+    def _record_duplicate(self, chunk_id, kept_id, source, kind):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO duplicates (id, kept_id, source) VALUES (?, ?, ?)", (chunk_id, kept_id, source)
+        )
+        return kept_id, kind
+
+    def dependents(self, chunk_ids):
+        """Sources that had chunks dropped in favour of any of these chunks"""
+        sources = set()
+        for ids in _batched(chunk_ids):
+            rows = self._conn.execute(
+                f"SELECT DISTINCT source FROM duplicates WHERE kept_id IN ({','.join('?' * len(ids))})", ids
+            )
+            sources.update(row[0] for row in rows)
+        return sources
+
+    def forget(self, chunk_ids):
+        """Drop chunks that are about to be deleted or re-indexed"""
+        for ids in _batched(chunk_ids):
+            placeholders = ",".join("?" * len(ids))
+            self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", ids)
+            self._conn.execute(f"DELETE FROM buckets WHERE id IN ({placeholders})", ids)
+            self._conn.execute(f"DELETE FROM duplicates WHERE id IN ({placeholders})", ids)
+            self._conn.execute(f"DELETE FROM duplicates WHERE kept_id IN ({placeholders})", ids)
+        self.commit()
+
+    def clear(self):
+        self._conn.executescript("DELETE FROM chunks; DELETE FROM buckets; DELETE FROM duplicates;")
+        self.commit()
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
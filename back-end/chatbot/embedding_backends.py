@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Embedding backends for the sentence-transformer model.
+
+torch runs the model as before; onnx runs the same weights through ONNX
+Runtime; onnx-int8 uses the dynamically quantized ONNX export. Batch size
+and thread count are configurable for all of them.
+
+Before switching backends, check that the new embeddings agree with the
+ones already stored in the vector store:
+
+    python embedding_backends.py check --backend onnx-int8
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Texts per forward pass
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Intra-op threads; 0 leaves the runtime default
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Mean cosine similarity a backend must reach against the stored embeddings
+EMBEDDING_AGREEMENT_THRESHOLD = float(os.getenv("EMBEDDING_AGREEMENT_THRESHOLD", "0.99"))
+QUANTIZED_EXPORT_DIR = Path("Cache") / "onnx"
+
+
+def _quantization_config():
+    """Quantized export matching this CPU, as named in the model repository"""
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return "arm64", "onnx/model_qint8_arm64.onnx"
+    try:
+        flags = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        flags = ""
+    if "avx512" in flags:
+        return "avx512", "onnx/model_qint8_avx512.onnx"
+    return "avx2", "onnx/model_quint8_avx2.onnx"
+
+
+def _onnx_model_kwargs(threads):
+    kwargs = {"provider": "CPUExecutionProvider"}
+    if threads:
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        kwargs["session_options"] = options
+    return kwargs
+
+
+def _export_quantized(model_name, config, threads):
+    """Quantize the ONNX model locally when the repository has no ready-made export"""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    target = QUANTIZED_EXPORT_DIR / f"{model_name.replace('/', '__')}-{config}"
+    if not target.exists():
+        print(f"[INFO] Exporting int8 ONNX model to {target}...", file=sys.stderr)
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs=_onnx_model_kwargs(threads))
+        model.save_pretrained(str(target))
+        export_dynamic_quantized_onnx_model(model, config, str(target))
+    return str(target), f"onnx/model_qint8_{config}.onnx"
+
+
+def load_embeddings(backend=None, model_name=EMBEDDING_MODEL_NAME, batch_size=None, threads=None):
+    """HuggingFaceEmbeddings running model_name on the chosen backend"""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    backend = backend or EMBEDDING_BACKEND
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    threads = EMBEDDING_THREADS if threads is None else threads
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+
+    encode_kwargs = {"batch_size": batch_size}
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs=encode_kwargs)
+
+    model_kwargs = _onnx_model_kwargs(threads)
+    if backend == "onnx-int8":
+        config, file_name = _quantization_config()
+        try:
+            return HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"backend": "onnx", "model_kwargs": {**model_kwargs, "file_name": file_name}},
+                encode_kwargs=encode_kwargs,
+            )
+        except Exception as e:
+            print(f"[WARN] No ready-made {file_name} ({e}); quantizing locally", file=sys.stderr)
+            model_name, file_name = _export_quantized(model_name, config, threads)
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"backend": "onnx", "model_kwargs": {**model_kwargs, "file_name": file_name}},
+            encode_kwargs=encode_kwargs,
+        )
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"backend": "onnx", "model_kwargs": model_kwargs},
+        encode_kwargs=encode_kwargs,
+    )
+
+
+def fork_safe(backend=None):
+    """
+    Whether a model loaded by this backend keeps working in forked children.
+    ONNX Runtime sessions own thread pools that do not survive a fork, so
+    those backends have to load in each worker.
+    """
+    return (backend or EMBEDDING_BACKEND) == "torch"
+
+
+def set_worker_threads(threads):
+    """Intra-op threads for one of several workers sharing the CPU; call before the first embedding"""
+    global EMBEDDING_THREADS
+    EMBEDDING_THREADS = threads
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+# --- Agreement check ---
+def _sample_stored(db, samples, seed):
+    """Random sample of (id, text, stored embedding) from the vector store"""
+    total = db._collection.count()
+    rng = random.Random(seed)
+    offsets = sorted(rng.sample(range(total), min(samples, total)))
+    picked = []
+    for offset in offsets:
+        page = db.get(include=["documents", "embeddings"], limit=1, offset=offset)
+        if len(page["ids"]):
+            picked.append((page["ids"][0], page["documents"][0], page["embeddings"][0]))
+    return picked
+
+
+def _pseudo_query(text):
+    """First sentence of a chunk, standing in for a user question about it"""
+    sentence = text.strip().split(". ")[0]
+    return " ".join(sentence.split()[:24])
+
+
+def check_agreement(backend, samples=300, k=12, seed=0, batch_sizes=(16, 32, 64, 128), threshold=None):
+    """
+    Compare a backend against the embeddings stored in the vector store:
+    cosine similarity of re-embedded chunks, overlap of the top k results
+    for pseudo-queries, and throughput at several batch sizes.
+    """
+    import numpy as np
+
+    from chat1 import open_vector_store
+
+    threshold = EMBEDDING_AGREEMENT_THRESHOLD if threshold is None else threshold
+    db = open_vector_store()
+    picked = _sample_stored(db, samples, seed)
+    if not picked:
+        raise RuntimeError("The vector store is empty; build it before checking agreement")
+    ids, texts, stored = zip(*picked)
+
+    candidate = load_embeddings(backend)
+    fresh = np.asarray(candidate.embed_documents(list(texts)), dtype=np.float32)
+    stored = np.asarray(stored, dtype=np.float32)
+    cosine = np.sum(fresh * stored, axis=1) / (
+        np.linalg.norm(fresh, axis=1) * np.linalg.norm(stored, axis=1) + 1e-12
+    )
+
+    # Same queries searched with the current query embeddings and the candidate's
+    reference = load_embeddings("torch") if backend != "torch" else candidate
+    overlaps = []
+    for text in texts[: min(len(texts), 100)]:
+        query = _pseudo_query(text)
+        current = {doc.id for doc, _ in db.similarity_search_by_vector_with_relevance_scores(reference.embed_query(query), k=k)}
+        switched = {doc.id for doc, _ in db.similarity_search_by_vector_with_relevance_scores(candidate.embed_query(query), k=k)}
+        overlaps.append(len(current & switched) / max(len(current | switched), 1))
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        model = load_embeddings(backend, batch_size=batch_size)
+        model.embed_documents(list(texts[:batch_size]))  # warm up
+        started = time.perf_counter()
+        model.embed_documents(list(texts))
+        throughput[str(batch_size)] = round(len(texts) / (time.perf_counter() - started), 1)
+
+    report = {
+        "backend": backend,
+        "samples": len(texts),
+        "cosine": {
+            "mean": round(float(cosine.mean()), 5),
+            "min": round(float(cosine.min()), 5),
+            "p5": round(float(np.percentile(cosine, 5)), 5),
+        },
+        "top_k_jaccard": {"k": k, "mean": round(float(np.mean(overlaps)), 4), "min": round(float(np.min(overlaps)), 4)},
+        "chunks_per_sec_by_batch_size": throughput,
+        "threshold": threshold,
+    }
+    report["passed"] = report["cosine"]["mean"] >= threshold
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check", help="compare a backend against the stored embeddings")
+    check.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="onnx-int8")
+    check.add_argument("--samples", type=int, default=300, help="stored chunks to re-embed")
+    check.add_argument("--k", type=int, default=12, help="results compared per pseudo-query")
+    check.add_argument("--seed", type=int, default=0)
+    check.add_argument("--batch-sizes", default="16,32,64,128", help="comma-separated batch sizes to time")
+    check.add_argument("--threshold", type=float, help="minimum mean cosine similarity to pass")
+    args = parser.parse_args(argv)
+
+    report = check_agreement(
+        args.backend,
+        samples=args.samples,
+        k=args.k,
+        seed=args.seed,
+        batch_sizes=[int(size) for size in args.batch_sizes.split(",") if size],
+        threshold=args.threshold,
+    )
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
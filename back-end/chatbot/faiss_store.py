@@ -0,0 +1,353 @@
+# faiss_store.py
+"""
+Read-only FAISS backend for queries.
+
+Chroma stays the store that ingestion writes to; after a rebuild its
+embeddings are exported into a FAISS index on disk, which query processes
+open memory-mapped so several workers share one page-cached copy.
+Documents and metadata live in a small SQLite side store keyed by the
+index position, with the filterable fields in their own columns so
+metadata filters select candidate positions before the search. Each export goes to a fresh directory and a CURRENT
+pointer file is swapped atomically, so open readers are never disturbed
+and pick up the new index on their next search.
+"""
+import json
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import uuid
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+FAISS_DIR_NAME = "faiss"
+CURRENT_NAME = "CURRENT"
+INDEX_FILE = "index.faiss"
+META_FILE = "chunks.sqlite3"
+
+# flat: exact float32; sq8: exact scan over int8 codes (4x smaller);
+# ivf: inverted lists, probes FAISS_NPROBE of them; ivfpq: ivf with product-quantized codes
+FAISS_INDEX_TYPES = ("flat", "sq8", "ivf", "ivfpq")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+# FAISS wants about this many training points per centroid
+_TRAINING_POINTS_PER_CENTROID = 39
+# Metadata fields stored as columns of the side store, usable in filters
+FILTER_COLUMNS = ("date", "source_type")
+_SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_sql(where):
+    """SQL condition and parameters for a Chroma-style where-clause over FILTER_COLUMNS"""
+    if set(where) <= {"$and", "$or"} and len(where) == 1:
+        operator, clauses = next(iter(where.items()))
+        parts = [where_sql(clause) for clause in clauses]
+        joiner = " AND " if operator == "$and" else " OR "
+        return "(" + joiner.join(sql for sql, _ in parts) + ")", [p for _, params in parts for p in params]
+    conditions, params = [], []
+    for field, condition in where.items():
+        if field not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot filter the FAISS index on {field!r}")
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                values = list(value)
+                negate = "NOT " if operator == "$nin" else ""
+                conditions.append(f"{field} {negate}IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            elif operator in _SQL_OPERATORS:
+                conditions.append(f"{field} {_SQL_OPERATORS[operator]} ?")
+                params.append(value)
+            else:
+                raise ValueError(f"Unsupported filter operator {operator!r}")
+    return "(" + " AND ".join(conditions) + ")", params
+
+
+def _index_description(index_type, dimension, count):
+    """faiss.index_factory string for the requested type, falling back when there is too little data to train"""
+    if index_type in ("ivf", "ivfpq"):
+        nlist = min(int(4 * math.sqrt(count)), count // _TRAINING_POINTS_PER_CENTROID)
+        if nlist < 2:
+            print(f"[WARN] {count} vectors are too few to train {index_type}; using flat", file=sys.stderr)
+            return "flat", "Flat"
+        if index_type == "ivfpq":
+            m = max(d for d in range(1, min(FAISS_PQ_M, dimension) + 1) if dimension % d == 0)
+            if count < 256 * _TRAINING_POINTS_PER_CENTROID:
+                print(f"[WARN] {count} vectors are too few to train 8-bit PQ codes; using sq8", file=sys.stderr)
+                return "sq8", "SQ8"
+            return index_type, f"IVF{nlist},PQ{m}x8"
+        return index_type, f"IVF{nlist},Flat"
+    if index_type == "sq8":
+        return index_type, "SQ8"
+    return "flat", "Flat"
+
+
+def _faiss_root(index_dir):
+    return Path(index_dir) / FAISS_DIR_NAME
+
+
+def current_faiss_index(index_dir):
+    """Directory of the current export, or None if there is none"""
+    root = _faiss_root(index_dir)
+    try:
+        name = (root / CURRENT_NAME).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    path = root / name
+    return path if (path / INDEX_FILE).exists() else None
+
+
+def _export_info(path):
+    try:
+        return json.loads((path / "info.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def faiss_index_info(index_dir):
+    """Build info of the current export (requested and actual type, vector count), or None"""
+    path = current_faiss_index(index_dir)
+    return None if path is None else _export_info(path)
+
+
+def _mmap_flags(faiss, index_type):
+    """
+    read_index flags that map the vector codes of an index type from the
+    file instead of copying them, or None if this faiss build can't
+    """
+    if index_type in ("ivf", "ivfpq"):
+        # The codes live in the inverted lists, which IO_FLAG_MMAP maps
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    if index_type in ("flat", "sq8"):
+        # IndexFlatCodes, whose codes IO_FLAG_MMAP leaves in memory
+        return getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    return None
+
+
+def build_faiss_index(db, index_dir, index_type=FAISS_INDEX_TYPE, page_size=5000):
+    """Export every chunk in the Chroma store into a new FAISS index and make it current"""
+    import faiss
+    import numpy as np
+
+    if index_type not in FAISS_INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}, expected one of {', '.join(FAISS_INDEX_TYPES)}")
+
+    root = _faiss_root(index_dir)
+    root.mkdir(exist_ok=True)
+    name = f"{index_type}-{uuid.uuid4().hex[:12]}"
+    path = root / name
+    path.mkdir()
+
+    meta = sqlite3.connect(str(path / META_FILE))
+    meta.execute(
+        "CREATE TABLE chunks (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, document TEXT, metadata TEXT, "
+        "date INTEGER NOT NULL DEFAULT 0, source_type TEXT NOT NULL DEFAULT '')"
+    )
+    vectors = []
+    offset = 0
+    while True:
+        page = db.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        meta.executemany(
+            "INSERT INTO chunks (pos, id, document, metadata, date, source_type) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    offset + i, chunk_id, text, json.dumps(metadata or {}, separators=(",", ":")),
+                    (metadata or {}).get("date") or 0, (metadata or {}).get("source_type") or "",
+                )
+                for i, (chunk_id, text, metadata) in enumerate(zip(page["ids"], page["documents"], page["metadatas"]))
+            ],
+        )
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    meta.execute("CREATE INDEX chunks_date ON chunks (date)")
+    meta.execute("CREATE INDEX chunks_source_type ON chunks (source_type)")
+    meta.commit()
+    meta.close()
+
+    if not vectors:
+        shutil.rmtree(path)
+        print("[WARN] Vector store is empty; no FAISS index built", file=sys.stderr)
+        return None
+
+    matrix = np.ascontiguousarray(np.vstack(vectors))
+    actual_type, description = _index_description(index_type, matrix.shape[1], len(matrix))
+    # Same metric as Chroma's default, so relevance scores and thresholds carry over
+    index = faiss.index_factory(matrix.shape[1], description, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(matrix)
+    index.add(matrix)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Lets get(include=["embeddings"]) reconstruct vectors by position
+        ivf.make_direct_map()
+    faiss.write_index(index, str(path / INDEX_FILE))
+    (path / "info.json").write_text(
+        json.dumps({"requested": index_type, "type": actual_type, "factory": description, "count": len(matrix)}),
+        encoding="utf-8",
+    )
+
+    pointer = root / CURRENT_NAME
+    tmp_pointer = pointer.with_suffix(".tmp")
+    tmp_pointer.write_text(name, encoding="utf-8")
+    os.replace(tmp_pointer, pointer)
+    # Processes still reading an old export keep their open files; unlinking doesn't disturb them
+    for old in root.iterdir():
+        if old.is_dir() and old.name != name:
+            shutil.rmtree(old, ignore_errors=True)
+    print(f"[INFO] FAISS index built: {len(matrix)} vectors, {description}", file=sys.stderr)
+    return path
+
+
+class FaissStore(VectorStore):
+    """
+    Query-side vector store over the exported FAISS index. Implements the
+    parts of the Chroma interface the chatbot uses: similarity search
+    (returning L2 distances like Chroma), as_retriever, get and embeddings.
+    """
+
+    def __init__(self, index_dir, embedding_function, nprobe=FAISS_NPROBE):
+        self.index_dir = Path(index_dir)
+        self._embedding_function = embedding_function
+        self.nprobe = nprobe
+        self._path = None
+        self._index = None
+        self._meta = None
+        self._refresh()
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def _refresh(self):
+        """Switch to a newer export if a rebuild made one current"""
+        path = current_faiss_index(self.index_dir)
+        if path is None:
+            if self._index is None:
+                raise FileNotFoundError(f"No FAISS index under {_faiss_root(self.index_dir)}")
+            return
+        if path == self._path:
+            return
+        import faiss
+
+        info = _export_info(path) or {}
+        flags = _mmap_flags(faiss, info.get("type"))
+        index = None
+        if flags is not None:
+            try:
+                index = faiss.read_index(str(path / INDEX_FILE), flags)
+            except RuntimeError as e:
+                print(f"[WARN] Cannot memory-map {path / INDEX_FILE} ({e})", file=sys.stderr)
+        if index is None:
+            # Every worker then holds its own copy of the codes
+            print(
+                f"[WARN] Loading the {info.get('type', 'unknown')} FAISS index into memory; "
+                f"it is not shared between workers",
+                file=sys.stderr,
+            )
+            index = faiss.read_index(str(path / INDEX_FILE))
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+        meta = sqlite3.connect(f"file:{path / META_FILE}?mode=ro", uri=True, check_same_thread=False)
+        if self._meta is not None:
+            self._meta.close()
+        self._path, self._index, self._meta = path, index, meta
+
+    def _rows(self, where, params):
+        return self._meta.execute(f"SELECT pos, id, document, metadata FROM chunks WHERE {where}", params).fetchall()
+
+    def _search_parameters(self, where):
+        """
+        FAISS search parameters restricting the search to chunks matching a
+        where-clause, plus the selector they point to (which must outlive the
+        search); (None, None) when nothing matches
+        """
+        import faiss
+        import numpy as np
+
+        sql, params = where_sql(where)
+        rows = self._meta.execute(f"SELECT pos FROM chunks WHERE {sql}", params)
+        positions = np.fromiter((row[0] for row in rows), dtype=np.int64)
+        if not len(positions):
+            return None, None
+        selector = faiss.IDSelectorBatch(positions)
+        if faiss.try_extract_index_ivf(self._index) is not None:
+            parameters = faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        else:
+            parameters = faiss.SearchParameters(sel=selector)
+        return parameters, selector
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, **kwargs):
+        """(Document, L2 distance) pairs, nearest first; filter is a Chroma-style where-clause"""
+        import numpy as np
+
+        self._refresh()
+        query = np.asarray([embedding], dtype=np.float32)
+        if filter:
+            parameters, _selector = self._search_parameters(filter)
+            if parameters is None:
+                return []
+            distances, positions = self._index.search(query, k, params=parameters)
+        else:
+            distances, positions = self._index.search(query, k)
+        hits = [(int(pos), float(distance)) for pos, distance in zip(positions[0], distances[0]) if pos >= 0]
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        rows = {row[0]: row for row in self._rows(f"pos IN ({placeholders})", [pos for pos, _ in hits])}
+        return [
+            (Document(id=rows[pos][1], page_content=rows[pos][2] or "", metadata=json.loads(rows[pos][3] or "{}")), distance)
+            for pos, distance in hits
+            if pos in rows
+        ]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self.embeddings.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def get(self, ids=None, include=None, limit=None, offset=None, where=None, **kwargs):
+        """Chroma-style get by chunk IDs, or a page of all chunks (optionally matching a where-clause)"""
+        self._refresh()
+        include = include or ["documents", "metadatas"]
+        if where:
+            sql, params = where_sql(where)
+            rows = self._rows(f"{sql} ORDER BY pos LIMIT ? OFFSET ?", [*params, -1 if limit is None else limit, offset or 0])
+        elif ids is not None:
+            rows = []
+            for start in range(0, len(ids), 500):
+                batch = list(ids[start:start + 500])
+                rows += self._rows(f"id IN ({','.join('?' * len(batch))})", batch)
+        else:
+            rows = self._rows("1 ORDER BY pos LIMIT ? OFFSET ?", [-1 if limit is None else limit, offset or 0])
+        result = {"ids": [row[1] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [row[2] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[3] or "{}") for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [self._index.reconstruct(row[0]).tolist() for row in rows]
+        return result
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("The FAISS index is read-only; it is rebuilt from the Chroma store")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build the FAISS index with build_faiss_index from a Chroma store")
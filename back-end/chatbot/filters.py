@@ -0,0 +1,102 @@
+# filters.py
+"""
+Query-time metadata filters.
+
+Ingestion stores typed fields on every chunk: `date` (YYYYMMDD as an
+integer, 0 when unknown) and `source_type` (html, pdf or csv). A filter
+names a date range and/or source types; it is turned into a where-clause
+for the vector store so only matching chunks are scored, rather than
+over-fetching and discarding results afterwards.
+"""
+import re
+
+SOURCE_TYPES = ("html", "pdf", "csv")
+
+_DATE_BOUND = re.compile(r"^(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?$")
+
+
+def date_key(iso_date):
+    """YYYY-MM-DD as the integer YYYYMMDD stored in chunk metadata; 0 when missing"""
+    digits = (iso_date or "").replace("-", "")
+    return int(digits) if len(digits) == 8 and digits.isdigit() else 0
+
+
+def parse_date_bound(value, upper=False):
+    """
+    "2015", "2015-06" or "2015-06-30" as an inclusive YYYYMMDD bound. A year
+    or month covers all of it: as an upper bound "2015" means up to 2015-12-31.
+    """
+    match = _DATE_BOUND.match(str(value).strip())
+    if not match:
+        raise ValueError(f"Invalid date {value!r}, expected YYYY, YYYY-MM or YYYY-MM-DD")
+    year, month, day = match.groups()
+    month = int(month) if month else (12 if upper else 1)
+    day = int(day) if day else (31 if upper else 1)
+    if not 1 <= month <= 12 or not 1 <= day <= 31:
+        raise ValueError(f"Invalid date {value!r}")
+    return int(year) * 10000 + month * 100 + day
+
+
+def parse_filters(raw):
+    """
+    Normalize a filter request ({"after": ..., "before": ..., "source_types": [...]},
+    as sent by clients) into {"date_from", "date_to", "source_types"}, or None
+    when it filters nothing. Raises ValueError for malformed values.
+    """
+    if not raw:
+        return None
+    if not isinstance(raw, dict):
+        raise ValueError("Filters must be an object")
+    unknown = set(raw) - {"after", "before", "source_types"}
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+
+    source_types = raw.get("source_types")
+    if isinstance(source_types, str):
+        source_types = [part for part in source_types.split(",") if part.strip()]
+    if source_types:
+        source_types = sorted({str(kind).strip().lower() for kind in source_types})
+        invalid = [kind for kind in source_types if kind not in SOURCE_TYPES]
+        if invalid:
+            raise ValueError(f"Unknown source type(s) {', '.join(invalid)}, expected {', '.join(SOURCE_TYPES)}")
+
+    filters = {
+        "date_from": parse_date_bound(raw["after"]) if raw.get("after") else None,
+        "date_to": parse_date_bound(raw["before"], upper=True) if raw.get("before") else None,
+        "source_types": source_types or None,
+    }
+    if filters["date_from"] and filters["date_to"] and filters["date_from"] > filters["date_to"]:
+        raise ValueError("'after' must not be later than 'before'")
+    return filters if any(value is not None for value in filters.values()) else None
+
+
+def chroma_where(filters):
+    """Chroma where-clause for normalized filters, or None"""
+    if not filters:
+        return None
+    clauses = []
+    if filters.get("date_from") or filters.get("date_to"):
+        # Undated chunks (date 0) never match a date range
+        clauses.append({"date": {"$gte": max(filters.get("date_from") or 0, 1)}})
+        if filters.get("date_to"):
+            clauses.append({"date": {"$lte": filters["date_to"]}})
+    if filters.get("source_types"):
+        clauses.append({"source_type": {"$in": list(filters["source_types"])}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def matches(metadata, filters):
+    """Whether a chunk's metadata passes the filters (for indexes outside the vector store)"""
+    if not filters:
+        return True
+    date = metadata.get("date") or 0
+    if filters.get("date_from") or filters.get("date_to"):
+        if date < max(filters.get("date_from") or 0, 1):
+            return False
+        if filters.get("date_to") and date > filters["date_to"]:
+            return False
+    if filters.get("source_types") and metadata.get("source_type") not in filters["source_types"]:
+        return False
+    return True
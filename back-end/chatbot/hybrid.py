@@ -0,0 +1,98 @@
+# hybrid.py
+"""
+Hybrid retrieval: dense vector search and the BM25 index, fused by
+reciprocal rank fusion. Each stage is timed so callers can report where
+retrieval time goes.
+"""
+import sys
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field
+
+from timing import StageTimer
+
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """Merge ranked lists of IDs; an ID scores sum(1 / (rrf_k + rank)) over the lists it appears in"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def _doc_key(doc):
+    return doc.id or f"{doc.metadata.get('source', '')}::{hash(doc.page_content)}"
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Returns the top k chunks after fusing the vector results (above the
+    relevance threshold) with the BM25 results. Each side fetches
+    fetch_k candidates. Without a BM25 index it behaves like the vector retriever.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    db: Any
+    bm25: Any = None
+    k: int = 12
+    fetch_k: int = 24
+    similarity_score_threshold: float = 0.25
+    # Stage timings of the last retrieval, in milliseconds
+    last_timings: Dict[str, float] = Field(default_factory=dict)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: Optional[CallbackManagerForRetrieverRun] = None
+    ) -> List[Document]:
+        timer = StageTimer()
+        with timer.stage("embed"):
+            embedding = self.db.embeddings.embed_query(query)
+        return self.retrieve(query, embedding, timer)
+
+    def retrieve(self, query, embedding, timer=None, filters=None):
+        """Hybrid results for a query whose embedding is already known, optionally filtered on metadata"""
+        from chat2 import search_by_vector
+
+        timer = timer or StageTimer()
+        with timer.stage("vector"):
+            vector_docs = search_by_vector(
+                self.db, embedding, k=self.fetch_k, similarity_score_threshold=self.similarity_score_threshold,
+                filters=filters,
+            )
+        by_id = {_doc_key(doc): doc for doc in vector_docs}
+
+        lexical_ids = []
+        if self.bm25 is not None:
+            with timer.stage("bm25"):
+                lexical_ids = [doc_id for doc_id, _ in self.bm25.search(query, k=self.fetch_k, filters=filters)]
+
+        with timer.stage("fusion"):
+            fused = reciprocal_rank_fusion([list(by_id), lexical_ids], self.k)
+
+        missing = [doc_id for doc_id in fused if doc_id not in by_id]
+        if missing:
+            with timer.stage("fetch"):
+                stored = self.db.get(ids=missing, include=["documents", "metadatas"])
+                for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                    by_id[doc_id] = Document(id=doc_id, page_content=text, metadata=metadata or {})
+
+        self.last_timings.clear()
+        self.last_timings.update(timer.as_dict())
+        return [by_id[doc_id] for doc_id in fused if doc_id in by_id]
+
+
+def build_hybrid_retriever(db, index_dir, k=12, similarity_score_threshold=0.25):
+    from bm25 import BM25Index
+
+    bm25 = BM25Index.load(index_dir)
+    if bm25 is None:
+        print("[WARN] No BM25 index found; hybrid retrieval falls back to vector search until the next rebuild", file=sys.stderr)
+    return HybridRetriever(
+        db=db, bm25=bm25, k=k, fetch_k=2 * k, similarity_score_threshold=similarity_score_threshold
+    )
@@ -0,0 +1,184 @@
+# index_versions.py
+"""
+Versioned index directories under the store root.
+
+Every rebuild writes a complete index (Chroma files, manifest, BM25,
+dedup and FAISS side files) into a new directory under versions/, which
+is switched in by atomically rewriting the CURRENT pointer once it has
+passed its smoke check. The version it replaced is recorded in PREVIOUS
+and kept for rollback. Readers resolve CURRENT on every request, so
+running workers move to a new version without a restart.
+
+A store root without a CURRENT pointer is an index from before
+versioning; it is served as is, and its files seed the first version.
+"""
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+VERSIONS_DIR = "versions"
+CURRENT_NAME = "CURRENT"
+PREVIOUS_NAME = "PREVIOUS"
+BUILDING_NAME = "BUILDING"
+LOCK_NAME = "rebuild.lock"
+# Versions kept on disk: the current one, the rollback target, and older ones beyond that
+INDEX_KEEP_VERSIONS = max(2, int(os.getenv("INDEX_KEEP_VERSIONS", "2")))
+# Files in the store root that belong to the root rather than to an index
+ROOT_ONLY = {VERSIONS_DIR, CURRENT_NAME, PREVIOUS_NAME, BUILDING_NAME, LOCK_NAME, "answer_cache.sqlite3"}
+
+
+def _read_pointer(root, name):
+    try:
+        value = (Path(root) / name).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return value or None
+
+
+def _write_pointer(root, name, value):
+    path = Path(root) / name
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(value, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def current_version(root):
+    """Name of the active version, or None for an unversioned store"""
+    name = _read_pointer(root, CURRENT_NAME)
+    if name and (Path(root) / VERSIONS_DIR / name).is_dir():
+        return name
+    return None
+
+
+def active_index_dir(root):
+    """Directory of the index queries should use"""
+    name = current_version(root)
+    return Path(root) / VERSIONS_DIR / name if name else Path(root)
+
+
+def list_versions(root):
+    """Version names, oldest first, with the current and previous ones marked"""
+    versions_dir = Path(root) / VERSIONS_DIR
+    if not versions_dir.exists():
+        return []
+    current, previous = current_version(root), _read_pointer(root, PREVIOUS_NAME)
+    building = (_read_building(root) or {}).get("name")
+    return [
+        {
+            "name": path.name,
+            "current": path.name == current,
+            "previous": path.name == previous,
+            "building": path.name == building,
+        }
+        for path in sorted(versions_dir.iterdir(), key=lambda p: p.name)
+        if path.is_dir()
+    ]
+
+
+@contextmanager
+def rebuild_lock(root):
+    """Hold the store's rebuild lock, so only one rebuild writes at a time"""
+    Path(root).mkdir(parents=True, exist_ok=True)
+    with open(Path(root) / LOCK_NAME, "a+") as handle:
+        try:
+            import fcntl
+        except ImportError:  # Windows: rebuilds are not serialized
+            yield
+            return
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("[INFO] Waiting for another rebuild to finish...", file=sys.stderr)
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _read_building(root):
+    value = _read_pointer(root, BUILDING_NAME)
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return None
+
+
+def create_shadow(root, full=False):
+    """
+    Directory for a new version. An unfinished build of the same kind is
+    resumed; otherwise an incremental build starts from a copy of the active
+    index and a full one from an empty directory.
+    """
+    root = Path(root)
+    building = _read_building(root)
+    if building and building.get("full") == full:
+        path = root / VERSIONS_DIR / building["name"]
+        if path.is_dir():
+            print(f"[INFO] Resuming unfinished build {building['name']}", file=sys.stderr)
+            return path
+    if building:
+        discard_shadow(root, building["name"])
+
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    path = root / VERSIONS_DIR / name
+    if full:
+        path.mkdir(parents=True)
+    else:
+        base = active_index_dir(root)
+
+        def root_files(directory, names):
+            # Copying an unversioned root: leave out the root's own files
+            return ROOT_ONLY & set(names) if Path(directory) == root else set()
+
+        shutil.copytree(base, path, ignore=root_files)
+    _write_pointer(root, BUILDING_NAME, json.dumps({"name": name, "full": full}))
+    return path
+
+
+def discard_shadow(root, name):
+    """Delete a build that failed or was superseded"""
+    shutil.rmtree(Path(root) / VERSIONS_DIR / name, ignore_errors=True)
+    if (_read_building(root) or {}).get("name") == name:
+        (Path(root) / BUILDING_NAME).unlink(missing_ok=True)
+
+
+def activate(root, name):
+    """Make a version current, keep the one it replaces for rollback, and prune older ones"""
+    root = Path(root)
+    previous = current_version(root)
+    if previous and previous != name:
+        _write_pointer(root, PREVIOUS_NAME, previous)
+    _write_pointer(root, CURRENT_NAME, name)
+    if (_read_building(root) or {}).get("name") == name:
+        (root / BUILDING_NAME).unlink(missing_ok=True)
+    prune_versions(root)
+
+
+def rollback(root):
+    """Switch back to the previous version; the current one becomes the rollback target"""
+    root = Path(root)
+    previous, current = _read_pointer(root, PREVIOUS_NAME), current_version(root)
+    if not previous or not (root / VERSIONS_DIR / previous).is_dir():
+        raise RuntimeError("No previous index version to roll back to")
+    _write_pointer(root, CURRENT_NAME, previous)
+    if current:
+        _write_pointer(root, PREVIOUS_NAME, current)
+    return previous
+
+
+def prune_versions(root, keep=INDEX_KEEP_VERSIONS):
+    """Delete the oldest versions beyond keep, never the current, previous or building one"""
+    protected = {current_version(root), _read_pointer(root, PREVIOUS_NAME), (_read_building(root) or {}).get("name")}
+    versions = [v["name"] for v in list_versions(root)]
+    removable = [name for name in versions if name not in protected]
+    excess = len(versions) - keep
+    for name in removable[:max(excess, 0)]:
+        # Workers still on an old version have moved on by their next request
+        shutil.rmtree(Path(root) / VERSIONS_DIR / name, ignore_errors=True)
+        print(f"[INFO] Removed old index version {name}", file=sys.stderr)
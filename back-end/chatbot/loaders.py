@@ -0,0 +1,325 @@
+# loaders.py
+"""
+Source discovery, text extraction and chunking for the vector store build.
+Kept free of the embedding model so ingestion worker processes start cheaply.
+"""
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import pandas as pd
+import pypdf
+from pathlib import Path
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+from filters import date_key
+from text_cache import cached_pages
+
+# --- Paths ---
+CACHE_DIR = Path("Cache")
+PDF_DIR = Path("Data/pdfs")
+DATA_DIR = Path("Data")
+MAIN_CSV_PATH = DATA_DIR / "datasets" / "SB_publication_PMC.csv"
+
+# --- Chunking ---
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# Chunks held back at the end of each window of streamed text, since more
+# text could still extend them
+_HELD_BACK_CHUNKS = 2
+
+def chunking_params(chunk_size=None, chunk_overlap=None):
+    """Chunk size and overlap: explicit values, then CHUNK_SIZE and CHUNK_OVERLAP"""
+    return {
+        "chunk_size": chunk_size or CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+    }
+
+def _splitter(chunk_size, chunk_overlap):
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, 
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+
+# --- Utility ---
+def split_text(text, chunk_size=1000, chunk_overlap=200):
+    return _splitter(chunk_size, chunk_overlap).split_text(text)
+
+def split_pages(pages, chunk_size=1000, chunk_overlap=200):
+    """
+    Chunk text that arrives page by page. Pages are split a window at a
+    time; the last chunks of a window are re-split together with the
+    following pages, so chunks still span page breaks while memory stays
+    bounded by the window instead of the whole document.
+    """
+    splitter = _splitter(chunk_size, chunk_overlap)
+    window = 8 * chunk_size
+    parts, size = [], 0
+    for page in pages:
+        if not page:
+            continue
+        parts.append(page + "\n")
+        size += len(page) + 1
+        if size < window:
+            continue
+        text = "".join(parts)
+        chunks = splitter.split_text(text)
+        if len(chunks) <= _HELD_BACK_CHUNKS:
+            continue
+        # Chunks are substrings of the text; find where the held-back ones start
+        offset = start = 0
+        for chunk in chunks[:len(chunks) - _HELD_BACK_CHUNKS + 1]:
+            start = text.find(chunk, max(0, offset))
+            if start < 0:
+                break
+            offset = start + len(chunk) - chunk_overlap
+        if start < 0:
+            continue
+        yield from chunks[:-_HELD_BACK_CHUNKS]
+        parts = [text[start:]]
+        size = len(parts[0])
+    if parts:
+        yield from splitter.split_text("".join(parts))
+
+# --- Loaders ---
+# Bump whenever loader output changes so the manifest forces a re-embed
+# (3: chunks are deduplicated before embedding; 4: typed date and source_type metadata;
+# 5: PDF text is split page by page as it streams in; 6: HTML and PDF dates no
+# longer come from the file's modification time)
+INGEST_VERSION = 6
+# Names the PDF text extraction code; bump when it changes to invalidate the text cache
+PDF_EXTRACTOR = f"pypdf-{pypdf.__version__}-1"
+
+def ingest_version(chunking):
+    """Version recorded in the manifest; loader output depends on the code and the chunking parameters"""
+    return f"{INGEST_VERSION}:{chunking['chunk_size']}:{chunking['chunk_overlap']}"
+
+# <meta> tags that carry an article's publication date, in order of preference
+HTML_DATE_META = ["citation_publication_date", "citation_date", "dc.date", "article:published_time"]
+_META_TAG = re.compile(r"<meta\s[^>]*>", re.IGNORECASE)
+_META_ATTR = re.compile(r"""([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+
+def iso_date(value):
+    """ISO date for a free-form date string, or '' when it cannot be read"""
+    parsed = pd.to_datetime(value or "", errors="coerce", format="mixed")
+    return "" if pd.isna(parsed) else parsed.strftime("%Y-%m-%d")
+
+def html_publication_date(content):
+    """
+    Publication date from a page's citation <meta> tags, as an ISO date, or
+    '' when the page has none. The file's own timestamps only say when it
+    was downloaded.
+    """
+    found = {}
+    for tag in _META_TAG.findall(content):
+        attrs = {name.lower(): double or single for name, double, single in _META_ATTR.findall(tag)}
+        name = (attrs.get("name") or attrs.get("property") or "").lower()
+        if name in HTML_DATE_META and attrs.get("content"):
+            found.setdefault(name, attrs["content"])
+    for name in HTML_DATE_META:
+        date = iso_date(found.get(name))
+        if date:
+            return date
+    return ""
+
+def canonical_title(title):
+    return " ".join(str(title or "").split()) or "Unknown"
+
+def chunk_metadata(title, link, pub_date, source_type):
+    """
+    Metadata stored with every chunk: display fields (title, link, ISO
+    pub_date) plus typed fields that queries filter on (date as YYYYMMDD,
+    0 when unknown, and source_type).
+    """
+    return {
+        "title": canonical_title(title),
+        "link": (link or "").strip(),
+        "pub_date": pub_date,
+        "date": date_key(pub_date),
+        "source_type": source_type,
+    }
+
+def load_html_file(html_file, chunking=None):
+    content = html_file.read_text(encoding="utf-8")
+    chunks = split_text(content, **(chunking or chunking_params()))
+    metadata = chunk_metadata(html_file.stem, html_file.name, html_publication_date(content), "html")
+    return [Document(page_content=chunk, metadata=dict(metadata)) for chunk in chunks]
+
+def extract_pdf_pages(pdf_file):
+    """Text of each page, as pypdf extracts it"""
+    with open(pdf_file, "rb") as f:
+        reader = pypdf.PdfReader(f)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+def load_pdf_file(pdf_file, chunking=None):
+    # Parsed once per file content; later builds read the cached pages
+    pages = cached_pages(pdf_file, PDF_EXTRACTOR, extract_pdf_pages)
+    # PDFs carry no reliable publication date; left undated so date filters skip them
+    metadata = chunk_metadata(pdf_file.stem, pdf_file.name, "", "pdf")
+    return [
+        Document(page_content=chunk, metadata=dict(metadata))
+        for chunk in split_pages(pages, **(chunking or chunking_params()))
+    ]
+
+# Accepted spellings of each main CSV field, in order of preference
+CSV_COLUMNS = {
+    "title": ["Title", "title"],
+    "link": ["Link", "link"],
+    "pub_date": ["Pub_Date", "pub_date", "Publication Date", "Date"],
+    "abstract": ["Abstract", "abstract"],
+}
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", "5000"))
+
+def _coalesce(df, candidates):
+    """First non-empty value across the candidate columns, as strings ('' when missing)"""
+    result = pd.Series("", index=df.index, dtype=object)
+    for column in reversed(candidates):
+        values = df[column].astype("string").str.strip()
+        result = values.where(values.notna() & values.ne(""), result)
+    return result.fillna("").astype(str)
+
+def _join_lines(left, right):
+    separator = pd.Series("\n", index=left.index).where(left.ne("") & right.ne(""), "")
+    return left + separator + right
+
+def iter_main_csv_documents(main_csv_path, chunksize=None):
+    """
+    Stream the main CSV that contains HTML links, one Document per row.
+    Column names are resolved once and each chunk of rows is converted with
+    column-wise operations, so memory stays bounded by the chunk size.
+    """
+    columns = None
+    for df in pd.read_csv(main_csv_path, chunksize=chunksize or CSV_CHUNK_SIZE):
+        if columns is None:
+            columns = {field: [c for c in candidates if c in df.columns] for field, candidates in CSV_COLUMNS.items()}
+
+        title = _coalesce(df, columns["title"]).str.split().str.join(" ").replace("", "Unknown")
+        link = _coalesce(df, columns["link"])
+        abstract = _coalesce(df, columns["abstract"])
+        # ISO dates at ingest time, so queries never have to interpret them
+        pub_date = pd.to_datetime(_coalesce(df, columns["pub_date"]), errors="coerce", format="mixed")
+        date = pub_date.dt.strftime("%Y%m%d").fillna("0").astype(int)
+        pub_date = pub_date.dt.strftime("%Y-%m-%d").fillna("")
+
+        # Create a meaningful content string from available fields
+        content = ("Title: " + title).where(title.ne("Unknown"), "")
+        content = _join_lines(content, ("Abstract: " + abstract).where(abstract.ne(""), ""))
+        content = _join_lines(content, ("Link: " + link).where(link.ne(""), ""))
+
+        empty = content.eq("")
+        if empty.any():
+            content.loc[empty] = [str(record) for record in df[empty].to_dict("records")]
+
+        for page_content, row_title, row_link, row_pub_date, row_date in zip(content, title, link, pub_date, date):
+            yield Document(
+                page_content=page_content,
+                metadata={
+                    "title": row_title,
+                    "link": row_link,
+                    "pub_date": row_pub_date,
+                    "date": int(row_date),
+                    "source_type": "csv",
+                }
+            )
+
+def load_main_csv_file(main_csv_path, chunking=None):
+    """
+    Load the main CSV that contains HTML links and convert each row into a Document.
+    Rows are not split, so chunking does not apply.
+    """
+    return list(iter_main_csv_documents(main_csv_path))
+
+def list_sources():
+    """Every indexable source file as (kind, path), in a stable order"""
+    sources = [("HTML", p) for p in sorted(CACHE_DIR.glob("*.html"))]
+    sources += [("PDF", p) for p in sorted(PDF_DIR.glob("*.pdf"))]
+    if MAIN_CSV_PATH.exists():
+        sources.append(("main CSV", MAIN_CSV_PATH))
+    return sources
+
+SOURCE_LOADERS = {
+    "HTML": load_html_file,
+    "PDF": load_pdf_file,
+    "main CSV": load_main_csv_file,
+}
+
+# Sources converted incrementally in the calling process instead of being
+# extracted whole in a worker and shipped back
+STREAMING_LOADERS = {
+    "main CSV": iter_main_csv_documents,
+}
+
+def load_source(kind, path, chunking=None):
+    """Load one source file; returns None if it could not be read"""
+    docs, error = _load_source_task((kind, path, chunking))
+    if error is not None:
+        print(f"Skipping {kind} file {path} due to error: {error}")
+    return docs
+
+def _stream_source(kind, path):
+    try:
+        yield from STREAMING_LOADERS[kind](path)
+    except Exception as e:
+        print(f"Skipping {kind} file {path} due to error: {e}")
+        raise
+
+def _load_source_task(task):
+    kind, path, chunking = task
+    try:
+        return SOURCE_LOADERS[kind](path, chunking), None
+    except Exception as e:
+        return None, str(e)
+
+# --- Parallel ingestion ---
+def ingest_workers(workers=None):
+    """Worker process count: explicit value, then INGEST_WORKERS, then one per CPU"""
+    if workers is None:
+        workers = int(os.getenv("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+    return max(1, workers)
+
+def iter_loaded_sources(sources, workers=None, chunking=None):
+    """
+    Extract and chunk (kind, path) sources across worker processes, with
+    the given chunking parameters (default: chunking_params()).
+    Yields (kind, path, docs) in input order so chunk IDs stay deterministic;
+    docs is None for files that failed, which are reported like load_source does.
+    Streaming sources yield a lazy iterator of documents instead of a list,
+    which raises (after reporting) if the file fails part-way through.
+    """
+    chunking = chunking or chunking_params()
+    pooled = [task for task in sources if task[0] not in STREAMING_LOADERS]
+    workers = min(ingest_workers(workers), len(pooled))
+    if workers <= 1:
+        for kind, path in sources:
+            if kind in STREAMING_LOADERS:
+                yield kind, path, _stream_source(kind, path)
+            else:
+                yield kind, path, load_source(kind, path, chunking)
+        return
+
+    print(f"[INFO] Extracting {len(pooled)} source(s) with {workers} worker processes", file=sys.stderr)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(task):
+            if task[0] in STREAMING_LOADERS:
+                return task, None
+            return task, executor.submit(_load_source_task, (*task, chunking))
+
+        # Only a couple of files per worker are in flight, so memory stays bounded
+        tasks = iter(sources)
+        window = deque(submit(task) for task in islice(tasks, workers * 2))
+        while window:
+            (kind, path), future = window.popleft()
+            next_task = next(tasks, None)
+            if next_task is not None:
+                window.append(submit(next_task))
+            if future is None:
+                yield kind, path, _stream_source(kind, path)
+                continue
+            docs, error = future.result()
+            if error is not None:
+                print(f"Skipping {kind} file {path} due to error: {error}")
+            yield kind, path, docs
@@ -0,0 +1,106 @@
+# manifest.py
+"""
+Persisted record of which source files are indexed in the vector store.
+
+Each entry maps a source path to its size, mtime and content hash plus the
+IDs of the chunks it produced, so a rebuild only re-embeds files that
+actually changed and can delete the chunks of files that were removed.
+"""
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(index_dir, version):
+    """Return the stored source entries, or an empty dict if missing or built by another ingest version"""
+    path = Path(index_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != version:
+        return {}
+    return data.get("sources", {})
+
+
+def save_manifest(index_dir, version, sources):
+    """Write the manifest atomically so an interrupted build never leaves it half written"""
+    path = Path(index_dir) / MANIFEST_NAME
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(
+        json.dumps({"version": version, "sources": sources}, indent=1, sort_keys=True),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, path)
+
+
+def fingerprint(path, previous=None):
+    """
+    Describe a source file for the manifest. The content hash is only
+    recomputed when size or mtime differ from the previous entry.
+    """
+    stat = Path(path).stat()
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+        sha256 = previous["sha256"]
+    else:
+        sha256 = file_sha256(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+
+
+def diff_sources(previous, current_paths):
+    """
+    Compare manifest entries against the source files on disk.
+    Returns (added, changed, removed, unchanged) where the first two are
+    lists of (key, path, fingerprint) and the last two lists of keys.
+    """
+    added, changed, unchanged = [], [], []
+    for key, path in current_paths:
+        old = previous.get(key)
+        fp = fingerprint(path, old)
+        if old is None:
+            added.append((key, path, fp))
+        elif old.get("sha256") != fp["sha256"]:
+            changed.append((key, path, fp))
+        else:
+            unchanged.append(key)
+            # Content is identical; refresh size/mtime so the hash is skipped next time
+            old.update(fp)
+    current_keys = {key for key, _ in current_paths}
+    removed = sorted(key for key in previous if key not in current_keys)
+    return added, changed, removed, unchanged
+
+
+# --- Index version ---
+INDEX_VERSION_NAME = "index_version"
+
+
+def read_index_version(index_dir):
+    """Identifier of the current index contents; changes whenever a rebuild changes the store"""
+    path = Path(index_dir) / INDEX_VERSION_NAME
+    try:
+        return path.read_text(encoding="utf-8").strip() or "0"
+    except OSError:
+        return "0"
+
+
+def bump_index_version(index_dir):
+    version = uuid.uuid4().hex
+    path = Path(index_dir) / INDEX_VERSION_NAME
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(version, encoding="utf-8")
+    os.replace(tmp_path, path)
+    return version
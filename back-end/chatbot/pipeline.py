@@ -0,0 +1,163 @@
+# pipeline.py
+"""
+Building blocks for the streaming vector store build:
+load -> split -> embed in batches -> upsert, with a bounded number of
+batches in flight, progress reporting and a checkpoint of committed batches.
+"""
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+CHECKPOINT_NAME = "build_checkpoint.json"
+
+
+class Batch:
+    """A group of chunks to embed together, plus the sources it completes"""
+
+    def __init__(self, index):
+        self.index = index
+        self.ids = []
+        self.docs = []
+        # (source key, all chunk IDs of that source) for sources whose last chunk is in this batch
+        self.finished = []
+        self.failed = []
+
+
+def iter_batches(loaded, batch_size):
+    """
+    Turn (key, docs) pairs into fixed-size batches. docs is a list or iterator
+    of Documents, or None for a source that failed to load. Batch boundaries only depend on the input, so the same
+    sources always produce the same batches.
+    """
+    batch = Batch(0)
+    for key, docs in loaded:
+        if docs is None:
+            batch.failed.append(key)
+            continue
+        ids = []
+        try:
+            # docs may be a lazy iterator for sources that are streamed
+            for doc in docs:
+                if len(batch.ids) == batch_size:
+                    yield batch
+                    batch = Batch(batch.index + 1)
+                chunk_id = f"{key}::{len(ids)}"
+                ids.append(chunk_id)
+                batch.ids.append(chunk_id)
+                batch.docs.append(doc)
+        except Exception:
+            # Already reported by the loader; chunks it produced are simply overwritten next time
+            batch.failed.append(key)
+            continue
+        batch.finished.append((key, ids))
+    if batch.ids or batch.finished or batch.failed:
+        yield batch
+
+
+def prefetch(iterable, maxsize):
+    """Produce items from iterable in a background thread, buffering at most maxsize"""
+    buffer = queue.Queue(maxsize=maxsize)
+    done = object()
+    failure = []
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            while not stop.is_set():
+                try:
+                    buffer.put(done, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    thread = threading.Thread(target=produce, name="vector-store-loader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+    if failure:
+        raise failure[0]
+
+
+def plan_signature(*parts):
+    """Stable hash of everything that determines the batch sequence"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """
+    Remembers how many batches of a build plan were committed, so an
+    interrupted build with the same plan skips straight past them.
+    """
+
+    def __init__(self, index_dir, plan):
+        self.path = Path(index_dir) / CHECKPOINT_NAME
+        self.plan = plan
+        self.committed = 0
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("plan") == plan:
+                self.committed = int(data.get("committed", 0))
+        except (OSError, ValueError):
+            pass
+        if self.committed:
+            print(f"[INFO] Resuming build after {self.committed} committed batch(es)", file=sys.stderr)
+
+    def commit(self, batches):
+        self.committed = batches
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"plan": self.plan, "committed": batches}), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+class Progress:
+    """Periodic chunks/sec report on stderr"""
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.embedded = 0
+        self.skipped = 0
+
+    def update(self, embedded=0, skipped=0, force=False):
+        self.embedded += embedded
+        self.skipped += skipped
+        now = time.perf_counter()
+        if force or now - self.last_report >= self.interval:
+            self.last_report = now
+            print(
+                f"[INFO] Embedded {self.embedded} chunks ({self.rate():.1f} chunks/sec)"
+                + (f", {self.skipped} already committed" if self.skipped else ""),
+                file=sys.stderr,
+            )
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.embedded / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,314 @@
+# prefork.py
+"""
+Pre-forking worker pool for the serve protocol.
+
+The parent loads everything that is safe to share (libraries and the
+embedding model weights) once, then forks the workers, which inherit it
+copy-on-write instead of each loading their own copy. The parent keeps
+reading newline-delimited JSON requests, hands each to an idle worker
+over a pipe and relays the worker's replies, so a client sees a single
+process that answers several requests at once.
+
+Requests that find every worker busy wait in a bounded queue; when it is
+full they are answered straight away with a "busy" error. A request that
+runs past the timeout, or that the client cancels with {"cancel": id},
+has its worker killed and replaced by a fresh fork, which is cheap
+because nothing has to be loaded again.
+"""
+import gc
+import json
+import os
+import selectors
+import signal
+import sys
+import time
+from collections import deque
+
+MAX_RESPAWN_DELAY = 30.0
+# Events that are part of a streamed answer rather than its end
+_PARTIAL_EVENTS = {"sources", "token"}
+
+
+class _Worker:
+    def __init__(self, pid, to_child, from_child):
+        self.pid = pid
+        self.to_child = to_child
+        self.from_child = from_child
+        self.buffer = b""
+        self.ready = False
+        # Killed and about to be replaced; never handed another request
+        self.retired = False
+        # (request id, started) of the request being answered
+        self.request = None
+
+
+class PreforkPool:
+    """
+    workers forked processes each run child_main(reader, writer), a serve
+    loop over their end of the pipes that must announce itself with a
+    "ready" event. queue_size bounds the requests waiting for a worker;
+    request_timeout (seconds, 0 for none) bounds each answer.
+    """
+
+    def __init__(self, workers, child_main, queue_size, request_timeout=0):
+        self.size = max(1, workers)
+        self.child_main = child_main
+        self.queue_size = max(0, queue_size)
+        self.request_timeout = request_timeout
+        self.workers = {}
+        self.queue = deque()
+        self.selector = selectors.DefaultSelector()
+        self.failures = 0
+        self.respawn_at = []
+        self.announced = False
+        self.closing = False
+
+    def serve(self, instream, outstream):
+        """Answer requests from instream until EOF, then let the workers finish and exit"""
+        self.outstream = outstream
+        # Objects loaded so far are never freed; keep the collector from touching (and copying) their pages
+        gc.freeze()
+        signal.signal(signal.SIGTERM, self._terminate)
+        for _ in range(self.size):
+            self._spawn()
+
+        infd = instream.fileno()
+        os.set_blocking(infd, False)
+        self.selector.register(infd, selectors.EVENT_READ, None)
+        pending = b""
+        try:
+            while self.workers or not self.closing:
+                timeout = self._next_deadline()
+                for key, _ in self.selector.select(timeout):
+                    worker = key.data
+                    if worker is not None:
+                        self._read_worker(worker)
+                        continue
+                    chunk = os.read(infd, 65536)
+                    if not chunk:
+                        self._close_input(infd)
+                        continue
+                    *lines, pending = (pending + chunk).split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            self._accept(line)
+                self._expire_requests()
+                self._respawn_due()
+        finally:
+            self._kill_all()
+
+    # --- workers ---
+
+    def _spawn(self):
+        request_read, request_write = os.pipe()
+        reply_read, reply_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.close(request_write)
+                os.close(reply_read)
+                self.selector.close()
+                # Siblings' pipes must stay closed here, or their EOFs never arrive
+                for other in self.workers.values():
+                    other.to_child.close()
+                    os.close(other.from_child)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                # Stray writes to stdout would corrupt the parent's protocol stream
+                os.dup2(2, 1)
+                devnull = os.open(os.devnull, os.O_RDONLY)
+                os.dup2(devnull, 0)
+                os.close(devnull)
+                with os.fdopen(request_read, "r", encoding="utf-8") as reader, \
+                        os.fdopen(reply_write, "w", encoding="utf-8") as writer:
+                    self.child_main(reader, writer)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException as e:
+                print(f"[ERROR] Chatbot worker failed: {e}", file=sys.stderr)
+            finally:
+                sys.stderr.flush()
+                os._exit(code)
+
+        os.close(request_read)
+        os.close(reply_write)
+        worker = _Worker(pid, os.fdopen(request_write, "w", encoding="utf-8"), reply_read)
+        self.workers[pid] = worker
+        self.selector.register(reply_read, selectors.EVENT_READ, worker)
+
+    def _read_worker(self, worker):
+        chunk = os.read(worker.from_child, 65536)
+        if not chunk:
+            self._reap(worker)
+            return
+        *lines, worker.buffer = (worker.buffer + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                self._relay(worker, line)
+
+    def _relay(self, worker, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            print(f"[WARN] Ignoring non-JSON output from worker {worker.pid}", file=sys.stderr)
+            return
+        if message.get("event") == "ready":
+            worker.ready = True
+            self.failures = 0
+            if not self.announced:
+                self.announced = True
+                self._emit({
+                    **message, "pid": os.getpid(), "workers": self.size, "queue_size": self.queue_size,
+                })
+            self._dispatch()
+            return
+        if worker.request is None or message.get("id") != worker.request[0]:
+            return
+        self._emit(message)
+        if message.get("event") not in _PARTIAL_EVENTS:
+            worker.request = None
+            self._dispatch()
+
+    def _reap(self, worker):
+        self.selector.unregister(worker.from_child)
+        os.close(worker.from_child)
+        try:
+            worker.to_child.close()
+        except OSError:
+            pass
+        _, status = os.waitpid(worker.pid, 0)
+        del self.workers[worker.pid]
+        if worker.request is not None:
+            self._fail(worker.request[0], f"Chatbot worker exited with code {os.waitstatus_to_exitcode(status)}")
+        if self.closing:
+            return
+        if not worker.ready:
+            # Failing during start-up: back off instead of forking in a loop
+            self.failures += 1
+        delay = min(2 ** self.failures, MAX_RESPAWN_DELAY) if self.failures else 0
+        print(f"[WARN] Chatbot worker {worker.pid} exited, replacing it in {delay:.0f}s", file=sys.stderr)
+        self.respawn_at.append(time.monotonic() + delay)
+
+    def _respawn_due(self):
+        now = time.monotonic()
+        due = [at for at in self.respawn_at if at <= now]
+        self.respawn_at = [at for at in self.respawn_at if at > now]
+        for _ in due:
+            self._spawn()
+
+    def _retire(self, worker):
+        """Kill a worker whose request was given up on; its replacement takes the queued requests"""
+        worker.request = None
+        worker.retired = True
+        self._kill(worker)
+
+    def _kill(self, worker):
+        try:
+            os.kill(worker.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _kill_all(self):
+        for worker in list(self.workers.values()):
+            self._kill(worker)
+        for pid in list(self.workers):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+    def _terminate(self, signum, frame):
+        self._kill_all()
+        os._exit(128 + signum)
+
+    # --- requests ---
+
+    def _accept(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = {}
+        if not isinstance(request, dict):
+            request = {}
+        if "cancel" in request:
+            self._cancel(request["cancel"])
+            return
+        if len(self.queue) >= self.queue_size and not self._idle_worker():
+            self._emit({
+                "id": request.get("id"), "event": "error", "error": "Chatbot is busy", "busy": True,
+                "success": False,
+            })
+            return
+        self.queue.append((request.get("id"), line))
+        self._dispatch()
+
+    def _idle_worker(self):
+        return next((w for w in self.workers.values() if w.ready and not w.retired and w.request is None), None)
+
+    def _dispatch(self):
+        while self.queue:
+            worker = self._idle_worker()
+            if worker is None:
+                return
+            request_id, line = self.queue.popleft()
+            worker.request = (request_id, time.monotonic())
+            try:
+                worker.to_child.write(line.decode("utf-8") + "\n")
+                worker.to_child.flush()
+            except OSError:
+                # Exited meanwhile; its EOF fails the request and replaces it
+                pass
+
+    def _cancel(self, request_id):
+        """Drop a request the client has given up on, killing its worker if it is running"""
+        for item in self.queue:
+            if item[0] == request_id:
+                self.queue.remove(item)
+                return
+        for worker in self.workers.values():
+            if worker.request is not None and worker.request[0] == request_id:
+                self._retire(worker)
+                return
+
+    def _expire_requests(self):
+        if not self.request_timeout:
+            return
+        now = time.monotonic()
+        for worker in self.workers.values():
+            if worker.request is not None and now - worker.request[1] > self.request_timeout:
+                request_id = worker.request[0]
+                self._retire(worker)
+                self._fail(request_id, "Chatbot request timed out")
+
+    def _next_deadline(self):
+        deadlines = list(self.respawn_at)
+        if self.request_timeout:
+            deadlines += [w.request[1] + self.request_timeout for w in self.workers.values() if w.request]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _fail(self, request_id, error):
+        self._emit({"id": request_id, "event": "error", "error": error, "success": False})
+
+    def _close_input(self, infd):
+        """The client is gone: stop taking requests and let each worker exit after its current one"""
+        self.selector.unregister(infd)
+        self.closing = True
+        self.respawn_at = []
+        for item in self.queue:
+            self._fail(item[0], "Chatbot is shutting down")
+        self.queue.clear()
+        for worker in self.workers.values():
+            try:
+                worker.to_child.close()
+            except OSError:
+                pass
+
+    def _emit(self, message):
+        try:
+            self.outstream.write(json.dumps(message) + "\n")
+            self.outstream.flush()
+        except OSError:
+            pass
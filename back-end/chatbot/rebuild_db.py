@@ -2,31 +2,59 @@
 """
 Rebuild the vector database with new chunking settings
 """
-import shutil
-from pathlib import Path
-from chat1 import initialize_vector_store_from_cache, CHROMA_DIR
+import argparse
+from chat1 import CHROMA_DIR, rebuild_index, rollback_index
+from index_versions import list_versions
+from loaders import chunking_params
 
-def rebuild_vector_store():
-    """Delete old vector store and rebuild with new settings"""
+def rebuild_vector_store(full=False, workers=None, batch_size=None, chunk_size=None, chunk_overlap=None):
+    """
+    Re-index new, changed and removed sources, or everything with full=True.
+    Changing the chunking re-splits every source; PDF text comes from the
+    extracted-text cache, so only new or changed PDFs are parsed.
+    The build goes into a new index version; the live one keeps serving
+    until it has passed its smoke check.
+    """
+    chunking = chunking_params(chunk_size, chunk_overlap)
     
-    # Delete old vector store
-    if CHROMA_DIR.exists():
-        print(f"Deleting old vector store at {CHROMA_DIR}...")
-        shutil.rmtree(CHROMA_DIR)
-        print("Old vector store deleted.")
+    print("Building a new index version..." if full else "Updating vector store in a new index version...")
+    print(f"- Chunk size: {chunking['chunk_size']}")
+    print(f"- Chunk overlap: {chunking['chunk_overlap']}")
+    print("- Only new or changed files are re-embedded" if not full else "- Re-embedding every file")
     
-    # Rebuild with new chunking settings
-    print("Building new vector store with improved settings...")
-    print("- Chunk size: 1000 (was 500)")
-    print("- Chunk overlap: 200 (was 100)")
-    print("- Better text separators")
+    db, report = rebuild_index(full=full, workers=workers, batch_size=batch_size, **chunking)
     
-    db = initialize_vector_store_from_cache()
-    
-    print("\n✅ Vector store rebuilt successfully!")
-    print("Restart your backend to use the new database.")
+    print("\n✅ Vector store updated successfully!")
+    print(f"- Added:     {len(report['added'])} file(s)")
+    print(f"- Updated:   {len(report['updated'])} file(s)")
+    print(f"- Removed:   {len(report['removed'])} file(s)")
+    print(f"- Unchanged: {report['unchanged']} file(s)")
+    if report["failed"]:
+        print(f"- Failed:    {len(report['failed'])} file(s)")
+    print(f"- Chunks embedded: {report['chunks_added']}, deleted: {report['chunks_removed']}")
+    print(f"- Duplicates dropped: {report['duplicates_exact']} exact, {report['duplicates_near']} near")
+    print(f"- Live index version: {report['version']}")
+    print("Running chatbot workers switch to it on their next request.")
 
 if __name__ == "__main__":
-    rebuild_vector_store()
-
-
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--full", action="store_true", help="re-embed every file into an empty index version")
+    parser.add_argument("--workers", type=int, help="extraction processes (default: INGEST_WORKERS or CPU count)")
+    parser.add_argument("--batch-size", type=int, help="chunks embedded and upserted per batch (default: EMBED_BATCH_SIZE or 256)")
+    parser.add_argument("--chunk-size", type=int, help="characters per chunk (default: CHUNK_SIZE or 1000)")
+    parser.add_argument("--chunk-overlap", type=int, help="characters shared by neighbouring chunks (default: CHUNK_OVERLAP or 200)")
+    parser.add_argument("--rollback", action="store_true", help="make the previous index version live again")
+    parser.add_argument("--list", action="store_true", help="list the index versions on disk")
+    args = parser.parse_args()
+    if args.list:
+        for version in list_versions(CHROMA_DIR):
+            marks = [label for label in ("current", "previous", "building") if version[label]]
+            print(f"{version['name']}  {', '.join(marks)}")
+        raise SystemExit
+    if args.rollback:
+        print(f"✅ Index version {rollback_index()} is live again.")
+        raise SystemExit
+    rebuild_vector_store(
+        full=args.full, workers=args.workers, batch_size=args.batch_size,
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+    )
@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from bm25 import BM25Index, tokenize
+
+DOCS = [
+    ("a", "Mice flown on RR-1 showed bone loss in microgravity", {}),
+    ("b", "Bone density of astronauts after long missions", {}),
+    ("c", "Plant growth in microgravity aboard the ISS", {}),
+    ("d", "TP53 expression in irradiated cells", {}),
+]
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("What does RR-1 do to TP53?") == ["rr-1", "rr", "1", "tp53"]
+
+
+def test_exact_identifier_ranks_its_document_first():
+    index = BM25Index.build(DOCS)
+
+    assert index.search("RR-1 mice", k=2)[0][0] == "a"
+    assert [doc_id for doc_id, _ in index.search("TP53")] == ["d"]
+
+
+def test_score_matches_bm25_formula():
+    index = BM25Index.build(DOCS)
+    n_docs, df, tf = 4, 1, 1
+    length = len(tokenize(DOCS[3][1]))
+    avg_length = sum(len(tokenize(text)) for _, text, _ in DOCS) / n_docs
+    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    norm = 1.5 * (1 - 0.75 + 0.75 * length / avg_length)
+
+    [(_, score)] = index.search("tp53")
+
+    assert score == pytest.approx(idf * tf * 2.5 / (tf + norm))
+
+
+def test_rarer_terms_weigh_more():
+    index = BM25Index.build(DOCS)
+    scores = dict(index.search("microgravity plant"))
+
+    # "plant" occurs in one document, "microgravity" in two
+    assert scores["c"] > scores["a"]
+
+
+def test_allowed_ids_and_k_limit_results():
+    index = BM25Index.build(DOCS)
+
+    assert {doc_id for doc_id, _ in index.search("bone microgravity", allowed_ids={"b", "c"})} == {"b", "c"}
+    assert len(index.search("bone microgravity", k=1)) == 1
+
+
+def test_metadata_filters_restrict_results():
+    index = BM25Index.build([
+        ("old", "bone loss in mice", {"date": 20050101, "source_type": "pdf"}),
+        ("new", "bone loss in rats", {"date": 20200101, "source_type": "pdf"}),
+        ("page", "bone loss in astronauts", {"date": 20200101, "source_type": "html"}),
+        ("undated", "bone loss in cells", {"source_type": "pdf"}),
+    ])
+    filters = {"date_from": 20100101, "date_to": None, "source_types": ["pdf"]}
+
+    assert [doc_id for doc_id, _ in index.search("bone loss", filters=filters)] == ["new"]
+
+
+def test_filters_need_stored_metadata():
+    index = BM25Index(["a"], [1], {"bone": [0, 1]})
+
+    with pytest.raises(ValueError):
+        index.search("bone", filters={"source_types": ["pdf"]})
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.build(DOCS)
+    index.save(tmp_path)
+
+    loaded = BM25Index.load(tmp_path)
+
+    assert loaded.search("bone", k=4) == index.search("bone", k=4)
+    assert BM25Index.load(tmp_path / "missing") is None
@@ -0,0 +1,163 @@
+import importlib
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import cache
+from cache import AnswerCache, TTLCache, normalize_query
+
+
+class _Clock:
+    """Stands in for the time module so entries age without sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def answers(tmp_path, clock):
+    answers = AnswerCache(tmp_path, max_size=2, ttl=60)
+    yield answers
+    answers.close()
+
+
+class _Embeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(self.queries))]
+
+    def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+
+def test_normalize_query_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_query("  What is   Microgravity? ") == normalize_query("what is microgravity")
+
+
+def test_ttl_cache_hit_and_miss(clock):
+    entries = TTLCache(max_size=2, ttl=60)
+    entries.put("a", 1)
+
+    assert entries.get("a") == 1
+    assert entries.get("b") is None
+
+
+def test_ttl_cache_entries_expire(clock):
+    entries = TTLCache(max_size=2, ttl=60)
+    entries.put("a", 1)
+
+    clock.advance(61)
+
+    assert entries.get("a") is None
+    assert len(entries) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    entries = TTLCache(max_size=2, ttl=60)
+    entries.put("a", 1)
+    entries.put("b", 2)
+    entries.get("a")
+
+    entries.put("c", 3)
+
+    assert entries.get("b") is None
+    assert (entries.get("a"), entries.get("c")) == (1, 3)
+
+
+def test_cached_embeddings_reuse_query_embeddings(clock):
+    pytest.importorskip("langchain_core")
+    base = _Embeddings()
+    loads = []
+    embeddings = cache.CachedEmbeddings(factory=lambda: loads.append(1) or base)
+    assert loads == []
+
+    first = embeddings.embed_query("What is microgravity?")
+    again = embeddings.embed_query("what is  microgravity")
+    other = embeddings.embed_query("What is radiation?")
+
+    assert first == again != other
+    assert base.queries == ["What is microgravity?", "What is radiation?"]
+    assert (embeddings.hits, embeddings.misses) == (1, 2)
+    assert loads == [1]
+
+
+def test_importing_cache_leaves_langchain_unloaded():
+    # chatbot_api imports the answer cache at start-up, before it knows whether a model is needed
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, cache; print('langchain_core' in sys.modules)"],
+        capture_output=True, text=True, check=True, cwd=Path(cache.__file__).parent,
+    )
+
+    assert result.stdout.strip() == "False"
+
+
+def test_answer_cache_hit_and_miss(answers):
+    key = AnswerCache.make_key("What is microgravity?", "v1", k=12)
+    answers.put(key, {"answer": "Weightlessness"})
+
+    assert answers.get(AnswerCache.make_key("what is microgravity", "v1", k=12)) == {"answer": "Weightlessness"}
+    assert answers.get(AnswerCache.make_key("What is microgravity?", "v2", k=12)) is None
+    assert answers.get(AnswerCache.make_key("What is microgravity?", "v1", k=4)) is None
+
+
+def test_answer_cache_entries_expire(answers, clock):
+    answers.put("a", {"answer": 1})
+
+    clock.advance(61)
+
+    assert answers.get("a") is None
+
+
+def test_answer_cache_evicts_least_recently_used(answers, clock):
+    answers.put("a", {"answer": 1})
+    clock.advance(1)
+    answers.put("b", {"answer": 2})
+    clock.advance(1)
+    answers.get("a")
+    clock.advance(1)
+
+    answers.put("c", {"answer": 3})
+
+    assert answers.get("b") is None
+    assert answers.get("a") == {"answer": 1}
+    assert answers.get("c") == {"answer": 3}
+
+
+def test_answer_cache_persists_across_instances(tmp_path, clock):
+    AnswerCache(tmp_path).put("a", {"answer": 1})
+
+    assert AnswerCache(tmp_path).get("a") == {"answer": 1}
+
+
+@pytest.mark.parametrize("value, enabled", [(None, True), ("true", True), ("false", False), ("FALSE", False)])
+def test_answer_cache_enabled_flag(monkeypatch, value, enabled):
+    if value is None:
+        monkeypatch.delenv("ANSWER_CACHE_ENABLED", raising=False)
+    else:
+        monkeypatch.setenv("ANSWER_CACHE_ENABLED", value)
+    try:
+        assert importlib.reload(cache).ANSWER_CACHE_ENABLED is enabled
+    finally:
+        monkeypatch.undo()
+        importlib.reload(cache)
@@ -0,0 +1,140 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from context import (
+    MIN_TRIMMED_TOKENS,
+    estimate_tokens,
+    maximal_marginal_relevance,
+    overlap_length,
+    pack_context,
+    trim_to_tokens,
+)
+
+QUERY = [1.0, 0.2, 0.0]
+# Two near-identical vectors close to the query and one off to the side
+NEAR = [1.0, 0.0, 0.0]
+NEAR_COPY = [0.98, 0.05, 0.0]
+OTHER = [0.5, 0.5, 0.7]
+
+
+class _Embeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.vectors[text] for text in texts]
+
+
+class _Store:
+    """Just enough of a vector store for pack_context: stored embeddings by ID"""
+
+    def __init__(self, stored, computed=None):
+        self.stored = stored
+        self.embeddings = _Embeddings(computed or {})
+
+    def get(self, ids, include):
+        found = [i for i in ids if i in self.stored]
+        return {"ids": found, "embeddings": [self.stored[i] for i in found]}
+
+
+def _sentences(prefix, count):
+    return " ".join(f"{prefix} sentence number {n} about microgravity." for n in range(count))
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_mmr_without_diversity_ranks_by_relevance():
+    assert maximal_marginal_relevance(QUERY, [NEAR, NEAR_COPY, OTHER], lambda_mult=1.0) == [1, 0, 2]
+
+
+def test_mmr_moves_near_duplicate_behind_distinct_chunk():
+    assert maximal_marginal_relevance(QUERY, [NEAR, NEAR_COPY, OTHER], lambda_mult=0.5) == [1, 2, 0]
+
+
+def test_mmr_of_nothing_is_empty():
+    assert maximal_marginal_relevance(QUERY, []) == []
+
+
+def test_overlap_length_finds_shared_text():
+    shared = "the shared tail of the first chunk"
+    assert overlap_length("Opening words. " + shared, shared + " and more") == len(shared)
+    assert overlap_length("no common text here", "something else entirely") == 0
+
+
+def test_trim_to_tokens_cuts_at_sentence_boundary():
+    text = _sentences("Trim", 20)
+    trimmed = trim_to_tokens(text, 30)
+
+    assert estimate_tokens(trimmed) <= 30
+    assert trimmed.endswith(".")
+    assert text.startswith(trimmed)
+
+
+def test_pack_context_keeps_within_token_budget():
+    docs = [Document(id=f"src{n}::0", page_content=_sentences(f"Doc{n}", 8)) for n in range(5)]
+    cost = estimate_tokens(docs[0].page_content)
+    store = _Store({doc.id: [1.0, 0.1 * n, 0.0] for n, doc in enumerate(docs)})
+    budget = 2 * cost + MIN_TRIMMED_TOKENS - 1
+
+    packed, stats = pack_context(store, QUERY, docs, token_budget=budget, mmr_lambda=1.0)
+
+    # Two chunks fit whole; what is left is too little to trim a third into
+    assert stats["chunks_out"] == len(packed) == 2
+    assert stats["tokens_after"] <= budget
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"]
+    assert all(doc.page_content in {d.page_content for d in docs} for doc in packed)
+
+
+def test_pack_context_trims_last_chunk_into_remaining_budget():
+    # The least relevant chunk (packed last) is too long to fit whole
+    docs = [Document(id=f"src{n}::0", page_content=_sentences(f"Doc{n}", 16 if n == 0 else 8)) for n in range(3)]
+    cost = estimate_tokens(docs[1].page_content)
+    store = _Store({doc.id: [1.0, 0.1 * n, 0.0] for n, doc in enumerate(docs)})
+    budget = 2 * cost + MIN_TRIMMED_TOKENS + 10
+
+    packed, stats = pack_context(store, QUERY, docs, token_budget=budget, mmr_lambda=1.0)
+
+    assert len(packed) == 3
+    assert stats["tokens_after"] <= budget
+    trimmed = [doc for doc in packed if doc.page_content not in {d.page_content for d in docs}]
+    assert len(trimmed) == 1
+    assert estimate_tokens(trimmed[0].page_content) <= budget - 2 * cost
+
+
+def test_pack_context_merges_overlapping_neighbours():
+    first = _sentences("First", 6)
+    shared = first[-60:]
+    second = shared + " " + _sentences("Second", 6)
+    docs = [
+        Document(id="paper.pdf::1", page_content=second),
+        Document(id="paper.pdf::0", page_content=first),
+    ]
+    store = _Store({"paper.pdf::0": NEAR, "paper.pdf::1": OTHER})
+
+    packed, stats = pack_context(store, QUERY, docs, token_budget=1000)
+
+    assert len(packed) == 1
+    assert packed[0].page_content == first + second[len(shared):]
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_pack_context_embeds_chunks_missing_from_store():
+    docs = [
+        Document(id="stored::0", page_content="Stored chunk text."),
+        Document(page_content="Chunk without an ID."),
+    ]
+    store = _Store({"stored::0": NEAR}, computed={"Chunk without an ID.": OTHER})
+
+    packed, _ = pack_context(store, QUERY, docs, token_budget=1000)
+
+    assert store.embeddings.embedded == ["Chunk without an ID."]
+    assert len(packed) == 2
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from dedup import NUM_PERM, DedupIndex, content_hash, merge_metadata, minhash
+
+BASE = (
+    "Spaceflight induced changes in bone density were measured in mice flown aboard the "
+    "International Space Station for thirty days and compared with ground controls housed "
+    "in identical habitats under the same temperature and light cycle conditions"
+)
+
+
+def _similarity(a, b):
+    return float(np.mean(minhash(a) == minhash(b)))
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DedupIndex(tmp_path, threshold=0.85)
+    yield index
+    index.close()
+
+
+def test_content_hash_ignores_case_and_whitespace():
+    assert content_hash("Bone  Loss\nin Mice") == content_hash("bone loss in mice")
+
+
+def test_minhash_is_deterministic_and_sized():
+    signature = minhash(BASE)
+
+    assert signature.shape == (NUM_PERM,)
+    assert np.array_equal(signature, minhash(BASE))
+
+
+def test_minhash_similarity_tracks_overlap():
+    one_word_changed = BASE.replace("thirty", "forty")
+    unrelated = "Arabidopsis root growth responds to altered gravity vectors in clinostat experiments"
+
+    assert _similarity(BASE, one_word_changed) > 0.7
+    assert _similarity(BASE, unrelated) < 0.2
+
+
+def test_exact_duplicate_is_dropped(index):
+    assert index.match("html::0", "html", BASE) == (None, None)
+
+    assert index.match("pdf::0", "pdf", "  " + BASE.upper()) == ("html::0", "exact")
+    assert index.dependents(["html::0"]) == {"pdf"}
+
+
+def test_near_duplicate_above_threshold_is_dropped(index):
+    index.match("html::0", "html", BASE)
+    near = BASE + " in orbit"
+    assert _similarity(BASE, near) >= 0.85
+
+    assert index.match("pdf::0", "pdf", near) == ("html::0", "near")
+
+
+def test_similar_text_below_threshold_is_kept(tmp_path):
+    index = DedupIndex(tmp_path, threshold=1.0)
+    index.match("html::0", "html", BASE)
+
+    assert index.match("pdf::0", "pdf", BASE + " in orbit") == (None, None)
+    index.close()
+
+
+def test_rematching_a_chunk_does_not_drop_it(index):
+    index.match("html::0", "html", BASE)
+
+    assert index.match("html::0", "html", BASE) == (None, None)
+
+
+def test_forget_releases_kept_chunks(index):
+    index.match("html::0", "html", BASE)
+    index.forget(["html::0"])
+
+    assert index.match("pdf::0", "pdf", BASE) == (None, None)
+    assert index.dependents(["html::0"]) == set()
+
+
+def test_merge_metadata_lists_other_copies_once():
+    kept = {"link": "https://a", "title": "A"}
+    merged = merge_metadata(kept, [{"link": "https://b"}, {"link": "https://a"}, {"title": "C"}, {"link": "https://b"}])
+
+    assert merged["also_in"] == "https://b\nC"
+    assert merge_metadata(kept, [{"link": "https://a"}]) is kept
@@ -0,0 +1,95 @@
+import sqlite3
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+
+import faiss_store
+from faiss_store import FaissStore, build_faiss_index, faiss_index_info, where_sql
+from filters import chroma_where
+
+
+class _Chroma:
+    """Just enough of a Chroma store for build_faiss_index: paged get"""
+
+    def __init__(self, count, dimension):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.standard_normal((count, dimension)).astype(np.float32)
+
+    def get(self, include, limit, offset):
+        stop = min(offset + limit, len(self.embeddings))
+        ids = [f"doc.pdf::{i}" for i in range(offset, stop)]
+        return {
+            "ids": ids,
+            "documents": [f"Chunk {i}" for i in range(offset, stop)],
+            "metadatas": [{"source": "doc.pdf", "date": 20200101 + i} for i in range(offset, stop)],
+            "embeddings": self.embeddings[offset:stop],
+        }
+
+
+def _mapped_files():
+    with open("/proc/self/maps", encoding="utf-8") as maps:
+        return {line.split(maxsplit=5)[5].strip() for line in maps if len(line.split(maxsplit=5)) == 6}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc/self/maps")
+@pytest.mark.parametrize(
+    "index_type, count",
+    [("flat", 200), ("sq8", 200), ("ivf", 2000), ("ivfpq", 1024)],
+)
+def test_index_codes_are_memory_mapped(tmp_path, monkeypatch, index_type, count):
+    faiss = pytest.importorskip("faiss")
+    # Small enough to train IVF-PQ quickly: 8-bit codes from 1024 vectors, one subquantizer
+    monkeypatch.setattr(faiss_store, "_TRAINING_POINTS_PER_CENTROID", 4)
+    monkeypatch.setattr(faiss_store, "FAISS_PQ_M", 1)
+    if index_type in ("flat", "sq8") and not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        pytest.skip("this faiss cannot memory-map IndexFlatCodes")
+    chroma = _Chroma(count, 8)
+    path = build_faiss_index(chroma, tmp_path, index_type=index_type, page_size=1000)
+    assert faiss_index_info(tmp_path)["type"] == index_type
+
+    store = FaissStore(tmp_path, embedding_function=None)
+
+    # Mapped from the file rather than copied into each process
+    assert str((path / "index.faiss").resolve()) in _mapped_files()
+    hits = store.similarity_search_by_vector_with_relevance_scores(chroma.embeddings[7], k=1)
+    assert hits[0][0].id == "doc.pdf::7"
+
+
+def _matching(where):
+    sql, params = where_sql(where)
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE chunks (id TEXT, date INTEGER, source_type TEXT)")
+    db.executemany(
+        "INSERT INTO chunks VALUES (?, ?, ?)",
+        [("old", 20050101, "pdf"), ("new", 20200101, "pdf"), ("page", 20200101, "html"), ("undated", 0, "csv")],
+    )
+    return {row[0] for row in db.execute(f"SELECT id FROM chunks WHERE {sql}", params)}
+
+
+def test_where_sql_translates_filter_clauses():
+    where = chroma_where({"date_from": 20100101, "date_to": None, "source_types": ["html", "pdf"]})
+
+    assert where_sql(where) == ("((date >= ?) AND (source_type IN (?,?)))", [20100101, "html", "pdf"])
+    assert _matching(where) == {"new", "page"}
+
+
+@pytest.mark.parametrize(
+    "where, expected",
+    [
+        ({"source_type": "csv"}, {"undated"}),
+        ({"source_type": {"$nin": ["pdf", "html"]}}, {"undated"}),
+        ({"date": {"$gt": 0, "$lt": 20100101}}, {"old"}),
+        ({"$or": [{"source_type": "html"}, {"date": {"$lte": 20050101}}]}, {"old", "page", "undated"}),
+    ],
+)
+def test_where_sql_operators(where, expected):
+    assert _matching(where) == expected
+
+
+@pytest.mark.parametrize("where", [{"source": "doc.pdf"}, {"date": {"$regex": "2015"}}])
+def test_where_sql_rejects_unsupported_filters(where):
+    with pytest.raises(ValueError):
+        where_sql(where)
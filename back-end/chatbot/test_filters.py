@@ -0,0 +1,91 @@
+import pytest
+
+from filters import chroma_where, date_key, matches, parse_date_bound, parse_filters
+
+
+def test_date_key_reads_iso_dates():
+    assert date_key("2015-06-30") == 20150630
+    assert date_key("2015") == 0
+    assert date_key(None) == 0
+
+
+@pytest.mark.parametrize(
+    "value, upper, expected",
+    [
+        ("2015", False, 20150101),
+        ("2015", True, 20151231),
+        ("2015-06", False, 20150601),
+        ("2015-06", True, 20150631),
+        ("2015-06-30", True, 20150630),
+    ],
+)
+def test_date_bounds_cover_whole_year_or_month(value, upper, expected):
+    assert parse_date_bound(value, upper=upper) == expected
+
+
+@pytest.mark.parametrize("value", ["15", "2015/06", "2015-13", "2015-06-32"])
+def test_malformed_date_bound_is_rejected(value):
+    with pytest.raises(ValueError):
+        parse_date_bound(value)
+
+
+def test_parse_filters_normalizes_request():
+    assert parse_filters({"after": "2010", "before": "2015-06", "source_types": "PDF, html,pdf"}) == {
+        "date_from": 20100101,
+        "date_to": 20150631,
+        "source_types": ["html", "pdf"],
+    }
+
+
+@pytest.mark.parametrize("raw", [None, {}, {"after": "", "source_types": []}])
+def test_empty_filters_are_none(raw):
+    assert parse_filters(raw) is None
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        ["pdf"],
+        {"author": "Smith"},
+        {"source_types": ["video"]},
+        {"after": "2016", "before": "2015"},
+    ],
+)
+def test_invalid_filters_are_rejected(raw):
+    with pytest.raises(ValueError):
+        parse_filters(raw)
+
+
+def test_chroma_where_single_clause():
+    assert chroma_where({"date_from": None, "date_to": None, "source_types": ["pdf"]}) == {
+        "source_type": {"$in": ["pdf"]}
+    }
+
+
+def test_chroma_where_combines_date_range_and_source_types():
+    where = chroma_where({"date_from": 20100101, "date_to": 20151231, "source_types": ["csv", "pdf"]})
+
+    assert where == {
+        "$and": [
+            {"date": {"$gte": 20100101}},
+            {"date": {"$lte": 20151231}},
+            {"source_type": {"$in": ["csv", "pdf"]}},
+        ]
+    }
+
+
+def test_chroma_where_upper_bound_excludes_undated_chunks():
+    assert chroma_where({"date_from": None, "date_to": 20151231, "source_types": None}) == {
+        "$and": [{"date": {"$gte": 1}}, {"date": {"$lte": 20151231}}]
+    }
+    assert chroma_where(None) is None
+
+
+def test_matches_agrees_with_where_clause():
+    filters = parse_filters({"before": "2015", "source_types": ["pdf"]})
+
+    assert matches({"date": 20140101, "source_type": "pdf"}, filters)
+    assert not matches({"date": 20160101, "source_type": "pdf"}, filters)
+    assert not matches({"date": 0, "source_type": "pdf"}, filters)
+    assert not matches({"date": 20140101, "source_type": "html"}, filters)
+    assert matches({}, None)
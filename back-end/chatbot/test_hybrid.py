@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from hybrid import RRF_K, reciprocal_rank_fusion  # noqa: E402
+
+
+def test_ids_ranked_well_by_both_lists_come_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]], k=4)
+
+    assert fused[:2] == ["b", "a"]
+    assert set(fused) == {"a", "b", "c", "d"}
+
+
+def test_scores_follow_reciprocal_ranks():
+    # c: 1/(K+3) + 1/(K+1) beats a: 1/(K+1) alone, and d: 1/(K+2) alone
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=4, rrf_k=RRF_K)
+
+    assert fused[0] == "c"
+    assert fused.index("a") < fused.index("d")
+
+
+def test_k_truncates_and_empty_lists_are_ignored():
+    assert reciprocal_rank_fusion([["a", "b", "c"], []], k=2) == ["a", "b"]
+    assert reciprocal_rank_fusion([[], []], k=3) == []
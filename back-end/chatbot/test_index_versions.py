@@ -0,0 +1,135 @@
+import pytest
+
+from index_versions import (
+    activate,
+    active_index_dir,
+    create_shadow,
+    current_version,
+    discard_shadow,
+    list_versions,
+    prune_versions,
+    rollback,
+)
+
+
+def _version(root, name):
+    path = root / "versions" / name
+    path.mkdir(parents=True)
+    (path / "chroma.sqlite3").write_text(name)
+    return path
+
+
+def _names(root):
+    return [v["name"] for v in list_versions(root)]
+
+
+def test_unversioned_store_is_served_from_root(tmp_path):
+    assert current_version(tmp_path) is None
+    assert active_index_dir(tmp_path) == tmp_path
+
+
+def test_activate_switches_and_keeps_rollback_target(tmp_path):
+    _version(tmp_path, "v1")
+    _version(tmp_path, "v2")
+
+    activate(tmp_path, "v1")
+    activate(tmp_path, "v2")
+
+    assert current_version(tmp_path) == "v2"
+    assert active_index_dir(tmp_path) == tmp_path / "versions" / "v2"
+    assert [(v["name"], v["current"], v["previous"]) for v in list_versions(tmp_path)] == [
+        ("v1", False, True),
+        ("v2", True, False),
+    ]
+
+
+def test_rollback_swaps_current_and_previous(tmp_path):
+    _version(tmp_path, "v1")
+    _version(tmp_path, "v2")
+    activate(tmp_path, "v1")
+    activate(tmp_path, "v2")
+
+    assert rollback(tmp_path) == "v1"
+    assert current_version(tmp_path) == "v1"
+    # Rolling back again undoes the rollback
+    assert rollback(tmp_path) == "v2"
+
+
+def test_rollback_without_previous_version_fails(tmp_path):
+    _version(tmp_path, "v1")
+    activate(tmp_path, "v1")
+
+    with pytest.raises(RuntimeError):
+        rollback(tmp_path)
+
+
+def test_activate_prunes_oldest_unprotected_versions(tmp_path):
+    for name in ("v1", "v2", "v3", "v4"):
+        _version(tmp_path, name)
+        activate(tmp_path, name)
+
+    assert _names(tmp_path) == ["v3", "v4"]
+    assert current_version(tmp_path) == "v4"
+
+
+def test_prune_never_removes_building_version(tmp_path):
+    _version(tmp_path, "v1")
+    (tmp_path / "BUILDING").write_text('{"name": "v1", "full": true}')
+    for name in ("v2", "v3"):
+        _version(tmp_path, name)
+        activate(tmp_path, name)
+
+    prune_versions(tmp_path, keep=2)
+
+    assert _names(tmp_path) == ["v1", "v2", "v3"]
+
+
+def test_incremental_shadow_copies_active_index(tmp_path):
+    _version(tmp_path, "v1")
+    activate(tmp_path, "v1")
+
+    shadow = create_shadow(tmp_path)
+
+    assert (shadow / "chroma.sqlite3").read_text() == "v1"
+    assert [v["name"] for v in list_versions(tmp_path) if v["building"]] == [shadow.name]
+    # Still not current until activated
+    assert current_version(tmp_path) == "v1"
+
+
+def test_shadow_of_unversioned_store_leaves_out_root_files(tmp_path):
+    (tmp_path / "chroma.sqlite3").write_text("legacy")
+    (tmp_path / "answer_cache.sqlite3").write_text("cache")
+
+    shadow = create_shadow(tmp_path)
+
+    assert sorted(path.name for path in shadow.iterdir()) == ["chroma.sqlite3"]
+
+
+def test_unfinished_build_of_same_kind_is_resumed(tmp_path):
+    first = create_shadow(tmp_path, full=True)
+    (first / "partial").write_text("")
+
+    assert create_shadow(tmp_path, full=True) == first
+
+    # An incremental build replaces an unfinished full one
+    second = create_shadow(tmp_path)
+    assert second != first
+    assert not first.exists()
+
+
+def test_activating_shadow_finishes_build(tmp_path):
+    shadow = create_shadow(tmp_path, full=True)
+
+    activate(tmp_path, shadow.name)
+
+    assert current_version(tmp_path) == shadow.name
+    assert not (tmp_path / "BUILDING").exists()
+
+
+def test_discard_shadow_removes_build(tmp_path):
+    shadow = create_shadow(tmp_path, full=True)
+
+    discard_shadow(tmp_path, shadow.name)
+
+    assert not shadow.exists()
+    assert not (tmp_path / "BUILDING").exists()
@@ -0,0 +1,82 @@
+import re
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pypdf")
+pytest.importorskip("langchain.text_splitter")
+
+from loaders import html_publication_date, load_html_file, split_pages, split_text
+
+CHUNK_SIZE = 100
+CHUNK_OVERLAP = 20
+
+
+def _pages(count, sentences):
+    """Pages of numbered words, so every word of the input can be traced to its chunk"""
+    return [" ".join(f"w{page}_{n} is a word." for n in range(sentences)) for page in range(count)]
+
+
+def _words(text):
+    return set(re.findall(r"w\d+_\d+", text))
+
+
+@pytest.mark.parametrize("sentences", [2, 30])
+def test_split_pages_matches_splitting_whole_text(sentences):
+    # Enough pages to cross several windows of 8 * CHUNK_SIZE characters
+    pages = _pages(60, sentences)
+    whole = "".join(page + "\n" for page in pages)
+
+    chunks = list(split_pages(pages, CHUNK_SIZE, CHUNK_OVERLAP))
+
+    assert chunks == split_text(whole, CHUNK_SIZE, CHUNK_OVERLAP)
+
+
+def test_split_pages_loses_no_text_at_window_boundaries():
+    pages = _pages(40, 30)
+
+    chunks = list(split_pages(pages, CHUNK_SIZE, CHUNK_OVERLAP))
+
+    assert all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
+    assert set().union(*map(_words, chunks)) == _words(" ".join(pages))
+
+
+def test_chunks_span_page_breaks():
+    # Pages shorter than a chunk are joined rather than chunked one by one
+    pages = _pages(20, 2)
+
+    chunks = list(split_pages(pages, CHUNK_SIZE, CHUNK_OVERLAP))
+
+    assert len(chunks) < len(pages)
+    assert any({"w0_1", "w1_0"} <= _words(chunk) for chunk in chunks)
+
+
+def test_empty_pages_are_skipped():
+    pages = _pages(3, 2)
+
+    assert list(split_pages(["", pages[0], "", pages[1], pages[2], ""], CHUNK_SIZE, CHUNK_OVERLAP)) == list(
+        split_pages(pages, CHUNK_SIZE, CHUNK_OVERLAP)
+    )
+    assert list(split_pages([], CHUNK_SIZE, CHUNK_OVERLAP)) == []
+
+
+def test_html_publication_date_reads_citation_meta_tags():
+    page = (
+        '<head><meta name="citation_date" content="2015">'
+        '<META content="2014 Aug 18" name="citation_publication_date"></head>'
+    )
+
+    assert html_publication_date(page) == "2014-08-18"
+    assert html_publication_date("<meta property='article:published_time' content='2019-03-05T10:00:00Z'>") == "2019-03-05"
+    assert html_publication_date('<meta name="citation_date" content="not a date">') == ""
+
+
+def test_html_without_publication_date_is_undated(tmp_path):
+    # The download time must not pass for a publication date in date filters
+    page = tmp_path / "PMC1.html"
+    page.write_text("<html><body>" + "Microgravity text. " * 20 + "</body></html>", encoding="utf-8")
+
+    docs = load_html_file(page)
+
+    assert docs
+    assert all(doc.metadata["date"] == 0 and doc.metadata["pub_date"] == "" for doc in docs)
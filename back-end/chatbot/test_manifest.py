@@ -0,0 +1,55 @@
+import os
+
+from manifest import diff_sources, fingerprint, load_manifest, save_manifest
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_diff_sources_classifies_added_changed_removed_and_unchanged(tmp_path):
+    same = _write(tmp_path / "same.pdf", "same")
+    edited = _write(tmp_path / "edited.pdf", "before")
+    previous = {
+        "same.pdf": fingerprint(same),
+        "edited.pdf": fingerprint(edited),
+        "gone.pdf": {"size": 1, "mtime": 0.0, "sha256": "0" * 64},
+    }
+    _write(edited, "after, and longer")
+    new = _write(tmp_path / "new.pdf", "new")
+
+    added, changed, removed, unchanged = diff_sources(
+        previous, [("same.pdf", same), ("edited.pdf", edited), ("new.pdf", new)]
+    )
+
+    assert [key for key, _, _ in added] == ["new.pdf"]
+    assert [key for key, _, _ in changed] == ["edited.pdf"]
+    assert removed == ["gone.pdf"]
+    assert unchanged == ["same.pdf"]
+
+
+def test_touched_file_with_same_content_is_unchanged_and_refreshed(tmp_path):
+    path = _write(tmp_path / "a.html", "content")
+    previous = {"a.html": fingerprint(path)}
+    os.utime(path, (1_000_000, 1_000_000))
+
+    added, changed, removed, unchanged = diff_sources(previous, [("a.html", path)])
+
+    assert (added, changed, removed, unchanged) == ([], [], [], ["a.html"])
+    assert previous["a.html"]["mtime"] == 1_000_000
+
+
+def test_fingerprint_reuses_hash_when_size_and_mtime_match(tmp_path):
+    path = _write(tmp_path / "a.html", "content")
+    stat = path.stat()
+    previous = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": "cached"}
+
+    assert fingerprint(path, previous)["sha256"] == "cached"
+
+
+def test_manifest_from_another_ingest_version_is_ignored(tmp_path):
+    save_manifest(tmp_path, "5:1000:200", {"a.html": {"sha256": "x"}})
+
+    assert load_manifest(tmp_path, "5:1000:200") == {"a.html": {"sha256": "x"}}
+    assert load_manifest(tmp_path, "5:500:50") == {}
@@ -0,0 +1,74 @@
+import pytest
+
+from pipeline import Checkpoint, iter_batches, plan_signature, prefetch
+
+
+def _sources():
+    return [("a", ["a0", "a1", "a2"]), ("broken", None), ("b", iter(["b0", "b1"]))]
+
+
+def test_iter_batches_fixed_size_with_stable_ids():
+    batches = list(iter_batches(_sources(), batch_size=2))
+
+    assert [batch.index for batch in batches] == [0, 1, 2]
+    assert [batch.ids for batch in batches] == [["a::0", "a::1"], ["a::2", "b::0"], ["b::1"]]
+    assert [batch.docs for batch in batches] == [["a0", "a1"], ["a2", "b0"], ["b1"]]
+
+
+def test_iter_batches_reports_sources_in_the_batch_with_their_last_chunk():
+    batches = list(iter_batches(_sources(), batch_size=2))
+
+    assert batches[0].finished == []
+    assert batches[1].finished == [("a", ["a::0", "a::1", "a::2"])]
+    assert batches[1].failed == ["broken"]
+    assert batches[2].finished == [("b", ["b::0", "b::1"])]
+
+
+def test_iter_batches_marks_a_source_failing_mid_stream():
+    def explode():
+        yield "c0"
+        raise RuntimeError("bad page")
+
+    batches = list(iter_batches([("c", explode()), ("d", ["d0"])], batch_size=10))
+
+    assert batches[0].failed == ["c"]
+    assert batches[0].finished == [("d", ["d::0"])]
+
+
+def test_checkpoint_resumes_only_the_same_plan(tmp_path):
+    plan = plan_signature(["a", "b"], 2)
+    Checkpoint(tmp_path, plan).commit(2)
+
+    assert Checkpoint(tmp_path, plan).committed == 2
+    assert Checkpoint(tmp_path, plan_signature(["a", "b"], 4)).committed == 0
+
+    Checkpoint(tmp_path, plan).clear()
+    assert Checkpoint(tmp_path, plan).committed == 0
+
+
+def test_resumed_build_skips_committed_batches(tmp_path):
+    plan = plan_signature(["a", "b"], 2)
+    checkpoint = Checkpoint(tmp_path, plan)
+    embedded = []
+    for batch in iter_batches(_sources(), batch_size=2):
+        embedded.extend(batch.ids)
+        checkpoint.commit(batch.index + 1)
+        if batch.index == 1:
+            break  # interrupted
+
+    resumed = Checkpoint(tmp_path, plan)
+    remaining = [batch.ids for batch in iter_batches(_sources(), 2) if batch.index >= resumed.committed]
+
+    assert remaining == [["b::1"]]
+    assert embedded + remaining[0] == ["a::0", "a::1", "a::2", "b::0", "b::1"]
+
+
+def test_prefetch_preserves_order_and_reraises():
+    assert list(prefetch(iter(range(50)), maxsize=3)) == list(range(50))
+
+    def failing():
+        yield 1
+        raise ValueError("loader failed")
+
+    with pytest.raises(ValueError):
+        list(prefetch(failing(), maxsize=1))
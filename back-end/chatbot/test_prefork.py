@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import select
+import signal
+import sys
+import time
+
+import pytest
+
+from prefork import PreforkPool, _Worker
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+
+
+def _sleepy_worker(reader, writer):
+    """Serve loop that sleeps for a request's "sleep" seconds before answering it"""
+    def emit(message):
+        writer.write(json.dumps(message) + "\n")
+        writer.flush()
+
+    emit({"event": "ready"})
+    for line in reader:
+        request = json.loads(line)
+        time.sleep(request.get("sleep", 0))
+        emit({"id": request["id"], "event": "done", "success": True})
+
+
+class _Client:
+    def __init__(self, to_pool, from_pool):
+        self.to_pool = to_pool
+        self.from_pool = from_pool
+        self.buffer = b""
+
+    def send(self, *messages):
+        os.write(self.to_pool, b"".join(json.dumps(m).encode() + b"\n" for m in messages))
+
+    def receive(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.from_pool], [], [], remaining)[0]:
+                raise TimeoutError("No reply from the pool")
+            chunk = os.read(self.from_pool, 65536)
+            if not chunk:
+                raise EOFError("The pool exited")
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return json.loads(line)
+
+
+@pytest.fixture
+def client():
+    requests_read, requests_write = os.pipe()
+    replies_read, replies_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(requests_write)
+            os.close(replies_read)
+            with os.fdopen(requests_read, "r") as instream, os.fdopen(replies_write, "w") as outstream:
+                PreforkPool(1, _sleepy_worker, queue_size=4, request_timeout=1).serve(instream, outstream)
+            code = 0
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+
+    os.close(requests_read)
+    os.close(replies_write)
+    client = _Client(requests_write, replies_read)
+    assert client.receive()["event"] == "ready"
+    yield client
+
+    os.close(requests_write)
+    deadline = time.monotonic() + 10
+    while os.waitpid(pid, os.WNOHANG) == (0, 0):
+        if time.monotonic() > deadline:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+            break
+        time.sleep(0.05)
+    os.close(replies_read)
+
+
+def test_request_after_cancel_goes_to_replacement_worker(client):
+    client.send({"id": 1, "sleep": 30}, {"cancel": 1}, {"id": 2})
+
+    assert client.receive() == {"id": 2, "event": "done", "success": True}
+
+
+def test_request_after_timeout_goes_to_replacement_worker(client):
+    client.send({"id": 1, "sleep": 30})
+    assert client.receive() == {"id": 1, "event": "error", "error": "Chatbot request timed out", "success": False}
+
+    client.send({"id": 2})
+
+    assert client.receive() == {"id": 2, "event": "done", "success": True}
+
+
+@pytest.mark.parametrize("give_up", ["cancel", "timeout"])
+def test_worker_given_up_on_takes_no_more_requests(monkeypatch, give_up):
+    pool = PreforkPool(1, _sleepy_worker, queue_size=4, request_timeout=1)
+    pool.outstream = io.StringIO()
+    killed = []
+    monkeypatch.setattr(pool, "_kill", killed.append)
+    worker = _Worker(pid=12345, to_child=io.StringIO(), from_child=-1)
+    worker.ready = True
+    worker.request = (1, time.monotonic() - 5)
+    pool.workers[worker.pid] = worker
+
+    if give_up == "cancel":
+        pool._cancel(1)
+    else:
+        pool._expire_requests()
+    pool._accept(json.dumps({"id": 2}).encode())
+
+    # Request 2 waits for the replacement instead of going to the killed worker
+    assert killed == [worker]
+    assert worker.request is None
+    assert list(pool.queue) == [(2, json.dumps({"id": 2}).encode())]
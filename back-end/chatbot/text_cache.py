@@ -0,0 +1,94 @@
+# text_cache.py
+"""
+On-disk cache of extracted source text.
+
+Parsing PDFs is the slowest part of ingestion, and the text only changes
+when the file or the extractor does. Each source's pages are stored as a
+gzipped JSONL file named after the file's SHA-256, in a directory per
+extractor version, so a rebuild with new chunking settings re-splits the
+cached text without parsing anything. Entries are written to a temporary
+file and renamed into place, so an interrupted extraction never leaves a
+partial entry behind.
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+import uuid
+from pathlib import Path
+
+from manifest import file_sha256
+
+TEXT_CACHE_DIR = Path(os.getenv("TEXT_CACHE_DIR", "Cache/extracted"))
+TEXT_CACHE_ENABLED = os.getenv("TEXT_CACHE_ENABLED", "true").lower() != "false"
+
+
+def _entry_path(extractor, sha256):
+    return TEXT_CACHE_DIR / extractor / f"{sha256}.jsonl.gz"
+
+
+def cached_pages(path, extractor, extract):
+    """
+    Yield the text of each page of path, from the cache when an entry for
+    the file's content and this extractor exists, otherwise from extract(path),
+    caching the pages as they are produced. extractor names the extraction
+    code and its version; changing it invalidates every entry.
+    """
+    if not TEXT_CACHE_ENABLED:
+        yield from extract(path)
+        return
+
+    entry = _entry_path(extractor, file_sha256(path))
+    if entry.exists():
+        try:
+            with gzip.open(entry, "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)["text"]
+            return
+        except (OSError, EOFError, ValueError, KeyError):
+            # The load fails and is retried on the next build, which re-extracts
+            entry.unlink(missing_ok=True)
+            raise
+
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    tmp_entry = entry.with_name(f"{entry.name}.{uuid.uuid4().hex[:8]}.tmp")
+    complete = False
+    try:
+        with gzip.open(tmp_entry, "wt", encoding="utf-8") as f:
+            for text in extract(path):
+                f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+                yield text
+        os.replace(tmp_entry, entry)
+        complete = True
+    finally:
+        if not complete:
+            tmp_entry.unlink(missing_ok=True)
+
+
+def prune_text_cache(live_hashes, extractors):
+    """
+    Delete entries for file contents that are no longer indexed and every
+    directory of an extractor version not in extractors. Returns the number
+    of entries removed.
+    """
+    if not TEXT_CACHE_DIR.exists():
+        return 0
+    removed = 0
+    for directory in TEXT_CACHE_DIR.iterdir():
+        if not directory.is_dir():
+            continue
+        if directory.name not in extractors:
+            removed += sum(1 for _ in directory.glob("*.jsonl.gz"))
+            shutil.rmtree(directory, ignore_errors=True)
+            continue
+        for entry in directory.glob("*.jsonl.gz"):
+            if entry.name[: -len(".jsonl.gz")] not in live_hashes:
+                entry.unlink(missing_ok=True)
+                removed += 1
+        # Left behind by extractions that were killed
+        for leftover in directory.glob("*.tmp"):
+            leftover.unlink(missing_ok=True)
+    if removed:
+        print(f"[INFO] Text cache: pruned {removed} stale entries", file=sys.stderr)
+    return removed
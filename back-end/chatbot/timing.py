@@ -0,0 +1,26 @@
+# timing.py
+"""Wall-clock timing of named stages, reported in milliseconds"""
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        return {name: round(ms, 1) for name, ms in self.stages.items()}
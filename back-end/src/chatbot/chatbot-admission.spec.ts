@@ -0,0 +1,193 @@
+import {
+  ChatbotAdmissionController,
+  ChatbotOverloadedError,
+  ChatbotPriority,
+} from './chatbot-admission';
+
+type Deferred = { promise: Promise<string>; resolve: (value: string) => void };
+
+function deferred(): Deferred {
+  let resolve!: (value: string) => void;
+  const promise = new Promise<string>((r) => (resolve = r));
+  return { promise, resolve };
+}
+
+const OPTIONS = { maxConcurrent: 1, maxQueueDepth: 2, maxWait: 1000 };
+
+/** Let pending promise callbacks run */
+const flush = () => new Promise((resolve) => setImmediate(resolve));
+
+describe('ChatbotAdmissionController', () => {
+  let admission: ChatbotAdmissionController;
+  let started: string[];
+  let running: Map<string, Deferred>;
+
+  function submit(
+    name: string,
+    priority = ChatbotPriority.user,
+    signal?: AbortSignal,
+    key?: string,
+  ): Promise<string> {
+    const result = admission.run(
+      priority,
+      () => {
+        started.push(name);
+        const task = deferred();
+        running.set(name, task);
+        return task.promise;
+      },
+      signal,
+      key,
+    );
+    // Queries a test leaves waiting are turned away after it ends
+    result.catch(() => undefined);
+    return result;
+  }
+
+  async function finish(name: string) {
+    running.get(name)!.resolve(name);
+    await flush();
+  }
+
+  beforeEach(() => {
+    admission = new ChatbotAdmissionController(OPTIONS);
+    started = [];
+    running = new Map();
+  });
+
+  afterEach(() => {
+    jest.useRealTimers();
+  });
+
+  it('runs queries up to the concurrency limit straight away', async () => {
+    admission = new ChatbotAdmissionController({ ...OPTIONS, maxConcurrent: 2 });
+    void submit('a');
+    void submit('b');
+    void submit('c');
+    await flush();
+
+    expect(started).toEqual(['a', 'b']);
+  });
+
+  it('admits waiters by priority, first come first served within one', async () => {
+    void submit('running');
+    void submit('user', ChatbotPriority.user);
+    void submit('admin', ChatbotPriority.admin);
+    await flush();
+
+    await finish('running');
+    await finish('admin');
+
+    expect(started).toEqual(['running', 'admin', 'user']);
+  });
+
+  it('rejects a new query when the queue is full of equal or higher priority', async () => {
+    void submit('running');
+    void submit('first');
+    void submit('second');
+
+    await expect(submit('third')).rejects.toBeInstanceOf(ChatbotOverloadedError);
+  });
+
+  it('evicts the latest lowest-priority waiter for a higher-priority query', async () => {
+    void submit('running');
+    void submit('first', ChatbotPriority.user);
+    const second = submit('second', ChatbotPriority.user);
+
+    void submit('admin', ChatbotPriority.admin);
+
+    await expect(second).rejects.toBeInstanceOf(ChatbotOverloadedError);
+    await finish('running');
+    await finish('admin');
+    expect(started).toEqual(['running', 'admin', 'first']);
+  });
+
+  it('estimates Retry-After from recent query durations and queue length', async () => {
+    jest.useFakeTimers({ doNotFake: ['setImmediate'] });
+    void submit('running');
+    await flush();
+    jest.advanceTimersByTime(10_000);
+    await finish('running');
+
+    // One query in the running average: 5 s + 0.2 * (10 s - 5 s)
+    expect(admission.retryAfterSeconds()).toBe(6);
+
+    void submit('next');
+    void submit('first');
+    void submit('second');
+    await flush();
+    const rejection = await submit('third').catch((error: ChatbotOverloadedError) => error);
+
+    expect(rejection).toBeInstanceOf(ChatbotOverloadedError);
+    expect((rejection as ChatbotOverloadedError).retryAfterSeconds).toBe(18);
+  });
+
+  it('caps Retry-After at a minute', async () => {
+    jest.useFakeTimers({ doNotFake: ['setImmediate'] });
+    void submit('running');
+    await flush();
+    jest.advanceTimersByTime(1_000_000);
+    await finish('running');
+
+    expect(admission.retryAfterSeconds()).toBe(60);
+  });
+
+  it('turns a query away once it has waited maxWait', async () => {
+    jest.useFakeTimers({ doNotFake: ['setImmediate'] });
+    void submit('running');
+    const waiting = submit('waiting');
+
+    jest.advanceTimersByTime(1000);
+
+    await expect(waiting).rejects.toBeInstanceOf(ChatbotOverloadedError);
+    await finish('running');
+    expect(started).toEqual(['running']);
+  });
+
+  it('drops a waiting query whose signal is aborted', async () => {
+    const controller = new AbortController();
+    void submit('running');
+    const waiting = submit('waiting', ChatbotPriority.user, controller.signal);
+    void submit('next');
+
+    controller.abort();
+
+    await expect(waiting).rejects.toThrow('Chatbot request cancelled');
+    await finish('running');
+    expect(started).toEqual(['running', 'next']);
+  });
+
+  it('rejects a query whose signal is already aborted', async () => {
+    const controller = new AbortController();
+    controller.abort();
+
+    await expect(submit('late', ChatbotPriority.user, controller.signal)).rejects.toThrow(
+      'Chatbot request cancelled',
+    );
+    expect(started).toEqual([]);
+  });
+
+  it('moves a promoted query ahead of lower-priority waiters', async () => {
+    void submit('running');
+    void submit('first', ChatbotPriority.user);
+    void submit('shared', ChatbotPriority.user, undefined, 'shared');
+    await flush();
+
+    admission.promote('shared', ChatbotPriority.admin);
+    await finish('running');
+
+    expect(started).toEqual(['running', 'shared']);
+  });
+
+  it('never demotes a waiting query', async () => {
+    void submit('running');
+    void submit('shared', ChatbotPriority.admin, undefined, 'shared');
+    void submit('other', ChatbotPriority.admin);
+    await flush();
+
+    admission.promote('shared', ChatbotPriority.user);
+    await finish('running');
+
+    expect(started).toEqual(['running', 'shared']);
+  });
+});
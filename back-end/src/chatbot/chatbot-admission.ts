@@ -0,0 +1,189 @@
+import { HttpException, HttpStatus } from '@nestjs/common';
+import { RoleEnum } from '../roles/roles.enum';
+
+export enum ChatbotPriority {
+  user = 0,
+  admin = 1,
+}
+
+export type ChatbotAdmissionOptions = {
+  /** Chatbot queries running at once */
+  maxConcurrent: number;
+  /** Queries allowed to wait for a slot */
+  maxQueueDepth: number;
+  /** Longest a query may wait for a slot before it is turned away, in ms */
+  maxWait: number;
+  /** Called when a query gets a slot, with the time it waited */
+  onAdmitted?: (waitMs: number, priority: ChatbotPriority) => void;
+};
+
+/** The wait queue is full, or the query waited too long for a slot */
+export class ChatbotOverloadedError extends Error {
+  constructor(readonly retryAfterSeconds: number) {
+    super('Chatbot is overloaded, please retry later');
+    this.name = 'ChatbotOverloadedError';
+  }
+}
+
+/**
+ * 429 for a ChatbotOverloadedError, or 503 when the worker pool itself is
+ * full; the controller sends retryAfterSeconds as Retry-After
+ */
+export class ChatbotOverloadedException extends HttpException {
+  constructor(
+    readonly retryAfterSeconds: number,
+    status: HttpStatus = HttpStatus.TOO_MANY_REQUESTS,
+    message = 'Chatbot is overloaded, please retry later',
+  ) {
+    super({ statusCode: status, message, retryAfter: retryAfterSeconds }, status);
+  }
+}
+
+export function priorityForUser(user: { role?: { id?: number | string } | null }): ChatbotPriority {
+  return Number(user.role?.id) === RoleEnum.admin ? ChatbotPriority.admin : ChatbotPriority.user;
+}
+
+type Waiter = {
+  priority: ChatbotPriority;
+  key?: string;
+  resolve: () => void;
+  reject: (error: Error) => void;
+  timeout: NodeJS.Timeout;
+  signal?: AbortSignal;
+  onAbort?: () => void;
+};
+
+// Weight of the latest query in the running average of query durations
+const SERVICE_TIME_SMOOTHING = 0.2;
+const MAX_RETRY_AFTER_SECONDS = 60;
+
+/**
+ * Limits how many chatbot queries run at once. Queries beyond the limit
+ * wait in a bounded queue ordered by priority (admins before users, first
+ * come first served within a priority). When the
+ * queue is full a new query is turned away straight away, unless it
+ * outranks the lowest-priority waiter, which is turned away instead.
+ * A waiting query can be moved up with promote(). Rejections carry a
+ * Retry-After estimate from the recent query durations.
+ */
+export class ChatbotAdmissionController {
+  private active = 0;
+  private readonly waiting: Waiter[] = [];
+  private averageServiceMs = 5000;
+
+  constructor(private readonly options: ChatbotAdmissionOptions) {}
+
+  /**
+   * Run task once a slot is free; aborting signal while it waits gives up
+   * its place. key names the query for promote().
+   */
+  async run<T>(
+    priority: ChatbotPriority,
+    task: () => Promise<T>,
+    signal?: AbortSignal,
+    key?: string,
+  ): Promise<T> {
+    const enqueuedAt = Date.now();
+    await this.acquire(priority, signal, key);
+    this.options.onAdmitted?.(Date.now() - enqueuedAt, priority);
+
+    const startedAt = Date.now();
+    try {
+      return await task();
+    } finally {
+      this.release(Date.now() - startedAt);
+    }
+  }
+
+  /** Raise the priority of the waiting query run with key; no effect once it has a slot */
+  promote(key: string, priority: ChatbotPriority) {
+    const waiter = this.waiting.find((w) => w.key === key);
+    if (!waiter || waiter.priority >= priority) {
+      return;
+    }
+    this.waiting.splice(this.waiting.indexOf(waiter), 1);
+    waiter.priority = priority;
+    this.insert(waiter);
+  }
+
+  private acquire(priority: ChatbotPriority, signal?: AbortSignal, key?: string): Promise<void> {
+    if (signal?.aborted) {
+      return Promise.reject(new Error('Chatbot request cancelled'));
+    }
+    if (this.active < this.options.maxConcurrent && !this.waiting.length) {
+      this.active++;
+      return Promise.resolve();
+    }
+
+    if (this.waiting.length >= this.options.maxQueueDepth) {
+      const lowest = this.waiting[this.waiting.length - 1];
+      if (!lowest || lowest.priority >= priority) {
+        return Promise.reject(new ChatbotOverloadedError(this.retryAfterSeconds()));
+      }
+      this.remove(lowest);
+      lowest.reject(new ChatbotOverloadedError(this.retryAfterSeconds()));
+    }
+
+    return new Promise((resolve, reject) => {
+      const waiter: Waiter = {
+        priority,
+        resolve,
+        reject,
+        timeout: setTimeout(() => {
+          this.remove(waiter);
+          reject(new ChatbotOverloadedError(this.retryAfterSeconds()));
+        }, this.options.maxWait),
+        signal,
+        key,
+      };
+      if (signal) {
+        waiter.onAbort = () => {
+          this.remove(waiter);
+          reject(new Error('Chatbot request cancelled'));
+        };
+        signal.addEventListener('abort', waiter.onAbort, { once: true });
+      }
+      this.insert(waiter);
+    });
+  }
+
+  private insert(waiter: Waiter) {
+    // After every waiter of the same or higher priority
+    const position = this.waiting.findIndex((w) => w.priority < waiter.priority);
+    this.waiting.splice(position === -1 ? this.waiting.length : position, 0, waiter);
+  }
+
+  private release(serviceMs: number) {
+    this.averageServiceMs += SERVICE_TIME_SMOOTHING * (serviceMs - this.averageServiceMs);
+    const next = this.waiting.shift();
+    if (next) {
+      // The slot passes straight to the next waiter
+      this.forget(next);
+      next.resolve();
+    } else {
+      this.active--;
+    }
+  }
+
+  private remove(waiter: Waiter) {
+    this.forget(waiter);
+    const index = this.waiting.indexOf(waiter);
+    if (index !== -1) {
+      this.waiting.splice(index, 1);
+    }
+  }
+
+  private forget(waiter: Waiter) {
+    clearTimeout(waiter.timeout);
+    if (waiter.onAbort) {
+      waiter.signal?.removeEventListener('abort', waiter.onAbort);
+    }
+  }
+
+  /** Seconds until the queue ahead of a new query has likely drained */
+  retryAfterSeconds(): number {
+    const drainMs =
+      (this.averageServiceMs * (this.waiting.length + 1)) / Math.max(this.options.maxConcurrent, 1);
+    return Math.min(Math.max(Math.ceil(drainMs / 1000), 1), MAX_RETRY_AFTER_SECONDS);
+  }
+}
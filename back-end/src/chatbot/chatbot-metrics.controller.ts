@@ -0,0 +1,30 @@
+import { Controller, Get, Header, UseGuards } from '@nestjs/common';
+import { ApiBearerAuth, ApiOperation, ApiProduces, ApiTags } from '@nestjs/swagger';
+import { AuthGuard } from '@nestjs/passport';
+import { Roles } from '../roles/roles.decorator';
+import { RoleEnum } from '../roles/roles.enum';
+import { RolesGuard } from '../roles/roles.guard';
+import { ChatbotMetricsService } from './chatbot-metrics.service';
+
+@ApiBearerAuth()
+@Roles(RoleEnum.admin)
+@UseGuards(AuthGuard('jwt'), RolesGuard)
+@ApiTags('Chatbot')
+@Controller({
+  path: 'chatbot',
+  version: '1',
+})
+export class ChatbotMetricsController {
+  constructor(private readonly metricsService: ChatbotMetricsService) {}
+
+  @Get('metrics')
+  @Header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+  @ApiOperation({
+    summary: 'Chatbot metrics for Prometheus',
+    description: 'Query latency per stage, chunks retrieved, context size, LLM tokens, admission and rejection counts and worker start-up time, in the Prometheus text format. Admins only; Prometheus scrapes it with an admin bearer token.',
+  })
+  @ApiProduces('text/plain')
+  getMetrics(): string {
+    return this.metricsService.render();
+  }
+}
@@ -0,0 +1,237 @@
+import { Injectable } from '@nestjs/common';
+import { ChatbotQueryMetrics } from './dto/chatbot-response.dto';
+
+type Labels = Record<string, string>;
+
+type HistogramSeries = {
+  labels: Labels;
+  buckets: number[];
+  sum: number;
+  count: number;
+};
+
+function formatLabels(labels: Labels, extra?: Labels): string {
+  const entries = Object.entries({ ...labels, ...extra });
+  if (!entries.length) {
+    return '';
+  }
+  const escape = (value: string) =>
+    value.replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n');
+  return `{${entries.map(([key, value]) => `${key}="${escape(value)}"`).join(',')}}`;
+}
+
+function seriesKey(labels: Labels): string {
+  return JSON.stringify(Object.entries(labels).sort());
+}
+
+/**
+ * Prometheus histogram: cumulative buckets plus sum and count per label set.
+ */
+class Histogram {
+  private readonly series = new Map<string, HistogramSeries>();
+
+  constructor(
+    readonly name: string,
+    readonly help: string,
+    readonly bounds: number[],
+  ) {}
+
+  observe(value: number, labels: Labels = {}) {
+    if (!Number.isFinite(value)) {
+      return;
+    }
+    const key = seriesKey(labels);
+    let series = this.series.get(key);
+    if (!series) {
+      series = { labels, buckets: this.bounds.map(() => 0), sum: 0, count: 0 };
+      this.series.set(key, series);
+    }
+    this.bounds.forEach((bound, index) => {
+      if (value <= bound) {
+        series!.buckets[index]++;
+      }
+    });
+    series.sum += value;
+    series.count++;
+  }
+
+  render(): string[] {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+    for (const series of this.series.values()) {
+      this.bounds.forEach((bound, index) => {
+        lines.push(
+          `${this.name}_bucket${formatLabels(series.labels, { le: String(bound) })} ${series.buckets[index]}`,
+        );
+      });
+      lines.push(`${this.name}_bucket${formatLabels(series.labels, { le: '+Inf' })} ${series.count}`);
+      lines.push(`${this.name}_sum${formatLabels(series.labels)} ${series.sum}`);
+      lines.push(`${this.name}_count${formatLabels(series.labels)} ${series.count}`);
+    }
+    return lines;
+  }
+}
+
+class Counter {
+  private readonly series = new Map<string, { labels: Labels; value: number }>();
+
+  constructor(
+    readonly name: string,
+    readonly help: string,
+  ) {}
+
+  inc(labels: Labels = {}) {
+    const key = seriesKey(labels);
+    const series = this.series.get(key) ?? { labels, value: 0 };
+    series.value++;
+    this.series.set(key, series);
+  }
+
+  render(): string[] {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} counter`];
+    for (const series of this.series.values()) {
+      lines.push(`${this.name}${formatLabels(series.labels)} ${series.value}`);
+    }
+    return lines;
+  }
+}
+
+/**
+ * In-process metrics for chatbot queries, rendered in the Prometheus text
+ * exposition format. Stage timings and counters come from the `metrics`
+ * block every chatbot_api.py response carries.
+ */
+@Injectable()
+export class ChatbotMetricsService {
+  private readonly requests = new Counter(
+    'chatbot_requests_total',
+    'Chatbot queries by mode and outcome',
+  );
+
+  private readonly requestDuration = new Histogram(
+    'chatbot_request_duration_seconds',
+    'Wall-clock time of a chatbot query as seen by the API',
+    [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+  );
+
+  private readonly stageDuration = new Histogram(
+    'chatbot_stage_duration_seconds',
+    'Time spent in each stage of a chatbot query; node_overhead is queueing and IPC outside Python',
+    [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+  );
+
+  private readonly chunksRetrieved = new Histogram(
+    'chatbot_chunks_retrieved',
+    'Chunks retrieved as context per query',
+    [0, 1, 2, 4, 6, 8, 10, 12, 16, 24],
+  );
+
+  private readonly contextCharacters = new Histogram(
+    'chatbot_context_characters',
+    'Characters of retrieved context sent to the LLM per query',
+    [0, 1000, 2500, 5000, 10000, 20000, 40000],
+  );
+
+  private readonly tokens = new Histogram(
+    'chatbot_llm_tokens',
+    'LLM tokens per query by direction',
+    [16, 64, 256, 512, 1024, 2048, 4096, 8192],
+  );
+
+  private readonly coalesced = new Counter(
+    'chatbot_coalesced_requests_total',
+    'Queries answered by joining an identical query already in flight',
+  );
+
+  private readonly admissionWait = new Histogram(
+    'chatbot_admission_wait_seconds',
+    'Time a query waited for an admission slot, by priority',
+    [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+  );
+
+  private readonly workerStartup = new Histogram(
+    'chatbot_worker_startup_seconds',
+    'Time a Python chatbot worker took to become ready',
+    [0.5, 1, 2.5, 5, 10, 20, 30, 60],
+  );
+
+  observeQuery(
+    mode: 'ask' | 'stream',
+    processingTime: number,
+    metrics?: ChatbotQueryMetrics,
+    cache?: Record<string, string>,
+  ) {
+    this.requests.inc({ mode, outcome: 'success' });
+    this.requestDuration.observe(processingTime / 1000, {
+      mode,
+      cache: cache?.answer ?? 'unknown',
+    });
+
+    if (!metrics) {
+      return;
+    }
+
+    const { timings_ms: timings, counters } = metrics;
+    for (const [stage, ms] of Object.entries(timings ?? {})) {
+      if (stage !== 'total') {
+        this.stageDuration.observe(ms / 1000, { stage });
+      }
+    }
+    if (timings?.total !== undefined) {
+      this.stageDuration.observe(Math.max(processingTime - timings.total, 0) / 1000, {
+        stage: 'node_overhead',
+      });
+    }
+
+    if (cache?.answer === 'hit' || !counters) {
+      return;
+    }
+    this.chunksRetrieved.observe(counters.chunks_retrieved);
+    if (counters.context_chars !== undefined) {
+      this.contextCharacters.observe(counters.context_chars);
+    }
+    this.tokens.observe(counters.tokens_in, { direction: 'in' });
+    this.tokens.observe(counters.tokens_out, { direction: 'out' });
+  }
+
+  observeFailure(mode: 'ask' | 'stream') {
+    this.requests.inc({ mode, outcome: 'error' });
+  }
+
+  observeRejected(mode: 'ask' | 'stream') {
+    this.requests.inc({ mode, outcome: 'rejected' });
+  }
+
+  observeCancelled(mode: 'ask' | 'stream') {
+    this.requests.inc({ mode, outcome: 'cancelled' });
+  }
+
+  observeCoalesced() {
+    this.coalesced.inc();
+  }
+
+  observeAdmissionWait(waitMs: number, priority: string) {
+    this.admissionWait.observe(waitMs / 1000, { priority });
+  }
+
+  observeWorkerStartup(startupMs: number) {
+    this.workerStartup.observe(startupMs / 1000);
+  }
+
+  render(): string {
+    return (
+      [
+        this.requests,
+        this.requestDuration,
+        this.stageDuration,
+        this.chunksRetrieved,
+        this.contextCharacters,
+        this.tokens,
+        this.coalesced,
+        this.admissionWait,
+        this.workerStartup,
+      ]
+        .flatMap((metric) => metric.render())
+        .join('\n') + '\n'
+    );
+  }
+}
@@ -0,0 +1,123 @@
+import { spawn } from 'child_process';
+import { EventEmitter } from 'events';
+import { PassThrough } from 'stream';
+import { ChatbotWorkerPool } from './chatbot-worker-pool';
+
+jest.mock('child_process', () => ({ spawn: jest.fn() }));
+
+/** Stands in for a `chatbot_api.py serve` process; records the requests written to it */
+class FakeProcess extends EventEmitter {
+  readonly stdout = new PassThrough();
+  readonly stderr = new PassThrough();
+  readonly requests: Record<string, any>[] = [];
+  readonly stdin = {
+    write: (line: string) => {
+      this.requests.push(JSON.parse(line));
+      return true;
+    },
+  };
+  killed = false;
+
+  kill() {
+    this.killed = true;
+    setImmediate(() => this.emit('close', null));
+    return true;
+  }
+
+  reply(message: Record<string, any>) {
+    this.stdout.write(JSON.stringify(message) + '\n');
+  }
+
+  queries(): string[] {
+    return this.requests.map((request) => request.query);
+  }
+}
+
+const OPTIONS = {
+  pythonPath: 'python3',
+  scriptPath: 'chatbot_api.py',
+  cwd: '.',
+  env: {},
+  size: 1,
+  workersPerProcess: 1,
+  maxQueueDepth: 4,
+  requestTimeout: 1000,
+  enableLogging: false,
+};
+
+/** Let pending stream, promise and close callbacks run */
+const flush = () => new Promise((resolve) => setImmediate(resolve));
+
+describe('ChatbotWorkerPool', () => {
+  let pool: ChatbotWorkerPool;
+  let processes: FakeProcess[];
+
+  async function startPool() {
+    pool = new ChatbotWorkerPool(OPTIONS);
+    pool.start();
+    processes[0].reply({ event: 'ready', workers: 1 });
+    await flush();
+  }
+
+  /** Let the killed worker exit and its replacement start and report ready */
+  async function replaceWorker() {
+    await flush();
+    jest.advanceTimersByTime(0);
+    expect(processes.length).toBe(2);
+    expect(processes[1].requests).toEqual([]);
+    processes[1].reply({ event: 'ready', workers: 1 });
+    await flush();
+  }
+
+  beforeEach(() => {
+    jest.useFakeTimers({ doNotFake: ['setImmediate'] });
+    processes = [];
+    (spawn as jest.Mock).mockImplementation(() => {
+      const child = new FakeProcess();
+      processes.push(child);
+      return child;
+    });
+  });
+
+  afterEach(() => {
+    pool.stop();
+    jest.useRealTimers();
+  });
+
+  it('hands a queued request to the replacement of a worker killed to cancel another', async () => {
+    await startPool();
+    const controller = new AbortController();
+    const cancelled = pool.stream({ query: 'cancelled' }, () => undefined, controller.signal);
+    const queued = pool.request({ query: 'queued' });
+
+    controller.abort();
+
+    await expect(cancelled).rejects.toThrow('Chatbot request cancelled');
+    expect(processes[0].killed).toBe(true);
+    expect(processes[0].queries()).toEqual(['cancelled']);
+
+    await replaceWorker();
+    expect(processes[1].queries()).toEqual(['queued']);
+    processes[1].reply({ id: processes[1].requests[0].id, event: 'done', success: true });
+    expect(await queued).toEqual({ id: processes[1].requests[0].id, event: 'done', success: true });
+  });
+
+  it('hands a queued request to the replacement of a worker killed for timing out', async () => {
+    await startPool();
+    const slow = pool.request({ query: 'slow' });
+    slow.catch(() => undefined);
+    jest.advanceTimersByTime(500);
+    const queued = pool.request({ query: 'queued' });
+
+    jest.advanceTimersByTime(500);
+
+    await expect(slow).rejects.toThrow('Chatbot request timed out');
+    expect(processes[0].killed).toBe(true);
+    expect(processes[0].queries()).toEqual(['slow']);
+
+    await replaceWorker();
+    expect(processes[1].queries()).toEqual(['queued']);
+    processes[1].reply({ id: processes[1].requests[0].id, event: 'done', success: true });
+    expect(await queued).toEqual({ id: processes[1].requests[0].id, event: 'done', success: true });
+  });
+});
@@ -0,0 +1,334 @@
+import { Logger } from '@nestjs/common';
+import { ChildProcess, spawn } from 'child_process';
+import { createInterface } from 'readline';
+
+export type ChatbotWorkerPoolOptions = {
+  pythonPath: string;
+  scriptPath: string;
+  cwd: string;
+  env: NodeJS.ProcessEnv;
+  size: number;
+  /** Forked workers inside each process, sharing its loaded model (`serve --workers`) */
+  workersPerProcess: number;
+  /** Requests allowed to wait for a free worker; further ones are rejected with ChatbotBusyError */
+  maxQueueDepth: number;
+  requestTimeout: number;
+  enableLogging: boolean;
+  /** Called when a worker becomes ready, with its start-up time in ms */
+  onWorkerReady?: (startupMs: number) => void;
+};
+
+export type ChatbotWorkerEvent = {
+  event: 'sources' | 'token' | 'done' | 'error';
+  [key: string]: any;
+};
+
+type PendingRequest = {
+  id: string;
+  payload: Record<string, any>;
+  onEvent?: (event: ChatbotWorkerEvent) => void;
+  resolve: (result: any) => void;
+  reject: (error: Error) => void;
+  timeout?: NodeJS.Timeout;
+};
+
+type Worker = {
+  index: number;
+  process: ChildProcess;
+  ready: boolean;
+  /** Requests the process answers at once, as announced in its ready event */
+  capacity: number;
+  inFlight: Map<string, PendingRequest>;
+  stderr: string;
+  /** Killed on purpose and about to be replaced; never handed another request */
+  retired: boolean;
+};
+
+const MAX_RESTART_DELAY = 30000;
+
+/** Every worker is busy and the wait queue is full */
+export class ChatbotBusyError extends Error {
+  constructor() {
+    super('Chatbot is busy, please try again shortly');
+    this.name = 'ChatbotBusyError';
+  }
+}
+
+/**
+ * Keeps a pool of long-lived `chatbot_api.py serve` processes warm so each
+ * query skips the model, vector store and chain start-up cost.
+ * Requests are newline-delimited JSON, answered either as a single reply or
+ * as a stream of events. A process started with more than one forked worker
+ * answers that many requests at once; the rest wait in a bounded queue.
+ * A process killed over a cancelled or timed-out request is replaced at
+ * once; one that crashes is restarted with an exponential backoff.
+ */
+export class ChatbotWorkerPool {
+  private readonly logger = new Logger(ChatbotWorkerPool.name);
+  private readonly workers: (Worker | undefined)[] = [];
+  private readonly restartAttempts: number[] = [];
+  private readonly queue: PendingRequest[] = [];
+  private nextRequestId = 0;
+  private started = false;
+  private stopped = false;
+
+  constructor(private readonly options: ChatbotWorkerPoolOptions) {}
+
+  start() {
+    if (this.started) {
+      return;
+    }
+    this.started = true;
+    for (let index = 0; index < this.options.size; index++) {
+      this.restartAttempts[index] = 0;
+      this.spawnWorker(index);
+    }
+  }
+
+  stop() {
+    this.stopped = true;
+    for (const worker of this.workers) {
+      worker?.process.kill();
+    }
+    for (const request of this.queue.splice(0)) {
+      request.reject(new Error('Chatbot worker pool is shutting down'));
+    }
+  }
+
+  request(payload: Record<string, any>): Promise<any> {
+    return this.enqueue(payload);
+  }
+
+  /**
+   * Ask for a streamed answer. Intermediate `sources` and `token` events go to
+   * onEvent as they arrive; the promise resolves with the final `done` or
+   * `error` event. Aborting signal (e.g. when the client disconnects) drops
+   * the request and frees its worker.
+   */
+  stream(
+    payload: Record<string, any>,
+    onEvent: (event: ChatbotWorkerEvent) => void,
+    signal?: AbortSignal,
+  ): Promise<ChatbotWorkerEvent> {
+    return this.enqueue({ ...payload, stream: true }, onEvent, signal);
+  }
+
+  private enqueue(
+    payload: Record<string, any>,
+    onEvent?: (event: ChatbotWorkerEvent) => void,
+    signal?: AbortSignal,
+  ): Promise<any> {
+    this.start();
+
+    return new Promise((resolve, reject) => {
+      if (signal?.aborted) {
+        reject(new Error('Chatbot request cancelled'));
+        return;
+      }
+      if (this.queue.length >= this.options.maxQueueDepth && !this.hasIdleWorker()) {
+        reject(new ChatbotBusyError());
+        return;
+      }
+
+      const onAbort = () => {
+        this.abandon(request);
+        request.reject(new Error('Chatbot request cancelled'));
+      };
+      const settle = () => {
+        clearTimeout(request.timeout);
+        signal?.removeEventListener('abort', onAbort);
+      };
+      const request: PendingRequest = {
+        id: String(++this.nextRequestId),
+        payload,
+        onEvent,
+        resolve: (result) => {
+          settle();
+          resolve(result);
+        },
+        reject: (error) => {
+          settle();
+          reject(error);
+        },
+      };
+
+      request.timeout = setTimeout(() => {
+        this.abandon(request);
+        request.reject(new Error('Chatbot request timed out'));
+      }, this.options.requestTimeout);
+      signal?.addEventListener('abort', onAbort, { once: true });
+
+      this.queue.push(request);
+      this.dispatch();
+    });
+  }
+
+  /** Take a request out of the queue, or off the worker answering it */
+  private abandon(request: PendingRequest) {
+    const queued = this.queue.indexOf(request);
+    if (queued !== -1) {
+      this.queue.splice(queued, 1);
+      return;
+    }
+    const worker = this.workers.find((w) => w?.inFlight.has(request.id));
+    if (!worker) {
+      return;
+    }
+    worker.inFlight.delete(request.id);
+    if (worker.capacity > 1) {
+      // Only the forked worker answering this request is replaced
+      worker.process.stdin?.write(JSON.stringify({ cancel: request.id }) + '\n');
+      this.dispatch();
+      return;
+    }
+    // The worker is busy with this request until it finishes; restart it.
+    // Queued requests wait for the replacement to report ready.
+    worker.ready = false;
+    worker.retired = true;
+    worker.process.kill();
+  }
+
+  private spawnWorker(index: number) {
+    const child = spawn(
+      this.options.pythonPath,
+      [this.options.scriptPath, 'serve', '--workers', String(this.options.workersPerProcess)],
+      {
+        cwd: this.options.cwd,
+        env: this.options.env,
+        stdio: ['pipe', 'pipe', 'pipe'],
+      },
+    );
+
+    const worker: Worker = {
+      index,
+      process: child,
+      ready: false,
+      capacity: 1,
+      inFlight: new Map(),
+      stderr: '',
+      retired: false,
+    };
+    this.workers[index] = worker;
+
+    createInterface({ input: child.stdout! }).on('line', (line) =>
+      this.handleLine(worker, line),
+    );
+
+    child.stderr?.on('data', (data) => {
+      const stderrData = data.toString();
+      // Only keep the tail for crash reports
+      worker.stderr = (worker.stderr + stderrData).slice(-4000);
+      if (this.options.enableLogging) {
+        this.logger.debug(`Python worker ${index} stderr: ${stderrData}`);
+      }
+    });
+
+    child.on('error', (error: any) => {
+      if (error.code === 'ENOENT') {
+        this.logger.error(
+          `Python executable not found at ${this.options.pythonPath}`,
+        );
+      } else {
+        this.logger.error(
+          `Failed to start Python worker ${index}: ${error.message}`,
+        );
+      }
+    });
+
+    child.on('close', (code) => this.handleExit(worker, code));
+  }
+
+  private handleLine(worker: Worker, line: string) {
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      this.logger.warn(`Ignoring non-JSON output from worker: ${line}`);
+      return;
+    }
+
+    if (message.event === 'ready') {
+      worker.ready = true;
+      worker.capacity = typeof message.workers === 'number' ? message.workers : 1;
+      this.restartAttempts[worker.index] = 0;
+      this.logger.log(
+        `Python chatbot worker ${worker.index} ready with ${worker.capacity} forked worker(s)`,
+      );
+      if (typeof message.startup_ms === 'number') {
+        this.options.onWorkerReady?.(message.startup_ms);
+      }
+      this.dispatch();
+      return;
+    }
+
+    const request = worker.inFlight.get(message.id);
+    if (!request) {
+      return;
+    }
+
+    if (message.event === 'sources' || message.event === 'token') {
+      request.onEvent?.(message);
+      return;
+    }
+
+    worker.inFlight.delete(request.id);
+    if (message.busy) {
+      request.reject(new ChatbotBusyError());
+    } else {
+      request.resolve(message);
+    }
+    this.dispatch();
+  }
+
+  private handleExit(worker: Worker, code: number | null) {
+    if (this.workers[worker.index] !== worker) {
+      return;
+    }
+    this.workers[worker.index] = undefined;
+
+    for (const request of worker.inFlight.values()) {
+      request.reject(
+        new Error(
+          `Chatbot worker exited with code ${code}: ${worker.stderr || 'no output'}`,
+        ),
+      );
+    }
+    worker.inFlight.clear();
+
+    if (this.stopped) {
+      return;
+    }
+
+    // A worker killed on purpose is replaced at once; crashes back off
+    const delay = worker.retired
+      ? 0
+      : Math.min(1000 * 2 ** this.restartAttempts[worker.index]++, MAX_RESTART_DELAY);
+    this.logger.warn(
+      `Python chatbot worker ${worker.index} exited with code ${code}, restarting in ${delay}ms`,
+    );
+    setTimeout(() => {
+      if (!this.stopped) {
+        this.spawnWorker(worker.index);
+      }
+    }, delay).unref();
+  }
+
+  private hasIdleWorker(): boolean {
+    return this.workers.some((w) => w?.ready && w.inFlight.size < w.capacity);
+  }
+
+  private dispatch() {
+    for (const worker of this.workers) {
+      if (!worker || !worker.ready) {
+        continue;
+      }
+      while (this.queue.length && worker.inFlight.size < worker.capacity) {
+        const request = this.queue.shift()!;
+        worker.inFlight.set(request.id, request);
+        worker.process.stdin?.write(
+          JSON.stringify({ ...request.payload, id: request.id }) + '\n',
+        );
+      }
+    }
+  }
+}
@@ -12,16 +12,22 @@ import {
   Request,
   ParseIntPipe,
   NotFoundException,
+  Res,
+  HttpException,
 } from '@nestjs/common';
 import {
   ApiTags,
   ApiOperation,
   ApiResponse,
   ApiBearerAuth,
+  ApiProduces,
 } from '@nestjs/swagger';
+import { Response } from 'express';
 import { ChatbotService } from './chatbot.service';
+import { ChatbotOverloadedException, priorityForUser } from './chatbot-admission';
 import { ChatbotQueryDto } from './dto/chatbot-query.dto';
 import { ChatbotResponseDto, SourceDocument } from './dto/chatbot-response.dto';
+import { ChatbotStreamEvent } from './dto/chatbot-stream-event.dto';
 import { CreateChatHistoryDto } from './dto/create-chat-history.dto';
 import { UpdateChatHistoryDto } from './dto/update-chat-history.dto';
 import { ChatHistoryResponseDto, ChatHistoryListItemDto } from './dto/chat-history-response.dto';
@@ -52,6 +58,14 @@ export class ChatbotController {
     status: HttpStatus.BAD_REQUEST,
     description: 'Invalid query or request timeout',
   })
+  @ApiResponse({
+    status: HttpStatus.TOO_MANY_REQUESTS,
+    description: 'Chatbot is overloaded; retry after the number of seconds in the Retry-After header',
+  })
+  @ApiResponse({
+    status: HttpStatus.SERVICE_UNAVAILABLE,
+    description: 'Every chatbot worker is busy; retry after the number of seconds in the Retry-After header',
+  })
   @ApiResponse({
     status: HttpStatus.INTERNAL_SERVER_ERROR,
     description: 'Chatbot service error',
@@ -59,15 +73,109 @@ export class ChatbotController {
   async askQuestion(
     @Body() chatbotQueryDto: ChatbotQueryDto,
     @Request() request,
+    @Res({ passthrough: true }) response: Response,
   ): Promise<ChatbotResponseDto> {
     const userId = request.user?.id;
     const chatHistoryId = chatbotQueryDto.chatHistoryId;
     
-    return this.chatbotService.askQuestion(
-      chatbotQueryDto.query,
-      userId,
-      chatHistoryId,
-    );
+    try {
+      return await this.chatbotService.askQuestion(
+        chatbotQueryDto.query,
+        userId,
+        chatHistoryId,
+        chatbotQueryDto.filters,
+        priorityForUser(request.user),
+      );
+    } catch (error) {
+      if (error instanceof ChatbotOverloadedException) {
+        response.setHeader('Retry-After', String(error.retryAfterSeconds));
+      }
+      throw error;
+    }
+  }
+
+  @Post('ask/stream')
+  @ApiOperation({
+    summary: 'Ask a question and stream the answer',
+    description: 'Same as /ask, but the response is a server-sent event stream: a `sources` event, then `token` events as the answer is generated, then a `done` event with the full response (or an `error` event).',
+  })
+  @ApiProduces('text/event-stream')
+  @ApiResponse({
+    status: HttpStatus.OK,
+    description: 'Server-sent events with the chatbot answer',
+    type: ChatbotStreamEvent,
+  })
+  @ApiResponse({
+    status: HttpStatus.TOO_MANY_REQUESTS,
+    description: 'Chatbot is overloaded; retry after the number of seconds in the Retry-After header',
+  })
+  @ApiResponse({
+    status: HttpStatus.SERVICE_UNAVAILABLE,
+    description: 'Every chatbot worker is busy; retry after the number of seconds in the Retry-After header',
+  })
+  async streamQuestion(
+    @Body() chatbotQueryDto: ChatbotQueryDto,
+    @Request() request,
+    @Res() response: Response,
+  ): Promise<void> {
+    // Headers go out with the first event, so a query turned away before
+    // it starts still gets a plain 429/503 with Retry-After
+    const open = () => {
+      if (response.headersSent) {
+        return;
+      }
+      response.status(HttpStatus.OK);
+      response.setHeader('Content-Type', 'text/event-stream');
+      response.setHeader('Cache-Control', 'no-cache');
+      response.setHeader('Connection', 'keep-alive');
+      // Stop reverse proxies from buffering the stream
+      response.setHeader('X-Accel-Buffering', 'no');
+      response.flushHeaders();
+    };
+
+    const send = (event: string, data: unknown) => {
+      open();
+      if (!response.writableEnded) {
+        response.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+      }
+    };
+
+    // A client that disconnects gives up its worker and admission slot
+    const disconnected = new AbortController();
+    response.on('close', () => {
+      if (!response.writableEnded) {
+        disconnected.abort();
+      }
+    });
+
+    try {
+      const result = await this.chatbotService.streamQuestion(
+        chatbotQueryDto.query,
+        (event) => send(event.event, event),
+        request.user?.id,
+        chatbotQueryDto.chatHistoryId,
+        chatbotQueryDto.filters,
+        priorityForUser(request.user),
+        disconnected.signal,
+      );
+      send('done', { event: 'done', ...result });
+    } catch (error) {
+      if (disconnected.signal.aborted) {
+        return;
+      }
+      if (error instanceof HttpException && !response.headersSent) {
+        if (error instanceof ChatbotOverloadedException) {
+          response.setHeader('Retry-After', String(error.retryAfterSeconds));
+        }
+        response.status(error.getStatus()).json(error.getResponse());
+        return;
+      }
+      send('error', { event: 'error', message: error.message });
+    } finally {
+      if (!response.writableEnded) {
+        response.end();
+      }
+    }
   }
 
   @Get('history')
@@ -2,6 +2,8 @@ import { Module } from '@nestjs/common';
 import { TypeOrmModule } from '@nestjs/typeorm';
 import { ChatbotController } from './chatbot.controller';
 import { ChatbotService } from './chatbot.service';
+import { ChatbotMetricsController } from './chatbot-metrics.controller';
+import { ChatbotMetricsService } from './chatbot-metrics.service';
 import { ConfigModule } from '@nestjs/config';
 import chatbotConfig from './config/chatbot.config';
 import { ChatHistoryEntity } from './infrastructure/persistence/relational/entities/chat-history.entity';
@@ -14,9 +16,10 @@ import { ChatHistoryRelationalRepository } from './infrastructure/persistence/re
     ConfigModule.forFeature(chatbotConfig),
     TypeOrmModule.forFeature([ChatHistoryEntity, ChatMessageEntity]),
   ],
-  controllers: [ChatbotController],
+  controllers: [ChatbotController, ChatbotMetricsController],
   providers: [
     ChatbotService,
+    ChatbotMetricsService,
     {
       provide: ChatHistoryRepository,
       useClass: ChatHistoryRelationalRepository,
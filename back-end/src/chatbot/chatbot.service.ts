@@ -1,53 +1,73 @@
-import { Injectable, Logger, BadRequestException, InternalServerErrorException, NotFoundException } from '@nestjs/common';
+import {
+  Injectable,
+  Logger,
+  BadRequestException,
+  InternalServerErrorException,
+  NotFoundException,
+  OnModuleDestroy,
+  OnModuleInit,
+  HttpStatus,
+} from '@nestjs/common';
 import { ConfigService } from '@nestjs/config';
 import { spawn } from 'child_process';
+import { cpus } from 'os';
 import { join } from 'path';
 import { ChatbotConfig } from './config/chatbot-config.type';
 import { ChatbotResponseDto, SourceDocument } from './dto/chatbot-response.dto';
+import { ChatbotQueryFilters } from './dto/chatbot-query.dto';
+import { ChatbotStreamEvent } from './dto/chatbot-stream-event.dto';
 import { ChatHistoryRepository } from './infrastructure/persistence/chat-history.repository';
 import { MessageRole } from './domain/chat-message';
+import { ChatbotBusyError, ChatbotWorkerEvent, ChatbotWorkerPool } from './chatbot-worker-pool';
+import { ChatbotMetricsService } from './chatbot-metrics.service';
+import {
+  ChatbotAdmissionController,
+  ChatbotOverloadedError,
+  ChatbotOverloadedException,
+  ChatbotPriority,
+} from './chatbot-admission';
+
+/** Same normalization as the Python answer cache, so queries it would answer alike are coalesced */
+function normalizeQuery(query: string): string {
+  return query.trim().toLowerCase().replace(/\s+/g, ' ').replace(/[?!. ]+$/, '');
+}
 
 @Injectable()
-export class ChatbotService {
+export class ChatbotService implements OnModuleInit, OnModuleDestroy {
   private readonly logger = new Logger(ChatbotService.name);
+  private workerPool?: ChatbotWorkerPool;
+  private admission?: ChatbotAdmissionController;
+  /**
+   * Answers being computed, by normalized query and filters, with the
+   * highest priority asking for them; identical concurrent questions share one
+   */
+  private readonly inFlight = new Map<
+    string,
+    { answer: Promise<ChatbotResponseDto>; priority: ChatbotPriority }
+  >();
 
   constructor(
     private readonly configService: ConfigService<{ chatbot: ChatbotConfig }>,
     private readonly chatHistoryRepository: ChatHistoryRepository,
+    private readonly metricsService: ChatbotMetricsService,
   ) {}
 
-  async askQuestion(query: string, userId?: number, chatHistoryId?: number): Promise<ChatbotResponseDto> {
+  async askQuestion(
+    query: string,
+    userId?: number,
+    chatHistoryId?: number,
+    filters?: ChatbotQueryFilters,
+    priority: ChatbotPriority = ChatbotPriority.user,
+  ): Promise<ChatbotResponseDto> {
     const startTime = Date.now();
     
     try {
-      const response = await this.callPythonChatbot(query);
+      const response = await this.answerOnce(query, filters, priority);
       const processingTime = Date.now() - startTime;
 
       // Save the conversation to chat history if userId and chatHistoryId are provided
       if (userId && chatHistoryId) {
-        try {
-          // Save user message
-          await this.chatHistoryRepository.addMessage(chatHistoryId, {
-            role: MessageRole.USER,
-            content: query,
-            metadata: {},
-          });
-
-          // Save AI response
-          await this.chatHistoryRepository.addMessage(chatHistoryId, {
-            role: MessageRole.AI,
-            content: response.answer,
-            metadata: {
-              sources: response.sources,
-              references: response.references,
-              timeline: response.timeline,
-              processingTime,
-            },
-          });
-        } catch (error) {
-          this.logger.error(`Failed to save chat history: ${error.message}`);
-          // Don't throw error, just log it
-        }
+        await this.saveExchange(chatHistoryId, query, response, processingTime);
       }
 
       return {
@@ -55,11 +75,114 @@ export class ChatbotService {
         processingTime,
       };
     } catch (error) {
+      // Metrics were recorded once for the computation, in answerOnce
+      if (error instanceof ChatbotOverloadedError) {
+        throw new ChatbotOverloadedException(error.retryAfterSeconds);
+      }
+      if (error instanceof ChatbotBusyError) {
+        throw this.busyException(error);
+      }
       this.logger.error(`Error processing chatbot query: ${error.message}`);
       throw new InternalServerErrorException('Failed to process chatbot query');
     }
   }
 
+  /**
+   * Stream an answer: `sources` first, then `token` events as the LLM
+   * generates them, then a final `done` event with the full response.
+   */
+  async streamQuestion(
+    query: string,
+    onEvent: (event: ChatbotStreamEvent) => void,
+    userId?: number,
+    chatHistoryId?: number,
+    filters?: ChatbotQueryFilters,
+    priority: ChatbotPriority = ChatbotPriority.user,
+    signal?: AbortSignal,
+  ): Promise<ChatbotResponseDto> {
+    const startTime = Date.now();
+    const chatbotConfig = this.getChatbotConfig();
+
+    let result: ChatbotWorkerEvent;
+    try {
+      const payload = { query, filters: this.toWorkerFilters(filters) };
+      result = await this.getAdmission(chatbotConfig).run(
+        priority,
+        () =>
+          this.getWorkerPool(chatbotConfig).stream(
+            payload,
+            (event) => onEvent(event as ChatbotStreamEvent),
+            signal,
+          ),
+        signal,
+      );
+    } catch (error) {
+      if (signal?.aborted) {
+        // The client went away; its worker and admission slot are already freed
+        this.metricsService.observeCancelled('stream');
+        throw error;
+      }
+      if (error instanceof ChatbotOverloadedError) {
+        this.metricsService.observeRejected('stream');
+        throw new ChatbotOverloadedException(error.retryAfterSeconds);
+      }
+      if (error instanceof ChatbotBusyError) {
+        this.metricsService.observeRejected('stream');
+        throw this.busyException(error);
+      }
+      this.metricsService.observeFailure('stream');
+      this.logger.error(`Error streaming chatbot query: ${error.message}`);
+      throw new InternalServerErrorException('Failed to process chatbot query');
+    }
+
+    if (!result.success) {
+      this.metricsService.observeFailure('stream');
+      throw new InternalServerErrorException(result.error || 'Unknown chatbot error');
+    }
+
+    const response = this.toResponse(result);
+    const processingTime = Date.now() - startTime;
+    this.metricsService.observeQuery('stream', processingTime, response.metrics, response.cache);
+    if (userId && chatHistoryId) {
+      await this.saveExchange(chatHistoryId, query, response, processingTime);
+    }
+
+    return { ...response, processingTime };
+  }
+
+  private async saveExchange(
+    chatHistoryId: number,
+    query: string,
+    response: ChatbotResponseDto,
+    processingTime: number,
+  ) {
+    try {
+      // Save user message
+      await this.chatHistoryRepository.addMessage(chatHistoryId, {
+        role: MessageRole.USER,
+        content: query,
+        metadata: {},
+      });
+
+      // Save AI response
+      await this.chatHistoryRepository.addMessage(chatHistoryId, {
+        role: MessageRole.AI,
+        content: response.answer,
+        metadata: {
+          sources: response.sources,
+          references: response.references,
+          timeline: response.timeline,
+          processingTime,
+          cache: response.cache,
+          metrics: response.metrics,
+        },
+      });
+    } catch (error) {
+      this.logger.error(`Failed to save chat history: ${error.message}`);
+      // Don't throw error, just log it
+    }
+  }
+
   async getChatHistory(userId: number) {
     return this.chatHistoryRepository.findByUserId(userId);
   }
@@ -121,116 +244,180 @@ export class ChatbotService {
     await this.chatHistoryRepository.removeAllByUserId(userId);
   }
 
-  private async callPythonChatbot(query: string): Promise<ChatbotResponseDto> {
+  onModuleInit() {
     const chatbotConfig = this.configService.get('chatbot', { infer: true });
-    
-    if (!chatbotConfig) {
-      throw new InternalServerErrorException('Chatbot configuration not found');
-    }
 
-    if (!chatbotConfig.groqApiKey) {
-      throw new InternalServerErrorException('GROQ_API_KEY is required but not configured');
+    // Warm the workers up front so the first question doesn't pay the start-up cost
+    if (chatbotConfig?.groqApiKey) {
+      this.getWorkerPool(chatbotConfig).start();
     }
+  }
 
-    try {
-      const pythonPath = chatbotConfig.pythonPath;
+  onModuleDestroy() {
+    this.workerPool?.stop();
+  }
+
+  private getWorkerPool(chatbotConfig: ChatbotConfig): ChatbotWorkerPool {
+    if (!this.workerPool) {
       const chatbotPath = join(process.cwd(), chatbotConfig.chatbotPath);
-      
-      // Always use full chatbot_api.py (fallback to simple if import fails at runtime)
-      const scriptPath = join(chatbotPath, 'chatbot_api.py');
 
-      // Set environment variables for the Python process
-      const env = {
-        ...process.env,
-        GROQ_API_KEY: chatbotConfig.groqApiKey,
-        PATH: process.env.PATH + ':/Users/ramez.medhat/.asdf/shims',
-        TOKENIZERS_PARALLELISM: 'false', // Suppress tokenizer warnings
-      };
+      this.workerPool = new ChatbotWorkerPool({
+        pythonPath: chatbotConfig.pythonPath,
+        scriptPath: join(chatbotPath, 'chatbot_api.py'),
+        cwd: chatbotPath,
+        env: {
+          ...process.env,
+          GROQ_API_KEY: chatbotConfig.groqApiKey,
+          PATH: process.env.PATH + ':/Users/ramez.medhat/.asdf/shims',
+          TOKENIZERS_PARALLELISM: 'false', // Suppress tokenizer warnings
+        },
+        size: chatbotConfig.workerPoolSize,
+        workersPerProcess: chatbotConfig.preforkWorkers,
+        maxQueueDepth: chatbotConfig.maxQueueDepth,
+        requestTimeout: chatbotConfig.maxResponseTime,
+        enableLogging: chatbotConfig.enableLogging,
+        onWorkerReady: (startupMs) => this.metricsService.observeWorkerStartup(startupMs),
+      });
+    }
 
-      return new Promise((resolve, reject) => {
-        const timeout = setTimeout(() => {
-          reject(new BadRequestException('Chatbot request timed out'));
-        }, chatbotConfig.maxResponseTime);
+    return this.workerPool;
+  }
 
-        const pythonProcess = spawn(pythonPath, [scriptPath, 'query', query], {
-          cwd: chatbotPath,
-          env,
-          stdio: ['pipe', 'pipe', 'pipe'],
-        });
+  private getAdmission(chatbotConfig: ChatbotConfig): ChatbotAdmissionController {
+    if (!this.admission) {
+      // By default, as many queries as the worker pool answers at once
+      const workersPerProcess = chatbotConfig.preforkWorkers || cpus().length;
+      this.admission = new ChatbotAdmissionController({
+        maxConcurrent:
+          chatbotConfig.maxConcurrent || chatbotConfig.workerPoolSize * workersPerProcess,
+        maxQueueDepth: chatbotConfig.admissionQueueDepth,
+        maxWait: chatbotConfig.admissionMaxWait,
+        onAdmitted: (waitMs, priority) =>
+          this.metricsService.observeAdmissionWait(waitMs, ChatbotPriority[priority]),
+      });
+    }
 
-        let stdout = '';
-        let stderr = '';
+    return this.admission;
+  }
 
-        pythonProcess.stdout?.on('data', (data) => {
-          stdout += data.toString();
-        });
+  private busyException(error: ChatbotBusyError): ChatbotOverloadedException {
+    return new ChatbotOverloadedException(
+      this.getAdmission(this.getChatbotConfig()).retryAfterSeconds(),
+      HttpStatus.SERVICE_UNAVAILABLE,
+      error.message,
+    );
+  }
 
-        pythonProcess.stderr?.on('data', (data) => {
-          const stderrData = data.toString();
-          stderr += stderrData;
-          // Log stderr in real-time if logging is enabled
-          if (chatbotConfig.enableLogging) {
-            this.logger.debug(`Python stderr: ${stderrData}`);
-          }
-        });
+  /**
+   * The answer to a query, computed once however many identical requests
+   * arrive while it is running. Each caller still saves its own exchange,
+   * but query metrics are recorded once, for the computation; callers that
+   * join it only count as coalesced. A caller of higher priority than the
+   * one that started it moves it up the admission queue.
+   */
+  private answerOnce(
+    query: string,
+    filters: ChatbotQueryFilters | undefined,
+    priority: ChatbotPriority,
+  ): Promise<ChatbotResponseDto> {
+    const admission = this.getAdmission(this.getChatbotConfig());
+    const key = JSON.stringify([normalizeQuery(query), this.toWorkerFilters(filters) ?? null]);
+    const pending = this.inFlight.get(key);
+    if (pending) {
+      this.metricsService.observeCoalesced();
+      if (priority > pending.priority) {
+        pending.priority = priority;
+        admission.promote(key, priority);
+      }
+      return pending.answer;
+    }
 
-        pythonProcess.on('close', (code) => {
-          clearTimeout(timeout);
-          
-          if (chatbotConfig.enableLogging) {
-            this.logger.debug(`Python process exited with code ${code}`);
-            this.logger.debug(`stdout: ${stdout}`);
-            this.logger.debug(`stderr: ${stderr}`);
-          }
-          
-          if (code !== 0) {
-            this.logger.error(`Python process exited with code ${code}`);
-            this.logger.error(`stdout: ${stdout}`);
-            this.logger.error(`stderr: ${stderr}`);
-            reject(new InternalServerErrorException(`Chatbot process error: ${stderr || 'Process exited with non-zero code'}`));
-            return;
+    const startTime = Date.now();
+    const answer = admission
+      .run(priority, () => this.callPythonChatbot(query, filters), undefined, key)
+      .then(
+        (response) => {
+          const processingTime = Date.now() - startTime;
+          this.metricsService.observeQuery('ask', processingTime, response.metrics, response.cache);
+          return response;
+        },
+        (error) => {
+          if (error instanceof ChatbotOverloadedError || error instanceof ChatbotBusyError) {
+            this.metricsService.observeRejected('ask');
+          } else {
+            this.metricsService.observeFailure('ask');
           }
+          throw error;
+        },
+      )
+      .finally(() => this.inFlight.delete(key));
+    this.inFlight.set(key, { answer, priority });
+    return answer;
+  }
 
-          try {
-            // Extract JSON from stdout (might have warnings before it)
-            const jsonMatch = stdout.match(/\{[\s\S]*\}/);
-            if (!jsonMatch) {
-              this.logger.error(`No JSON found in output: ${stdout}`);
-              reject(new InternalServerErrorException('No valid JSON response from chatbot'));
-              return;
-            }
-            
-            const result = JSON.parse(jsonMatch[0]);
-            if (result.success) {
-              resolve({
-                answer: result.answer,
-                sources: result.sources || [],
-                references: result.references || [],
-                timeline: result.timeline || [],
-              });
-            } else {
-              reject(new InternalServerErrorException(result.error || 'Unknown chatbot error'));
-            }
-          } catch (parseError) {
-            this.logger.error(`Failed to parse Python response: ${stdout}`);
-            reject(new InternalServerErrorException('Failed to parse chatbot response'));
-          }
-        });
+  private getChatbotConfig(): ChatbotConfig {
+    const chatbotConfig = this.configService.get('chatbot', { infer: true });
+    
+    if (!chatbotConfig) {
+      throw new InternalServerErrorException('Chatbot configuration not found');
+    }
 
-        pythonProcess.on('error', (error: any) => {
-          clearTimeout(timeout);
-          if (error.code === 'ENOENT') {
-            reject(new InternalServerErrorException(
-              'Python is not available in this environment. The chatbot requires Python with the necessary dependencies to be installed.'
-            ));
-          } else {
-            reject(new InternalServerErrorException(`Failed to start Python process: ${error.message}`));
-          }
-        });
+    if (!chatbotConfig.groqApiKey) {
+      throw new InternalServerErrorException('GROQ_API_KEY is required but not configured');
+    }
+
+    return chatbotConfig;
+  }
+
+  private toResponse(result: Record<string, any>): ChatbotResponseDto {
+    return {
+      answer: result.answer,
+      sources: result.sources || [],
+      references: result.references || [],
+      timeline: result.timeline || [],
+      cache: result.cache,
+      metrics: result.metrics,
+    };
+  }
+
+  /**
+   * Filters in the shape chatbot_api.py expects; undefined when there are none.
+   */
+  private toWorkerFilters(filters?: ChatbotQueryFilters) {
+    if (!filters || (!filters.after && !filters.before && !filters.sourceTypes?.length)) {
+      return undefined;
+    }
+    return {
+      after: filters.after,
+      before: filters.before,
+      source_types: filters.sourceTypes ? [...filters.sourceTypes].sort() : undefined,
+    };
+  }
+
+  private async callPythonChatbot(query: string, filters?: ChatbotQueryFilters): Promise<ChatbotResponseDto> {
+    const chatbotConfig = this.getChatbotConfig();
+
+    let result: any;
+    try {
+      result = await this.getWorkerPool(chatbotConfig).request({
+        query,
+        filters: this.toWorkerFilters(filters),
       });
     } catch (error) {
+      if (error instanceof ChatbotBusyError) {
+        throw error;
+      }
+      if (error.message === 'Chatbot request timed out') {
+        throw new BadRequestException(error.message);
+      }
       throw new InternalServerErrorException(`Chatbot service error: ${error.message}`);
     }
+
+    if (!result.success) {
+      throw new InternalServerErrorException(result.error || 'Unknown chatbot error');
+    }
+
+    return this.toResponse(result);
   }
 
 
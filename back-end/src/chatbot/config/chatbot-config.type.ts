@@ -4,5 +4,11 @@ export type ChatbotConfig = {
   groqApiKey: string;
   maxResponseTime: number;
   enableLogging: boolean;
+  workerPoolSize: number;
+  preforkWorkers: number;
+  maxQueueDepth: number;
+  maxConcurrent: number;
+  admissionQueueDepth: number;
+  admissionMaxWait: number;
 };
 
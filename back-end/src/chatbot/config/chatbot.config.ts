@@ -1,5 +1,5 @@
 import { registerAs } from '@nestjs/config';
-import { IsString, IsNumber, IsBoolean, IsOptional } from 'class-validator';
+import { IsString, IsNumber, IsBoolean, IsOptional, IsInt, Min } from 'class-validator';
 import validateConfig from '../../utils/validate-config';
 import { ChatbotConfig } from './chatbot-config.type';
 
@@ -23,6 +23,36 @@ class EnvironmentVariablesValidator {
   @IsBoolean()
   @IsOptional()
   CHATBOT_ENABLE_LOGGING: boolean;
+
+  @IsInt()
+  @Min(1)
+  @IsOptional()
+  CHATBOT_WORKER_POOL_SIZE: number;
+
+  @IsInt()
+  @Min(0)
+  @IsOptional()
+  CHATBOT_PREFORK_WORKERS: number;
+
+  @IsInt()
+  @Min(0)
+  @IsOptional()
+  CHATBOT_MAX_QUEUE_DEPTH: number;
+
+  @IsInt()
+  @Min(0)
+  @IsOptional()
+  CHATBOT_MAX_CONCURRENT: number;
+
+  @IsInt()
+  @Min(0)
+  @IsOptional()
+  CHATBOT_ADMISSION_QUEUE_DEPTH: number;
+
+  @IsInt()
+  @Min(1)
+  @IsOptional()
+  CHATBOT_ADMISSION_MAX_WAIT: number;
 }
 
 export default registerAs<ChatbotConfig>('chatbot', () => {
@@ -36,5 +66,25 @@ export default registerAs<ChatbotConfig>('chatbot', () => {
       ? parseInt(process.env.CHATBOT_MAX_RESPONSE_TIME, 10)
       : 30000, // 30 seconds
     enableLogging: process.env.CHATBOT_ENABLE_LOGGING === 'true',
+    workerPoolSize: process.env.CHATBOT_WORKER_POOL_SIZE
+      ? parseInt(process.env.CHATBOT_WORKER_POOL_SIZE, 10)
+      : 2,
+    // 0 forks one worker per CPU
+    preforkWorkers: process.env.CHATBOT_PREFORK_WORKERS
+      ? parseInt(process.env.CHATBOT_PREFORK_WORKERS, 10)
+      : 1,
+    maxQueueDepth: process.env.CHATBOT_MAX_QUEUE_DEPTH
+      ? parseInt(process.env.CHATBOT_MAX_QUEUE_DEPTH, 10)
+      : 100,
+    // 0 admits as many queries at once as the worker pool answers
+    maxConcurrent: process.env.CHATBOT_MAX_CONCURRENT
+      ? parseInt(process.env.CHATBOT_MAX_CONCURRENT, 10)
+      : 0,
+    admissionQueueDepth: process.env.CHATBOT_ADMISSION_QUEUE_DEPTH
+      ? parseInt(process.env.CHATBOT_ADMISSION_QUEUE_DEPTH, 10)
+      : 50,
+    admissionMaxWait: process.env.CHATBOT_ADMISSION_MAX_WAIT
+      ? parseInt(process.env.CHATBOT_ADMISSION_MAX_WAIT, 10)
+      : 10000, // 10 seconds
   };
 });
@@ -1,5 +1,45 @@
-import { ApiProperty } from '@nestjs/swagger';
-import { IsNotEmpty, IsString, MaxLength, IsOptional, IsNumber } from 'class-validator';
+import { ApiProperty, ApiPropertyOptional } from '@nestjs/swagger';
+import {
+  IsNotEmpty,
+  IsString,
+  MaxLength,
+  IsOptional,
+  IsNumber,
+  IsIn,
+  Matches,
+  ValidateNested,
+} from 'class-validator';
+import { Type } from 'class-transformer';
+
+const DATE_BOUND = /^\d{4}(-\d{1,2}(-\d{1,2})?)?$/;
+
+export class ChatbotQueryFilters {
+  @ApiPropertyOptional({
+    description: 'Only use sources dated on or after this date (YYYY, YYYY-MM or YYYY-MM-DD)',
+    example: '2015',
+  })
+  @IsOptional()
+  @Matches(DATE_BOUND)
+  after?: string;
+
+  @ApiPropertyOptional({
+    description: 'Only use sources dated on or before this date (YYYY, YYYY-MM or YYYY-MM-DD)',
+    example: '2020-06',
+  })
+  @IsOptional()
+  @Matches(DATE_BOUND)
+  before?: string;
+
+  @ApiPropertyOptional({
+    description: 'Only use these kinds of sources',
+    example: ['pdf', 'csv'],
+    enum: ['html', 'pdf', 'csv'],
+    isArray: true,
+  })
+  @IsOptional()
+  @IsIn(['html', 'pdf', 'csv'], { each: true })
+  sourceTypes?: string[];
+}
 
 export class ChatbotQueryDto {
   @ApiProperty({
@@ -19,5 +59,14 @@ export class ChatbotQueryDto {
   @IsNumber()
   @IsOptional()
   chatHistoryId?: number;
+
+  @ApiPropertyOptional({
+    description: 'Restrict the sources searched by date range and source type',
+    type: ChatbotQueryFilters,
+  })
+  @IsOptional()
+  @ValidateNested()
+  @Type(() => ChatbotQueryFilters)
+  filters?: ChatbotQueryFilters;
 }
 
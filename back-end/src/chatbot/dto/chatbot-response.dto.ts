@@ -26,6 +26,73 @@ export class SourceDocument {
   content?: string;
 }
 
+export class ChatbotQueryCounters {
+  @ApiProperty({
+    description: 'Chunks retrieved as context',
+    example: 12,
+  })
+  chunks_retrieved: number;
+
+  @ApiProperty({
+    description: 'Characters of retrieved context',
+    example: 9850,
+    required: false,
+  })
+  context_chars?: number;
+
+  @ApiProperty({
+    description: 'Characters of the full prompt',
+    example: 14200,
+    required: false,
+  })
+  prompt_chars?: number;
+
+  @ApiProperty({
+    description: 'Prompt tokens sent to the LLM',
+    example: 3550,
+  })
+  tokens_in: number;
+
+  @ApiProperty({
+    description: 'Answer tokens generated by the LLM',
+    example: 420,
+  })
+  tokens_out: number;
+
+  @ApiProperty({
+    description: 'Whether token counts are estimated because the LLM reported no usage',
+    required: false,
+  })
+  tokens_estimated?: boolean;
+}
+
+export class ChatbotQueryMetrics {
+  @ApiProperty({
+    description: 'Milliseconds per stage of the Python pipeline, plus their total',
+    example: { embed: 8.2, retrieve: 21.5, llm: 1180.4, format_sources: 0.6, total: 1210.7 },
+  })
+  timings_ms: Record<string, number>;
+
+  @ApiProperty({
+    type: ChatbotQueryCounters,
+  })
+  counters: ChatbotQueryCounters;
+
+  @ApiProperty({
+    description: 'Breakdown of the retrieve stage for the hybrid retriever',
+    example: { vector: 12.1, bm25: 1.4, fusion: 0.1, fetch: 6.3 },
+    required: false,
+  })
+  retrieval_ms?: Record<string, number>;
+
+  @ApiProperty({
+    description: 'Milliseconds until the first streamed token',
+    example: 240.5,
+    required: false,
+  })
+  first_token_ms?: number;
+}
+
 export class ChatbotResponseDto {
   @ApiProperty({
     description: 'The chatbot response to the query',
@@ -57,6 +124,20 @@ export class ChatbotResponseDto {
   })
   processingTime?: number;
 
+  @ApiProperty({
+    description: 'Which chatbot cache levels served this answer',
+    example: { answer: 'miss', query_embedding: 'hit' },
+    required: false,
+  })
+  cache?: Record<string, string>;
+
+  @ApiProperty({
+    description: 'Stage timings and counters for this query',
+    type: ChatbotQueryMetrics,
+    required: false,
+  })
+  metrics?: ChatbotQueryMetrics;
+
   @ApiProperty({
     description: 'Chart data for visualization',
     example: [{ name: 'A', value: 100 }, { name: 'B', value: 200 }],
@@ -0,0 +1,44 @@
+import { ApiProperty } from '@nestjs/swagger';
+import { ChatbotQueryMetrics, SourceDocument } from './chatbot-response.dto';
+
+export class ChatbotStreamEvent {
+  @ApiProperty({
+    description: 'Event type: sources first, then tokens, then done (or error)',
+    enum: ['sources', 'token', 'done', 'error'],
+    example: 'token',
+  })
+  event: 'sources' | 'token' | 'done' | 'error';
+
+  @ApiProperty({
+    description: 'Answer text generated since the previous token event',
+    example: 'Microgravity ',
+    required: false,
+  })
+  text?: string;
+
+  @ApiProperty({
+    description: 'Source documents retrieved for the query',
+    type: [SourceDocument],
+    required: false,
+  })
+  sources?: SourceDocument[];
+
+  @ApiProperty({
+    description: 'References list',
+    required: false,
+  })
+  references?: string[];
+
+  @ApiProperty({
+    description: 'Timeline of source documents',
+    required: false,
+  })
+  timeline?: string[];
+
+  @ApiProperty({
+    description: 'Stage timings and counters, on the done event',
+    type: ChatbotQueryMetrics,
+    required: false,
+  })
+  metrics?: ChatbotQueryMetrics;
+}